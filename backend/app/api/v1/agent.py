@@ -5,6 +5,8 @@ from datetime import datetime
 from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from typing import Dict, Set
 
+import numpy as np
+
 from ...models.analysis import (
     AnalysisRequest,
     AnalysisTask,
@@ -136,7 +138,6 @@ async def run_analysis(task: AnalysisTask, request: AnalysisRequest):
         quote = await akshare.get_spot_quote(request.stock_code)
         stock_info = await akshare.get_stock_info(request.stock_code)
         fundamental_data = await akshare.get_financial_data(request.stock_code)
-        kline_data = await akshare.get_kline_data(request.stock_code)
 
         # 获取新闻
         from ...services.news import get_news_fetcher
@@ -149,19 +150,30 @@ async def run_analysis(task: AnalysisTask, request: AnalysisRequest):
             limit=20
         )
 
-        # 计算技术指标
-        close = [k["close"] for k in kline_data] if kline_data else []
-        high = [k["high"] for k in kline_data] if kline_data else []
-        low = [k["low"] for k in kline_data] if kline_data else []
-
-        from ...services.indicators import technical_calculator
+        # 计算技术指标 (同一只股票同一天的结果从指标缓存读取)
+        from ...services.indicators import get_indicator_cache
 
         indicators = {}
-        if close:
-            macd = technical_calculator.macd(close)
-            rsi = technical_calculator.rsi(close)
-            kdj = technical_calculator.kdj(high, low, close)
-            indicators = {"macd": macd, "rsi": rsi, "kdj": kdj}
+        try:
+            start, end = akshare.kline_range()
+            bars = await akshare.get_kline_history(request.stock_code, start_date=start, end_date=end)
+        except Exception:
+            bars = None
+
+        if bars and len(bars["date"]):
+            results = await get_indicator_cache().get_indicators(
+                request.stock_code, "daily", "qfq", bars, ["macd", "rsi", "kdj"]
+            )
+            lo = int(np.searchsorted(bars["date"], start))
+            series = {
+                key.partition(":")[0]: {name: values[lo:] for name, values in outputs.items()}
+                for key, outputs in results.items()
+            }
+            indicators = {
+                "macd": series["macd"],
+                "rsi": series["rsi"]["values"],
+                "kdj": series["kdj"],
+            }
 
         task.progress = 30.0
         await send_websocket_update(task.task_id, {"type": "progress", "progress": 30.0})
@@ -1,15 +1,25 @@
 """回测 API 路由"""
 import uuid
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from typing import Dict, Any, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 from ...services.data import get_akshare_service
-from ...services.backtest import get_backtest_engine
+from ...services.data.downsample import downsample_records
+from ...models.analysis import BacktestJobStatus
+from ...services.backtest import (
+    get_backtest_engine,
+    get_backtest_job_service,
+    get_parameter_optimizer,
+    get_portfolio_engine,
+)
 
 router = APIRouter(prefix="/backtest", tags=["backtest"])
 akshare = get_akshare_service()
 backtest_engine = get_backtest_engine(akshare)
+parameter_optimizer = get_parameter_optimizer(akshare)
+portfolio_engine = get_portfolio_engine(akshare)
+job_service = get_backtest_job_service(akshare)
 
 
 class BacktestRequest(BaseModel):
@@ -20,30 +30,222 @@ class BacktestRequest(BaseModel):
     start_date: str = Field(..., description="开始日期 YYYYMMDD")
     end_date: str = Field(..., description="结束日期 YYYYMMDD")
     initial_capital: float = Field(100000.0, description="初始资金")
+    max_points: Optional[int] = Field(None, ge=3, description="权益曲线最多返回的点数 (超出时按 LTTB 降采样)")
+    mode: Literal["vectorized", "event"] = Field(
+        "vectorized", description="回测方式: vectorized (向量化) 或 event (逐 K 线事件循环)"
+    )
+
+
+def _downsample(result: Dict[str, Any], max_points: Optional[int]) -> Dict[str, Any]:
+    """降采样权益曲线 (统计指标已按完整曲线计算；不修改已保存的结果)"""
+    if not max_points:
+        return result
+    return {**result, "equity_curve": downsample_records(result["equity_curve"], "equity", max_points)}
 
 
 @router.post("/")
 async def run_backtest(request: BacktestRequest):
-    """执行回测"""
+    """执行回测 (提交任务并等待结果，相同请求直接返回已保存的结果)"""
     try:
-        result = await backtest_engine.run(
-            stock_code=request.stock_code,
+        result = await job_service.run(request.model_dump(exclude={"max_points"}))
+
+        if not result.get("success"):
+            raise HTTPException(status_code=400, detail=result.get("error", "回测失败"))
+
+        return _downsample(result, request.max_points)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"回测失败: {str(e)}")
+
+
+@router.post("/jobs")
+async def submit_backtest_job(request: BacktestRequest):
+    """提交回测任务，结果已保存时直接返回"""
+    try:
+        job = await job_service.submit(request.model_dump(exclude={"max_points"}))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"提交回测任务失败: {str(e)}")
+
+    result = None
+    if job.status == BacktestJobStatus.COMPLETED:
+        result = await job_service.result(job.task_id)
+        if result is not None:
+            result = _downsample(result, request.max_points)
+    return {"job": job, "result": result}
+
+
+@router.get("/jobs")
+async def get_backtest_job_stats():
+    """回测任务统计"""
+    return job_service.info()
+
+
+@router.get("/jobs/{task_id}")
+async def get_backtest_job(task_id: str):
+    """获取回测任务状态"""
+    job = await job_service.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务未找到")
+    return job
+
+
+@router.get("/jobs/{task_id}/result")
+async def get_backtest_job_result(
+    task_id: str,
+    max_points: Optional[int] = Query(None, ge=3, description="权益曲线最多返回的点数"),
+):
+    """获取回测结果"""
+    job = await job_service.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务未找到")
+    if job.status == BacktestJobStatus.FAILED:
+        raise HTTPException(status_code=400, detail=job.error or "回测失败")
+    if job.status != BacktestJobStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"任务尚未完成: {job.status.value}")
+
+    result = await job_service.result(task_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="回测结果已过期")
+    return _downsample(result, max_points)
+
+
+@router.websocket("/ws/{task_id}")
+async def websocket_backtest_job(websocket: WebSocket, task_id: str):
+    """WebSocket 推送回测任务状态，任务结束后关闭"""
+    await websocket.accept()
+    # 先订阅再读取当前状态，避免错过中间的状态变化
+    queue = job_service.watch(task_id)
+
+    try:
+        job = await job_service.get(task_id)
+        if job is None:
+            await websocket.send_json({"type": "error", "message": "任务未找到"})
+            await websocket.close()
+            return
+
+        await websocket.send_json({"type": "status", "data": job.model_dump(mode="json")})
+        while job.status not in (BacktestJobStatus.COMPLETED, BacktestJobStatus.FAILED):
+            job = await queue.get()
+            await websocket.send_json({"type": "status", "data": job.model_dump(mode="json")})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job_service.unwatch(task_id, queue)
+
+
+class PortfolioBacktestRequest(BaseModel):
+    """组合回测请求"""
+    stock_pool: List[str] = Field(..., min_length=1, description="股票池")
+    strategy_type: str = Field(..., description="策略类型: sma_cross, macd, rsi, boll, buy_hold")
+    strategy_params: Dict[str, Any] = Field(default_factory=dict, description="策略参数 (每只股票相同)")
+    start_date: str = Field(..., description="开始日期 YYYYMMDD")
+    end_date: str = Field(..., description="结束日期 YYYYMMDD")
+    initial_capital: float = Field(100000.0, gt=0, description="初始资金")
+    allocation: Literal["equal_weight", "fixed_cash"] = Field(
+        "equal_weight", description="分配规则: equal_weight (空余仓位平分现金) 或 fixed_cash (每仓固定金额)"
+    )
+    slot_cash: Optional[float] = Field(None, gt=0, description="fixed_cash 时每个仓位的金额")
+    max_positions: Optional[int] = Field(None, ge=1, description="同时持有的股票数上限，默认不限")
+    max_points: Optional[int] = Field(None, ge=3, description="权益曲线最多返回的点数 (超出时按 LTTB 降采样)")
+
+
+@router.post("/portfolio")
+async def run_portfolio_backtest(request: PortfolioBacktestRequest):
+    """执行组合回测"""
+    try:
+        result = await portfolio_engine.run(
+            stock_pool=request.stock_pool,
             strategy_type=request.strategy_type,
             strategy_params=request.strategy_params,
             start_date=request.start_date,
             end_date=request.end_date,
             initial_capital=request.initial_capital,
+            allocation=request.allocation,
+            slot_cash=request.slot_cash,
+            max_positions=request.max_positions,
         )
 
         if not result.get("success"):
-            raise HTTPException(status_code=400, detail=result.get("error", "回测失败"))
+            raise HTTPException(status_code=400, detail=result.get("error", "组合回测失败"))
+
+        if request.max_points:
+            result["equity_curve"] = downsample_records(
+                result["equity_curve"], "equity", request.max_points
+            )
 
         return result
 
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"回测失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"组合回测失败: {str(e)}")
+
+
+class ParamRange(BaseModel):
+    """参数取值范围 (values 优先，未指定的字段使用策略模板)"""
+    min: Optional[float] = Field(None, description="最小值")
+    max: Optional[float] = Field(None, description="最大值")
+    step: Optional[float] = Field(None, gt=0, description="步长，默认整数参数为 1、小数参数为 0.1")
+    values: Optional[List[float]] = Field(None, description="指定的取值列表")
+
+
+class OptimizeRequest(BaseModel):
+    """参数寻优请求"""
+    stock_code: str = Field(..., description="股票代码")
+    strategy_type: str = Field(..., description="策略类型: sma_cross, macd, rsi, boll")
+    start_date: str = Field(..., description="开始日期 YYYYMMDD")
+    end_date: str = Field(..., description="结束日期 YYYYMMDD")
+    initial_capital: float = Field(100000.0, description="初始资金")
+    param_ranges: Dict[str, ParamRange] = Field(
+        default_factory=dict, description="参数范围，未指定的参数使用策略模板的范围"
+    )
+    method: Literal["grid", "random"] = Field("grid", description="搜索方法: grid (网格) 或 random (随机)")
+    samples: int = Field(1000, ge=1, description="随机搜索的组合数")
+    objective: Literal["sharpe_ratio", "total_return", "return_drawdown"] = Field(
+        "sharpe_ratio", description="目标函数: 夏普比率、总收益或收益回撤比"
+    )
+    max_drawdown: Optional[float] = Field(None, gt=0, description="最大回撤上限 (百分比)")
+    top_n: int = Field(20, ge=1, le=1000, description="返回的组合数")
+    seed: Optional[int] = Field(None, description="随机搜索的随机种子")
+
+
+@router.post("/optimize")
+async def optimize_strategy(request: OptimizeRequest):
+    """策略参数寻优"""
+    try:
+        result = await parameter_optimizer.optimize(
+            stock_code=request.stock_code,
+            strategy_type=request.strategy_type,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            initial_capital=request.initial_capital,
+            param_ranges={
+                name: param_range.model_dump(exclude_none=True)
+                for name, param_range in request.param_ranges.items()
+            },
+            method=request.method,
+            samples=request.samples,
+            objective=request.objective,
+            max_drawdown=request.max_drawdown,
+            top_n=request.top_n,
+            seed=request.seed,
+        )
+
+        if not result.get("success"):
+            raise HTTPException(status_code=400, detail=result.get("error", "参数寻优失败"))
+
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"参数寻优失败: {str(e)}")
 
 
 @router.get("/templates")
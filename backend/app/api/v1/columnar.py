@@ -0,0 +1,76 @@
+"""列式 JSON 响应
+
+format=columnar 时按列返回并行数组，不再逐条重复字段名：
+- 日期为 ISO 字符串 (date_format=iso) 或 1970-01-01 起的天数 (date_format=epoch)
+- NaN/Inf 输出为 null，可选 float32 精度 (按 float32 最短表示输出，体积更小)
+- 使用 orjson 直接序列化 NumPy 数组，按 Accept-Encoding 进行 brotli/gzip 压缩
+"""
+import gzip
+from typing import Any, Iterable, Literal, Optional
+
+import numpy as np
+import orjson
+from fastapi import Request, Response
+
+from ...core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ResponseFormat = Literal["records", "columnar"]
+DateFormat = Literal["iso", "epoch"]
+Precision = Literal["float64", "float32"]
+
+
+def encode_dates(dates: np.ndarray, date_format: DateFormat = "iso") -> Any:
+    """日期列编码 (datetime64[D] -> ISO 字符串列表或 epoch 天数数组)"""
+    days = np.asarray(dates, dtype="datetime64[D]")
+    if date_format == "epoch":
+        return days.astype(np.int64)
+    return days.astype(str).tolist()
+
+
+def encode_values(values: Iterable, precision: Precision = "float64") -> np.ndarray:
+    """数值列编码 (None 转为 NaN，输出时为 null)"""
+    dtype = np.float32 if precision == "float32" else np.float64
+    array = np.asarray(values, dtype=np.float64)
+    if array.dtype != dtype:
+        array = array.astype(dtype)
+    return np.ascontiguousarray(array)
+
+
+def _compress(body: bytes, accept_encoding: str) -> tuple[bytes, Optional[str]]:
+    """按客户端支持的编码压缩 (优先 brotli)"""
+    if len(body) < settings.RESPONSE_COMPRESS_MIN_BYTES:
+        return body, None
+
+    accepted = {item.split(";")[0].strip().lower() for item in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def columnar_response(request: Request, content: Any) -> Response:
+    """orjson 序列化并压缩的 JSON 响应
+
+    Args:
+        request: 当前请求 (读取 Accept-Encoding)
+        content: 响应内容，可包含 NumPy 数组 (NaN/Inf 序列化为 null)
+
+    Returns:
+        JSON 响应
+    """
+    body = orjson.dumps(
+        content,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+    body, encoding = _compress(body, request.headers.get("accept-encoding", ""))
+
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
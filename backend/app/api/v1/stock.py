@@ -1,33 +1,62 @@
 """股票数据 API 路由"""
-from fastapi import APIRouter, HTTPException, Query
+import logging
+
+from fastapi import APIRouter, HTTPException, Path, Query, Request
 from typing import Optional
 
+import numpy as np
+
 from ...models.stock import StockQuote, KLineData, FundamentalData, StockInfo
 from ...services.data import get_akshare_service, get_cache_service
-from ...services.indicators import technical_calculator
+from ...services.data.convert import bars_to_records
+from ...services.data.downsample import downsample_bars, lttb_indices
+from ...services.data.kline_store import KLINE_COLUMNS, Bars
+from ...services.data.resample import validate_period
+from ...services.data.trading_calendar import get_trading_calendar
+from ...services.indicators import IndicatorSpec, get_indicator_cache, parse_specs
+from .columnar import (
+    DateFormat,
+    Precision,
+    ResponseFormat,
+    columnar_response,
+    encode_dates,
+    encode_values,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/stocks", tags=["stocks"])
 akshare = get_akshare_service()
 cache = get_cache_service()
+indicator_cache = get_indicator_cache()
+trading_calendar = get_trading_calendar()
 
 
 @router.get("/search")
-async def search_stocks(q: str = Query(..., description="搜索关键词")):
-    """搜索股票"""
-    cache_key = f"stock:search:{q}"
+async def search_stocks(
+    q: str = Query(..., description="搜索关键词: 代码、名称或拼音首字母"),
+    limit: int = Query(20, ge=1, le=100, description="返回结果数量限制"),
+):
+    """搜索股票 (内存索引，行情价格取自当前快照，不再经过 Redis 缓存)"""
+    return await akshare.search_stocks(q, limit)
 
-    # 尝试从缓存获取
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
 
-    # 从 Akshare 获取
-    results = await akshare.search_stocks(q)
+@router.get("/search/index")
+async def get_search_index_info():
+    """获取股票搜索索引的规模与构建信息"""
+    return akshare.search_service.info()
+
 
-    # 缓存结果 (5分钟)
-    await cache.set(cache_key, results, ttl=300)
+@router.get("/snapshot")
+async def get_snapshot_info():
+    """获取全市场行情快照的版本与更新时间"""
+    return akshare.snapshot_service.info()
 
-    return results
+
+@router.get("/upstream/stats")
+async def get_upstream_stats():
+    """获取上游数据调用统计 (请求合并等)"""
+    return akshare.upstream_stats()
 
 
 @router.get("/{code}/quote", response_model=StockQuote)
@@ -35,7 +64,7 @@ async def get_stock_quote(code: str):
     """获取实时行情"""
     cache_key = f"stock:{code}:quote"
 
-    # 尝试从缓存获取 (1分钟)
+    # 尝试从缓存获取 (交易时段 1 分钟，休市期间到下一次开盘)
     cached = await cache.get(cache_key)
     if cached:
         return cached
@@ -47,7 +76,7 @@ async def get_stock_quote(code: str):
         raise HTTPException(status_code=404, detail=f"股票 {code} 未找到")
 
     # 缓存结果
-    await cache.set(cache_key, quote, ttl=60)
+    await cache.set(cache_key, quote, ttl=trading_calendar.ttl(60))
 
     return quote
 
@@ -76,16 +105,41 @@ async def get_stock_info(code: str):
 
 @router.get("/{code}/kline")
 async def get_kline_data(
+    request: Request,
     code: str,
-    period: str = Query("daily", description="周期: daily, weekly, monthly"),
+    period: str = Query("daily", description="周期: daily, weekly, monthly, quarterly 或 N 日 (如 5d)"),
     start_date: Optional[str] = Query(None, description="开始日期 YYYYMMDD"),
     end_date: Optional[str] = Query(None, description="结束日期 YYYYMMDD"),
     adjust: str = Query("qfq", description="复权: qfq, hfq, 空"),
+    response_format: ResponseFormat = Query("records", alias="format", description="records 或 columnar"),
+    date_format: DateFormat = Query("iso", description="列式日期: iso 或 epoch (1970-01-01 起的天数)"),
+    precision: Precision = Query("float64", description="列式价格精度: float64 或 float32"),
+    max_points: Optional[int] = Query(None, ge=3, description="最多返回的 K 线数 (超出时按 OHLC 分桶聚合)"),
 ):
     """获取 K线数据"""
-    cache_key = f"stock:{code}:kline:{period}:{start_date}:{end_date}:{adjust}"
-
-    # 尝试从缓存获取 (1小时)
+    if response_format == "columnar" or max_points:
+        bars = await _load_kline_bars(code, period, start_date, end_date, adjust)
+        if max_points:
+            bars = downsample_bars(bars, max_points)
+        if response_format == "records":
+            return bars_to_records(bars)
+
+        content = {"code": code, "date": encode_dates(bars["date"], date_format)}
+        for column in KLINE_COLUMNS[1:]:
+            # 成交量/成交额数值较大，float32 会丢失有效数字，始终按 float64 输出
+            price = column not in ("volume", "amount")
+            content[column] = encode_values(bars[column], precision if price else "float64")
+        return columnar_response(request, content)
+
+    try:
+        validate_period(period)
+        # 复权价格随复权因子变化，因子版本进入缓存 key
+        version = await akshare.adjust_version(code, adjust)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cache_key = f"stock:{code}:kline:{period}:{start_date}:{end_date}:{adjust}:{version}"
+
+    # 尝试从缓存获取 (交易时段 1 小时，休市期间到下一次开盘)
     cached = await cache.get(cache_key)
     if cached:
         return cached
@@ -97,11 +151,34 @@ async def get_kline_data(
         raise HTTPException(status_code=404, detail=f"股票 {code} K线数据未找到")
 
     # 缓存结果
-    await cache.set(cache_key, kline_data, ttl=3600)
+    await cache.set(cache_key, kline_data, ttl=trading_calendar.ttl(3600))
 
     return kline_data
 
 
+async def _load_kline_bars(
+    code: str,
+    period: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    adjust: str,
+) -> Bars:
+    """列式 K 线 (直接读取本地列式存储)"""
+    try:
+        bars = await akshare.get_kline_bars(code, period, start_date, end_date, adjust)
+    except ValueError as e:
+        # 周期或复权类型无效
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"获取股票 {code} K线数据失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取K线数据失败: {str(e)}")
+
+    if len(bars["date"]) == 0:
+        raise HTTPException(status_code=404, detail=f"股票 {code} K线数据未找到")
+
+    return bars
+
+
 @router.get("/{code}/fundamental")
 async def get_fundamental_data(code: str):
     """获取基本面数据"""
@@ -124,53 +201,107 @@ async def get_fundamental_data(code: str):
     return data
 
 
+async def _load_indicators(
+    code: str,
+    specs: list[IndicatorSpec],
+    period: str = "daily",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    adjust: str = "qfq",
+) -> tuple[np.ndarray, dict[str, dict[str, list]]]:
+    """在完整 K 线历史上计算 (或从缓存读取) 指标，并截取请求区间
+
+    Returns:
+        (日期数组, 规格 key -> 输出名 -> 序列)
+    """
+    start, end = akshare.kline_range(start_date, end_date)
+    try:
+        bars = await akshare.get_kline_history(code, period, start, end, adjust)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"获取股票 {code} K线数据失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取K线数据失败: {str(e)}")
+
+    if len(bars["date"]) == 0 or bars["date"][-1] < start:
+        raise HTTPException(status_code=404, detail=f"股票 {code} K线数据未找到")
+
+    series = await indicator_cache.get_indicators(code, period, adjust, bars, specs)
+
+    lo = int(np.searchsorted(bars["date"], start))
+    return bars["date"][lo:], {
+        key: {name: values[lo:] for name, values in outputs.items()}
+        for key, outputs in series.items()
+    }
+
+
+@router.get("/{code}/indicators")
+async def get_technical_indicators(
+    request: Request,
+    code: str,
+    spec: list[str] = Query(..., description="指标规格，可重复: sma:20, macd:12,26,9, kdj, boll:20,2"),
+    period: str = Query("daily", description="周期: daily, weekly, monthly, quarterly 或 N 日 (如 5d)"),
+    start_date: Optional[str] = Query(None, description="开始日期 YYYYMMDD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYYMMDD"),
+    adjust: str = Query("qfq", description="复权: qfq, hfq, 空"),
+    response_format: ResponseFormat = Query("records", alias="format", description="records 或 columnar"),
+    date_format: DateFormat = Query("iso", description="列式日期: iso 或 epoch (1970-01-01 起的天数)"),
+    precision: Precision = Query("float64", description="列式数值精度: float64 或 float32"),
+    max_points: Optional[int] = Query(None, ge=3, description="最多返回的点数 (超出时按 LTTB 降采样)"),
+):
+    """批量计算技术指标 (一次 K 线读取，公共中间量只计算一次，结果按内容缓存)"""
+    try:
+        specs = parse_specs(spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    dates, series = await _load_indicators(code, specs, period, start_date, end_date, adjust)
+
+    index = None
+    if max_points and len(dates) > max_points:
+        # 所有指标共用一组下标，保持与日期对齐
+        lines = [values for outputs in series.values() for values in outputs.values()]
+        index = lttb_indices(np.array(lines, dtype=np.float64), max_points)
+        dates = dates[index]
+
+    columnar = response_format == "columnar"
+    indicators = {}
+    for item in specs:
+        outputs = series[item.key]
+        if columnar:
+            outputs = {name: encode_values(values, precision) for name, values in outputs.items()}
+            if index is not None:
+                outputs = {name: values[index] for name, values in outputs.items()}
+        elif index is not None:
+            outputs = {name: [values[i] for i in index.tolist()] for name, values in outputs.items()}
+        indicators[item.key] = {
+            "name": item.label,
+            "params": item.param_dict(),
+            **outputs,
+        }
+
+    content = {
+        "code": code,
+        "dates": encode_dates(dates, date_format) if columnar else dates.astype(str).tolist(),
+        "indicators": indicators,
+    }
+    return columnar_response(request, content) if columnar else content
+
+
 @router.get("/{code}/indicators/{indicator}")
 async def get_technical_indicator(
     code: str,
-    indicator: str = Query(..., description="指标: sma, ema, macd, rsi, kdj, boll, cci, wr"),
+    indicator: str = Path(..., description="指标: sma, ema, macd, rsi, kdj, boll, cci, wr"),
     period: int = Query(20, description="计算周期"),
 ):
     """计算技术指标"""
-    # 获取 K线数据
-    kline_data = await akshare.get_kline_data(code)
-
-    if not kline_data:
-        raise HTTPException(status_code=404, detail=f"股票 {code} 数据未找到")
-
-    # 提取价格数据
-    close = [k["close"] for k in kline_data]
-    high = [k["high"] for k in kline_data]
-    low = [k["low"] for k in kline_data]
-    open_price = [k["open_price"] for k in kline_data]
-
-    # 计算指标
-    result = None
-
-    if indicator == "sma":
-        values = technical_calculator.sma(close, period)
-        result = {"name": f"SMA({period})", "values": values}
-    elif indicator == "ema":
-        values = technical_calculator.ema(close, period)
-        result = {"name": f"EMA({period})", "values": values}
-    elif indicator == "macd":
-        result = technical_calculator.macd(close)
-        result["name"] = "MACD"
-    elif indicator == "rsi":
-        values = technical_calculator.rsi(close, period)
-        result = {"name": f"RSI({period})", "values": values}
-    elif indicator == "kdj":
-        result = technical_calculator.kdj(high, low, close)
-        result["name"] = "KDJ"
-    elif indicator == "boll":
-        result = technical_calculator.bollinger_bands(close, period)
-        result["name"] = f"BOLL({period})"
-    elif indicator == "cci":
-        values = technical_calculator.cci(high, low, close, period)
-        result = {"name": f"CCI({period})", "values": values}
-    elif indicator == "wr":
-        values = technical_calculator.wr(high, low, close, period)
-        result = {"name": f"WR({period})", "values": values}
-    else:
+    # MACD、KDJ 使用默认参数，其余指标的第一个参数为计算周期
+    text = indicator if indicator in ("macd", "kdj") else f"{indicator}:{period}"
+    try:
+        spec = IndicatorSpec.parse(text)
+    except ValueError:
         raise HTTPException(status_code=400, detail=f"不支持的指标: {indicator}")
 
-    return result
+    _, series = await _load_indicators(code, [spec])
+
+    return {"name": spec.label, **series[spec.key]}
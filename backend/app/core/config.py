@@ -50,9 +50,60 @@ class Settings(BaseSettings):
 
     # Akshare 配置 (无需 API Key)
     AKSHARE_ENABLED: bool = Field(default=True, description="是否启用 Akshare")
+    SNAPSHOT_REFRESH_INTERVAL: int = Field(default=30, description="全市场行情快照刷新间隔(秒)")
+    FETCH_MAX_WORKERS: int = Field(default=16, description="上游数据调用线程池大小")
+    FETCH_TIMEOUT: float = Field(default=30.0, description="单次上游调用超时(秒)")
+    FETCH_CONCURRENCY: dict[str, int] = Field(
+        default={"spot": 2, "hist": 8, "financial": 4, "news": 4, "info": 4, "default": 4},
+        description="各上游端点的并发上限",
+    )
+    KLINE_STORE_DIR: str = Field(default="data/kline", description="本地 K 线存储目录")
+    KLINE_STORE_REFRESH_INTERVAL: int = Field(
+        default=60, description="同一 K 线向上游检查新数据的最小间隔(秒)"
+    )
+    ADJUST_FACTOR_REFRESH_INTERVAL: int = Field(
+        default=3600, description="同一股票向上游检查新复权因子的最小间隔(秒)"
+    )
+    TRADING_CALENDAR_FILE: str = Field(
+        default="", description="交易所节假日文件 (每行一个日期)，为空时使用内置文件"
+    )
+    MARKET_CLOSE_GRACE: int = Field(
+        default=600, description="交易时段结束后仍视为行情可能变化的时间(秒)"
+    )
+
+    # 回测配置
+    BACKTEST_MAX_WORKERS: int = Field(default=0, description="回测进程池大小，0 为 CPU 核数")
+    OPTIMIZE_MAX_COMBINATIONS: int = Field(default=100000, description="单次参数寻优的最大参数组合数")
+    OPTIMIZE_PARALLEL_MIN: int = Field(
+        default=500, description="参数组合数达到该值才使用进程池，否则在线程中直接计算"
+    )
+    BACKTEST_RESULT_TTL: int = Field(default=30 * 86400, description="回测结果保存时间(秒)")
+    BACKTEST_JOB_HISTORY: int = Field(default=1000, description="进程内保留的已结束回测任务数")
 
     # 缓存配置
     CACHE_TTL: int = Field(default=3600, description="缓存过期时间(秒)")
+    CACHE_CODEC: Literal["orjson", "msgpack", "json"] = Field(
+        default="orjson", description="缓存序列化格式"
+    )
+    CACHE_COMPRESSION: Literal["zstd", "zlib", "none"] = Field(
+        default="zstd", description="缓存压缩算法"
+    )
+    CACHE_COMPRESS_MIN_BYTES: int = Field(default=1024, description="超过该字节数才压缩")
+    CACHE_L1_ENABLED: bool = Field(default=True, description="是否启用进程内一级缓存")
+    CACHE_L1_MAX_ENTRIES: int = Field(default=10000, description="一级缓存最大条目数")
+    CACHE_L1_MAX_BYTES: int = Field(default=64 * 1024 * 1024, description="一级缓存最大字节数(估算)")
+    CACHE_INVALIDATION_CHANNEL: str = Field(
+        default="cache:invalidate",
+        description="多 worker 一级缓存失效广播频道，留空则不订阅",
+    )
+    INDICATOR_CACHE_TTL: int = Field(
+        default=7 * 86400, description="指标结果缓存过期时间(秒)，覆盖节假日以便增量扩展"
+    )
+
+    # 响应配置
+    RESPONSE_COMPRESS_MIN_BYTES: int = Field(default=1024, description="列式响应超过该字节数才压缩")
+    RESPONSE_GZIP_LEVEL: int = Field(default=6, description="列式响应 gzip 压缩级别")
+    RESPONSE_BROTLI_QUALITY: int = Field(default=5, description="列式响应 brotli 压缩质量")
 
     # 日志配置
     LOG_LEVEL: str = Field(default="INFO", description="日志级别")
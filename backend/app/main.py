@@ -6,7 +6,9 @@ import logging
 
 from .core.config import settings
 from .api.v1 import router as api_v1_router
-from .services.data import get_cache_service
+from .services.data import get_cache_service, get_snapshot_service
+from .services.data.scheduler import get_fetch_scheduler
+from .services.backtest import shutdown_backtest_pool
 
 # 配置日志
 logging.basicConfig(
@@ -23,8 +25,14 @@ async def lifespan(app: FastAPI):
     # 初始化 Redis 连接
     cache_service = get_cache_service()
     await cache_service.connect()
+    # 启动全市场行情快照刷新
+    snapshot_service = get_snapshot_service()
+    snapshot_service.start()
     yield
     logger.info("关闭股票分析系统后端服务...")
+    await snapshot_service.stop()
+    get_fetch_scheduler().shutdown()
+    shutdown_backtest_pool()
     # 关闭 Redis 连接
     await cache_service.disconnect()
 
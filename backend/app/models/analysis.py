@@ -129,3 +129,26 @@ class BacktestResult(BaseModel):
     total_trades: int = Field(..., description="总交易次数")
     profit_trades: int = Field(..., description="盈利交易次数")
     loss_trades: int = Field(..., description="亏损交易次数")
+
+
+class BacktestJobStatus(str, Enum):
+    """回测任务状态"""
+
+    QUEUED = "queued"  # 排队中
+    RUNNING = "running"  # 计算中
+    COMPLETED = "completed"  # 已完成
+    FAILED = "failed"  # 失败
+
+
+class BacktestJob(BaseModel):
+    """回测任务 (task_id 为请求参数和数据版本的哈希，相同请求对应同一任务)"""
+
+    task_id: str = Field(..., description="任务 ID")
+    stock_code: str = Field(..., description="股票代码")
+    strategy_type: str = Field(..., description="策略类型")
+    status: BacktestJobStatus = Field(default=BacktestJobStatus.QUEUED, description="任务状态")
+    progress: float = Field(default=0.0, description="进度 0-100")
+    cached: bool = Field(default=False, description="结果是否来自已保存的结果")
+    error: Optional[str] = Field(None, description="失败原因")
+    created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
+    updated_at: datetime = Field(default_factory=datetime.now, description="更新时间")
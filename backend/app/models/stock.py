@@ -29,6 +29,7 @@ class StockQuote(BaseModel):
     open_price: float = Field(..., description="开盘价")
     close_prev: float = Field(..., description="昨收价")
     timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
+    snapshot_version: Optional[int] = Field(None, description="行情快照版本号")
 
 
 class KLineData(BaseModel):
@@ -1,4 +1,19 @@
 """回测服务"""
 from .engine import BacktestEngine, get_backtest_engine
+from .jobs import BacktestJobService, get_backtest_job_service
+from .optimizer import ParameterOptimizer, get_parameter_optimizer
+from .portfolio import PortfolioBacktestEngine, get_portfolio_engine
+from .pool import get_backtest_pool, shutdown_backtest_pool
 
-__all__ = ['BacktestEngine', 'get_backtest_engine']
+__all__ = [
+    'BacktestEngine',
+    'get_backtest_engine',
+    'BacktestJobService',
+    'get_backtest_job_service',
+    'ParameterOptimizer',
+    'get_parameter_optimizer',
+    'PortfolioBacktestEngine',
+    'get_portfolio_engine',
+    'get_backtest_pool',
+    'shutdown_backtest_pool',
+]
@@ -4,6 +4,11 @@ from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime
 from decimal import Decimal
 
+import numpy as np
+
+from . import vectorized
+from .execution import SELL, Execution, execute_signals, signal_arrays
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,6 +32,7 @@ class BacktestEngine:
         start_date: str,
         end_date: str,
         initial_capital: float = 100000.0,
+        mode: str = "vectorized",
     ) -> Dict[str, Any]:
         """
         执行回测
@@ -38,6 +44,7 @@ class BacktestEngine:
             start_date: 开始日期 (YYYYMMDD)
             end_date: 结束日期 (YYYYMMDD)
             initial_capital: 初始资金
+            mode: vectorized (向量化，信号类策略默认) 或 event (逐 K 线事件循环)
 
         Returns:
             回测结果
@@ -58,39 +65,16 @@ class BacktestEngine:
                     "error": "数据不足，无法回测",
                 }
 
-            # 执行回测
-            if strategy_type == "sma_cross":
-                result = self._sma_cross_strategy(kline_data, strategy_params, initial_capital)
-            elif strategy_type == "macd":
-                result = self._macd_strategy(kline_data, strategy_params, initial_capital)
-            elif strategy_type == "rsi":
-                result = self._rsi_strategy(kline_data, strategy_params, initial_capital)
-            elif strategy_type == "boll":
-                result = self._boll_strategy(kline_data, strategy_params, initial_capital)
-            elif strategy_type == "buy_hold":
-                result = self._buy_hold_strategy(kline_data, initial_capital)
-            else:
-                return {
-                    "success": False,
-                    "error": f"未知策略类型: {strategy_type}",
-                }
-
-            # 计算基准收益（买入持有）
-            benchmark = self._buy_hold_strategy(kline_data, initial_capital)
-
-            # 计算相对收益
-            result["benchmark_return"] = benchmark["total_return"]
-            result["excess_return"] = result["total_return"] - benchmark["total_return"]
-
-            # 添加基本信息
-            result["stock_code"] = stock_code
-            result["stock_name"] = kline_data[0].get("name", "")
-            result["start_date"] = start_date
-            result["end_date"] = end_date
-            result["initial_capital"] = initial_capital
-            result["success"] = True
-
-            return result
+            return self.backtest(
+                kline_data,
+                stock_code,
+                strategy_type,
+                strategy_params,
+                start_date,
+                end_date,
+                initial_capital,
+                mode,
+            )
 
         except Exception as e:
             logger.error(f"回测失败: {e}")
@@ -99,6 +83,64 @@ class BacktestEngine:
                 "error": str(e),
             }
 
+    def backtest(
+        self,
+        kline_data: List[Dict[str, Any]],
+        stock_code: str,
+        strategy_type: str,
+        strategy_params: Dict[str, Any],
+        start_date: str,
+        end_date: str,
+        initial_capital: float = 100000.0,
+        mode: str = "vectorized",
+    ) -> Dict[str, Any]:
+        """
+        在已加载的日线上执行回测 (纯计算，可在工作进程中运行)
+
+        Args:
+            kline_data: 日线记录 (date, close)
+            其余参数同 run
+
+        Returns:
+            回测结果
+        """
+        if mode == "vectorized" and strategy_type in vectorized.STRATEGY_ACTIONS:
+            result = self._vectorized_strategy(
+                kline_data, strategy_type, strategy_params, initial_capital
+            )
+        elif strategy_type == "sma_cross":
+            result = self._sma_cross_strategy(kline_data, strategy_params, initial_capital)
+        elif strategy_type == "macd":
+            result = self._macd_strategy(kline_data, strategy_params, initial_capital)
+        elif strategy_type == "rsi":
+            result = self._rsi_strategy(kline_data, strategy_params, initial_capital)
+        elif strategy_type == "boll":
+            result = self._boll_strategy(kline_data, strategy_params, initial_capital)
+        elif strategy_type == "buy_hold":
+            result = self._buy_hold_strategy(kline_data, initial_capital)
+        else:
+            return {
+                "success": False,
+                "error": f"未知策略类型: {strategy_type}",
+            }
+
+        # 计算基准收益（买入持有）
+        benchmark = self._buy_hold_strategy(kline_data, initial_capital)
+
+        # 计算相对收益
+        result["benchmark_return"] = benchmark["total_return"]
+        result["excess_return"] = result["total_return"] - benchmark["total_return"]
+
+        # 添加基本信息
+        result["stock_code"] = stock_code
+        result["stock_name"] = kline_data[0].get("name", "")
+        result["start_date"] = start_date
+        result["end_date"] = end_date
+        result["initial_capital"] = initial_capital
+        result["success"] = True
+
+        return result
+
     def _sma_cross_strategy(
         self,
         data: List[Dict[str, Any]],
@@ -136,7 +178,12 @@ class BacktestEngine:
         from ...services.indicators.technical import technical_calculator
 
         close_prices = [d["close"] for d in data]
-        macd_data = technical_calculator.macd(close_prices)
+        macd_data = technical_calculator.macd(
+            close_prices,
+            params.get("fast_period", 12),
+            params.get("slow_period", 26),
+            params.get("signal_period", 9),
+        )
 
         # 生成交易信号
         signals = []
@@ -200,7 +247,9 @@ class BacktestEngine:
         period = params.get("period", 20)
 
         close_prices = [d["close"] for d in data]
-        boll_data = technical_calculator.bollinger_bands(close_prices, period)
+        boll_data = technical_calculator.bollinger_bands(
+            close_prices, period, params.get("std_dev", 2.0)
+        )
 
         # 生成交易信号
         signals = []
@@ -258,67 +307,57 @@ class BacktestEngine:
         initial_capital: float,
     ) -> Dict[str, Any]:
         """执行交易并计算收益"""
-        capital = initial_capital
-        position = 0  # 持股数量
-        trades = []
-        equity_curve = []
-
-        for i, d in enumerate(data):
-            # 检查是否有信号
-            for signal in signals:
-                if signal["index"] == i:
-                    if signal["action"] == "buy" and capital > 0:
-                        # 买入
-                        shares = capital // signal["price"]
-                        if shares > 0:
-                            position = shares
-                            capital = capital - shares * signal["price"]
-                            trades.append({
-                                "date": d["date"],
-                                "action": "buy",
-                                "price": signal["price"],
-                                "shares": shares,
-                            })
-                    elif signal["action"] == "sell" and position > 0:
-                        # 卖出
-                        capital = capital + position * signal["price"]
-                        trades.append({
-                            "date": d["date"],
-                            "action": "sell",
-                            "price": signal["price"],
-                            "shares": position,
-                        })
-                        position = 0
-
-            # 计算当前权益
-            current_equity = capital + position * d["close"]
-            equity_curve.append({
-                "date": d["date"],
-                "equity": current_equity,
-            })
+        dates = [d["date"] for d in data]
+        close = np.array([d["close"] for d in data], dtype=np.float64)
+        execution = execute_signals(close, *signal_arrays(signals), initial_capital)
+        equity = execution.equity
 
         # 最终价值
-        final_capital = capital + position * data[-1]["close"]
+        final_capital = float(equity[-1])
         total_return = ((final_capital - initial_capital) / initial_capital) * 100
 
         # 计算统计指标
-        returns = []
-        for i in range(1, len(equity_curve)):
-            daily_return = (equity_curve[i]["equity"] - equity_curve[i - 1]["equity"]) / equity_curve[i - 1]["equity"]
-            returns.append(daily_return)
-
-        win_trades = [t for t in trades if t["action"] == "sell"]
-        total_trades = len(win_trades)
-
-        return {
+        returns = (np.diff(equity) / equity[:-1]).tolist()
+        metrics = {
             "total_return": total_return,
             "final_capital": final_capital,
-            "trades": trades,
-            "total_trades": total_trades,
-            "equity_curve": equity_curve,
-            "max_drawdown": self._calculate_max_drawdown(equity_curve),
+            "max_drawdown": self._calculate_max_drawdown(equity),
             "sharpe_ratio": self._calculate_sharpe_ratio(returns) if returns else 0,
         }
+        return self._format_result(dates, execution, metrics)
+
+    def _vectorized_strategy(
+        self,
+        data: List[Dict[str, Any]],
+        strategy_type: str,
+        params: Dict[str, Any],
+        initial_capital: float,
+    ) -> Dict[str, Any]:
+        """向量化回测 (信号类策略，成交与事件循环一致)"""
+        dates = [d["date"] for d in data]
+        close = np.array([d["close"] for d in data], dtype=np.float64)
+        execution, metrics = vectorized.backtest(close, strategy_type, params, initial_capital)
+        return self._format_result(dates, execution, metrics)
+
+    @staticmethod
+    def _format_result(
+        dates: List[Any],
+        execution: Execution,
+        metrics: Dict[str, float],
+    ) -> Dict[str, Any]:
+        """执行结果转为返回记录"""
+        return {
+            "total_return": metrics["total_return"],
+            "final_capital": metrics["final_capital"],
+            "trades": execution.trades(dates),
+            "total_trades": int(np.count_nonzero(execution.trade_action == SELL)),
+            "equity_curve": [
+                {"date": day, "equity": value}
+                for day, value in zip(dates, execution.equity.tolist())
+            ],
+            "max_drawdown": metrics["max_drawdown"],
+            "sharpe_ratio": metrics["sharpe_ratio"],
+        }
 
     def _calculate_sma(self, data: List[float], period: int) -> List[Optional[float]]:
         """计算简单移动平均"""
@@ -331,21 +370,14 @@ class BacktestEngine:
                 result.append(avg)
         return result
 
-    def _calculate_max_drawdown(self, equity_curve: List[Dict[str, Any]]) -> float:
-        """计算最大回撤"""
-        if not equity_curve:
+    def _calculate_max_drawdown(self, equity: np.ndarray) -> float:
+        """计算最大回撤 (百分比)"""
+        if len(equity) == 0:
             return 0
 
-        peak = equity_curve[0]["equity"]
-        max_drawdown = 0
-
-        for item in equity_curve:
-            if item["equity"] > peak:
-                peak = item["equity"]
-            drawdown = (peak - item["equity"]) / peak * 100
-            max_drawdown = max(max_drawdown, drawdown)
-
-        return max_drawdown
+        peak = np.maximum.accumulate(equity)
+        drawdown = (peak - equity) / peak * 100
+        return max(0, float(drawdown.max()))
 
     def _calculate_sharpe_ratio(self, returns: List[float], risk_free_rate: float = 0.03) -> float:
         """计算夏普比率"""
@@ -382,7 +414,11 @@ class BacktestEngine:
                 "id": "macd",
                 "name": "MACD",
                 "description": "MACD 上穿 Signal 线买入，下穿卖出",
-                "params": {},
+                "params": {
+                    "fast_period": {"name": "快线周期", "default": 12, "min": 2, "max": 50},
+                    "slow_period": {"name": "慢线周期", "default": 26, "min": 5, "max": 100},
+                    "signal_period": {"name": "信号线周期", "default": 9, "min": 2, "max": 50},
+                },
             },
             {
                 "id": "rsi",
@@ -400,6 +436,7 @@ class BacktestEngine:
                 "description": "价格触及下轨买入，触及上轨卖出",
                 "params": {
                     "period": {"name": "周期", "default": 20, "min": 10, "max": 50},
+                    "std_dev": {"name": "标准差倍数", "default": 2.0, "min": 1.0, "max": 3.0, "step": 0.1},
                 },
             },
             {
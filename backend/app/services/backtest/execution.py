@@ -0,0 +1,134 @@
+"""回测交易执行
+
+信号按 K 线下标存放在并行数组中 (下标、动作、价格)，只在有信号的 K 线上逐笔更新现金和持仓；
+两次信号之间现金和持仓不变，逐日的现金、持仓和权益写入预分配的数组。
+交易明细和权益曲线只在输出时转为记录。
+"""
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import numpy as np
+
+# 信号动作
+BUY = 1
+SELL = -1
+
+_ACTIONS = {"buy": BUY, "sell": SELL}
+_ACTION_NAMES = {BUY: "buy", SELL: "sell"}
+
+
+@dataclass
+class Execution:
+    """交易执行结果
+
+    cash/position/equity 为每根 K 线收盘时 (当日信号执行后) 的现金、持仓和权益；
+    trade_* 为实际成交的信号 (资金或持仓不足的信号被忽略)。
+    """
+
+    cash: np.ndarray
+    position: np.ndarray
+    equity: np.ndarray
+    trade_index: np.ndarray
+    trade_action: np.ndarray
+    trade_price: np.ndarray
+    trade_shares: np.ndarray
+
+    def trades(self, dates: list) -> list[dict[str, Any]]:
+        """成交记录 (date, action, price, shares)"""
+        return [
+            {
+                "date": dates[i],
+                "action": _ACTION_NAMES[action],
+                "price": price,
+                "shares": shares,
+            }
+            for i, action, price, shares in zip(
+                self.trade_index.tolist(),
+                self.trade_action.tolist(),
+                self.trade_price.tolist(),
+                self.trade_shares.tolist(),
+            )
+        ]
+
+
+def signal_arrays(signals: Iterable[dict[str, Any]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """信号记录 ({"index", "action", "price"}) 转为按下标排序的并行数组
+
+    同一根 K 线上的多个信号保持原有顺序。
+    """
+    signals = list(signals)
+    index = np.array([signal["index"] for signal in signals], dtype=np.int64)
+    action = np.array([_ACTIONS.get(signal["action"], 0) for signal in signals], dtype=np.int8)
+    price = np.array([signal["price"] for signal in signals], dtype=np.float64)
+
+    order = np.argsort(index, kind="stable")
+    return index[order], action[order], price[order]
+
+
+def execute_signals(
+    close: np.ndarray,
+    index: np.ndarray,
+    action: np.ndarray,
+    price: np.ndarray,
+    initial_capital: float,
+) -> Execution:
+    """按信号全仓买入、清仓卖出
+
+    买入: 有现金时按 现金 // 价格 买入整数股；卖出: 有持仓时全部卖出。
+
+    Args:
+        close: 收盘价
+        index: 信号所在 K 线下标 (升序)
+        action: 信号动作 (BUY/SELL)
+        price: 成交价格
+        initial_capital: 初始资金
+
+    Returns:
+        执行结果
+    """
+    n = len(close)
+    valid = (index >= 0) & (index < n)
+    index, action, price = index[valid], action[valid], price[valid]
+
+    # 每个信号执行后的现金和持仓
+    cash_after = np.empty(len(index))
+    position_after = np.empty(len(index))
+    shares_traded = np.zeros(len(index))
+    executed = np.zeros(len(index), dtype=bool)
+
+    capital = initial_capital
+    position = 0.0
+    for k, (act, p) in enumerate(zip(action.tolist(), price.tolist())):
+        if act == BUY and capital > 0:
+            shares = capital // p
+            if shares > 0:
+                position = shares
+                capital = capital - shares * p
+                shares_traded[k] = shares
+                executed[k] = True
+        elif act == SELL and position > 0:
+            capital = capital + position * p
+            shares_traded[k] = position
+            executed[k] = True
+            position = 0.0
+        cash_after[k] = capital
+        position_after[k] = position
+
+    # 每根 K 线对应截至当日的最后一个信号
+    last = np.searchsorted(index, np.arange(n), side="right") - 1
+    held = last >= 0
+    cash = np.full(n, float(initial_capital))
+    position_by_bar = np.zeros(n)
+    cash[held] = cash_after[last[held]]
+    position_by_bar[held] = position_after[last[held]]
+    equity = cash + position_by_bar * close
+
+    return Execution(
+        cash=cash,
+        position=position_by_bar,
+        equity=equity,
+        trade_index=index[executed],
+        trade_action=action[executed],
+        trade_price=price[executed],
+        trade_shares=shares_traded[executed],
+    )
@@ -0,0 +1,354 @@
+"""异步回测任务
+
+回测请求作为任务提交，不在请求处理中同步计算：
+1. 提交时在事件循环中加载日线 (上游调用在调度器线程池中，不阻塞事件循环)
+2. 任务 ID 为 (股票、策略、参数、日期区间、初始资金、回测方式、数据版本) 的哈希，
+   数据版本是所用日线 (日期和前复权收盘价) 的摘要，新 K 线或除权除息都会改变它
+3. 已保存的结果直接返回；同一任务正在计算时返回该任务，不重复计算
+4. 计算在回测进程池中执行，结果按任务 ID 保存到缓存服务 (Redis)，
+   其他 worker 或重启后提交相同请求也能直接取回
+任务状态可轮询，也可通过订阅队列 (WebSocket) 接收状态变化。
+"""
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+import orjson
+
+from ...core.config import settings
+from ...models.analysis import BacktestJob, BacktestJobStatus
+from ..data.cache import CacheService, get_cache_service
+from ..data.convert import bars_to_records
+from ..data.kline_store import Bars
+from . import vectorized
+from .engine import BacktestEngine
+from .pool import get_backtest_pool
+
+logger = logging.getLogger(__name__)
+
+# 回测算法或结果格式变化时递增，使旧结果失效
+RESULT_VERSION = 1
+
+STRATEGIES = {template["id"]: template for template in BacktestEngine.get_strategy_templates()}
+
+FINISHED = (BacktestJobStatus.COMPLETED, BacktestJobStatus.FAILED)
+
+
+def data_digest(bars: Bars) -> str:
+    """日线数据版本 (日期和收盘价的摘要)"""
+    digest = hashlib.sha1()
+    digest.update(np.asarray(bars["date"], dtype="datetime64[D]").tobytes())
+    digest.update(np.asarray(bars["close"], dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def normalize_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """规范化回测请求 (补全策略参数默认值)，使等价请求得到相同的任务 ID
+
+    Raises:
+        ValueError: 策略类型未知
+    """
+    strategy_type = request["strategy_type"]
+    template = STRATEGIES.get(strategy_type)
+    if template is None:
+        raise ValueError(f"未知策略类型: {strategy_type}")
+
+    params = {name: spec["default"] for name, spec in template["params"].items()}
+    params.update(request.get("strategy_params") or {})
+    mode = request.get("mode", "vectorized")
+    if strategy_type not in vectorized.STRATEGY_ACTIONS:
+        # 不支持向量化的策略两种方式结果相同
+        mode = "event"
+
+    return {
+        "stock_code": request["stock_code"],
+        "strategy_type": strategy_type,
+        "strategy_params": params,
+        "start_date": request["start_date"],
+        "end_date": request["end_date"],
+        "initial_capital": float(request.get("initial_capital", 100000.0)),
+        "mode": mode,
+    }
+
+
+def job_id(request: Dict[str, Any], digest: str) -> str:
+    """任务 ID: 规范化请求和数据版本的哈希"""
+    payload = orjson.dumps(
+        {"version": RESULT_VERSION, "request": request, "data": digest},
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.sha1(payload).hexdigest()
+
+
+def run_backtest(bars: Bars, request: Dict[str, Any]) -> Dict[str, Any]:
+    """工作进程入口: 在已加载的日线上回测"""
+    return BacktestEngine(data_service=None).backtest(
+        bars_to_records(bars),
+        request["stock_code"],
+        request["strategy_type"],
+        request["strategy_params"],
+        request["start_date"],
+        request["end_date"],
+        request["initial_capital"],
+        request["mode"],
+    )
+
+
+class BacktestJobService:
+    """回测任务服务"""
+
+    def __init__(
+        self,
+        data_service,
+        cache_service: Optional[CacheService] = None,
+        executor: Optional[Executor] = None,
+    ):
+        """初始化服务
+
+        Args:
+            data_service: 数据服务 (akshare_service)
+            cache_service: 保存结果的缓存服务，默认使用全局单例
+            executor: 进程池，默认使用全局回测进程池
+        """
+        self.data_service = data_service
+        self.cache_service = cache_service or get_cache_service()
+        self._executor = executor
+        # 任务 ID -> 任务 (按创建顺序，超出上限时淘汰最早结束的任务)
+        self.jobs: OrderedDict[str, BacktestJob] = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # 缓存服务不可用时保存在进程内的结果 (随任务淘汰)
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._watchers: Dict[str, set[asyncio.Queue]] = {}
+        self.stats = {"submitted": 0, "stored_hits": 0, "inflight_hits": 0, "computed": 0, "failed": 0}
+
+    @property
+    def executor(self) -> Executor:
+        return self._executor or get_backtest_pool()
+
+    @staticmethod
+    def _result_key(task_id: str) -> str:
+        return f"backtest:result:{task_id}"
+
+    async def submit(self, request: Dict[str, Any]) -> BacktestJob:
+        """提交回测任务
+
+        Args:
+            request: 回测请求 (stock_code, strategy_type, strategy_params, start_date,
+                end_date, initial_capital, mode)
+
+        Returns:
+            任务；结果已保存时状态直接为 completed
+
+        Raises:
+            ValueError: 策略类型未知或数据不足
+        """
+        request = normalize_request(request)
+        self.stats["submitted"] += 1
+
+        bars = await self.data_service.get_kline_bars(
+            request["stock_code"],
+            period="daily",
+            start_date=request["start_date"],
+            end_date=request["end_date"],
+            adjust="qfq",
+        )
+        if len(bars["date"]) < 50:
+            raise ValueError("数据不足，无法回测")
+
+        task_id = job_id(request, data_digest(bars))
+        job = await self._existing(task_id)
+        if job is not None:
+            return job
+
+        stored = await self._stored(task_id)
+        # 查询缓存期间相同请求可能已登记任务，登记前再检查一次 (之后到登记之间没有 await)
+        job = self._reuse(task_id)
+        if job is not None:
+            return job
+
+        job = BacktestJob(
+            task_id=task_id,
+            stock_code=request["stock_code"],
+            strategy_type=request["strategy_type"],
+        )
+        if stored:
+            self.stats["stored_hits"] += 1
+            job.status = BacktestJobStatus.COMPLETED
+            job.progress = 100.0
+            job.cached = True
+            self._add(job)
+            return job
+
+        self._add(job)
+        self._tasks[task_id] = asyncio.create_task(self._run(job, bars, request))
+        return job
+
+    async def _stored(self, task_id: str) -> bool:
+        """结果是否仍保存着 (进程内或缓存服务中)"""
+        return task_id in self._results or await self.cache_service.exists(self._result_key(task_id))
+
+    async def _existing(self, task_id: str) -> Optional[BacktestJob]:
+        """已登记的同一任务；已完成但结果已过期或被淘汰的任务丢弃，重新计算"""
+        job = self.jobs.get(task_id)
+        if job is not None and job.status == BacktestJobStatus.COMPLETED and not await self._stored(task_id):
+            if self.jobs.get(task_id) is job:
+                del self.jobs[task_id]
+        return self._reuse(task_id)
+
+    def _reuse(self, task_id: str) -> Optional[BacktestJob]:
+        """已登记的同一任务 (计算中或已完成，失败的任务可重新提交)"""
+        job = self.jobs.get(task_id)
+        if job is None or job.status == BacktestJobStatus.FAILED:
+            return None
+        if job.status == BacktestJobStatus.COMPLETED:
+            self.stats["stored_hits"] += 1
+        else:
+            self.stats["inflight_hits"] += 1
+        return job
+
+    async def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """提交回测任务并等待结果 (计算仍在进程池中，不阻塞事件循环)
+
+        Returns:
+            回测结果，失败时为 {"success": False, "error": ...}
+        """
+        try:
+            job = await self.submit(request)
+            task = self._tasks.get(job.task_id)
+            if task is not None:
+                await asyncio.shield(task)
+
+            job = self.jobs.get(job.task_id, job)
+            if job.status == BacktestJobStatus.FAILED:
+                return {"success": False, "error": job.error}
+
+            result = await self.result(job.task_id)
+            if result is None:
+                return {"success": False, "error": "回测结果已过期"}
+            return result
+
+        except Exception as e:
+            logger.error(f"回测失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+            }
+
+    async def _run(self, job: BacktestJob, bars: Bars, request: Dict[str, Any]):
+        """在进程池中计算并保存结果"""
+        try:
+            self._update(job, BacktestJobStatus.RUNNING, 10.0)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, run_backtest, bars, request)
+            if not result.get("success"):
+                raise ValueError(result.get("error", "回测失败"))
+
+            self._update(job, progress=90.0)
+            stored = await self.cache_service.set(
+                self._result_key(job.task_id), result, ttl=settings.BACKTEST_RESULT_TTL
+            )
+            if not stored:
+                logger.warning(f"回测结果保存失败，仅保留在进程内: {job.task_id}")
+                self._results[job.task_id] = result
+            self.stats["computed"] += 1
+            self._update(job, BacktestJobStatus.COMPLETED, 100.0)
+
+        except Exception as e:
+            logger.error(f"回测任务 {job.task_id} 失败: {e}")
+            self.stats["failed"] += 1
+            job.error = str(e)
+            self._update(job, BacktestJobStatus.FAILED)
+
+        finally:
+            self._tasks.pop(job.task_id, None)
+
+    def _add(self, job: BacktestJob):
+        """登记任务，超出上限时淘汰最早结束的任务 (结果仍在缓存中)"""
+        self.jobs[job.task_id] = job
+        self.jobs.move_to_end(job.task_id)
+        excess = len(self.jobs) - settings.BACKTEST_JOB_HISTORY
+        if excess > 0:
+            finished = [key for key, item in self.jobs.items() if item.status in FINISHED]
+            for key in finished[:excess]:
+                del self.jobs[key]
+                self._results.pop(key, None)
+
+    def _update(
+        self,
+        job: BacktestJob,
+        status: Optional[BacktestJobStatus] = None,
+        progress: Optional[float] = None,
+    ):
+        """更新任务状态并通知订阅者"""
+        if status is not None:
+            job.status = status
+        if progress is not None:
+            job.progress = progress
+        job.updated_at = datetime.now()
+
+        snapshot = job.model_copy()
+        for queue in self._watchers.get(job.task_id, ()):
+            queue.put_nowait(snapshot)
+
+    async def get(self, task_id: str) -> Optional[BacktestJob]:
+        """查询任务 (不在本进程中时按已保存的结果恢复为已完成任务)"""
+        job = self.jobs.get(task_id)
+        if job is not None:
+            return job
+
+        result = await self.cache_service.get(self._result_key(task_id))
+        if result is None:
+            return None
+        return BacktestJob(
+            task_id=task_id,
+            stock_code=result.get("stock_code", ""),
+            strategy_type=result.get("strategy_type", ""),
+            status=BacktestJobStatus.COMPLETED,
+            progress=100.0,
+            cached=True,
+        )
+
+    async def result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """已保存的回测结果 (可能与缓存共享，调用方不应修改)"""
+        result = self._results.get(task_id)
+        if result is not None:
+            return result
+        return await self.cache_service.get(self._result_key(task_id))
+
+    def watch(self, task_id: str) -> asyncio.Queue:
+        """订阅任务状态变化 (队列中为任务快照)"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._watchers.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unwatch(self, task_id: str, queue: asyncio.Queue):
+        """取消订阅"""
+        watchers = self._watchers.get(task_id)
+        if watchers is not None:
+            watchers.discard(queue)
+            if not watchers:
+                del self._watchers[task_id]
+
+    def info(self) -> dict:
+        """任务统计"""
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status.value] = counts.get(job.status.value, 0) + 1
+        return {**self.stats, "jobs": counts, "running": len(self._tasks)}
+
+
+# 全局单例
+_job_service: Optional[BacktestJobService] = None
+
+
+def get_backtest_job_service(data_service) -> BacktestJobService:
+    """获取回测任务服务单例"""
+    global _job_service
+    if _job_service is None:
+        _job_service = BacktestJobService(data_service)
+    return _job_service
@@ -0,0 +1,484 @@
+"""策略参数寻优
+
+在策略模板的参数范围 (min/max/step) 上做网格搜索或随机搜索：
+- 参数组合在主进程中用 NumPy 一次生成，并去掉不满足约束的组合 (如短周期 >= 长周期)
+- 收盘价只加载一次并写入共享内存，工作进程按名称映射同一块内存，不复制数据
+- 组合按顺序分块提交到进程池，相邻组合共享参数，工作进程缓存各周期的中间指标
+- 按目标函数 (夏普比率、总收益、收益回撤比) 排序，可限制最大回撤
+
+组合较少时直接在线程中计算，省去启动进程和进程间通信的开销。
+"""
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import Executor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from ...core.config import settings
+from . import vectorized
+from .engine import BacktestEngine
+from .execution import SELL
+from .pool import get_backtest_pool, pool_size
+
+logger = logging.getLogger(__name__)
+
+# 指标矩阵的列
+METRICS = ("total_return", "sharpe_ratio", "max_drawdown", "total_trades")
+_RETURN, _SHARPE, _DRAWDOWN, _TRADES = range(len(METRICS))
+
+# 参数约束: 前一个参数必须小于后一个参数
+CONSTRAINTS: dict[str, tuple[tuple[str, str], ...]] = {
+    "sma_cross": (("short_period", "long_period"),),
+    "macd": (("fast_period", "slow_period"),),
+    "rsi": (("oversold", "overbought"),),
+}
+
+# 回撤 (百分比) 低于该值时按该值计算收益回撤比，避免除零
+_MIN_DRAWDOWN = 1.0
+
+# 随机搜索去重、过滤约束后组合不足时的最大补抽次数
+_MAX_SAMPLE_ROUNDS = 10
+
+
+def _sharpe(metrics: np.ndarray) -> np.ndarray:
+    return metrics[:, _SHARPE]
+
+
+def _total_return(metrics: np.ndarray) -> np.ndarray:
+    return metrics[:, _RETURN]
+
+
+def _return_drawdown(metrics: np.ndarray) -> np.ndarray:
+    return metrics[:, _RETURN] / np.maximum(metrics[:, _DRAWDOWN], _MIN_DRAWDOWN)
+
+
+# 目标函数: 指标矩阵 -> 得分 (越大越好)
+OBJECTIVES: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "sharpe_ratio": _sharpe,
+    "total_return": _total_return,
+    "return_drawdown": _return_drawdown,
+}
+
+
+def parameter_values(
+    strategy_type: str,
+    ranges: Optional[dict[str, dict[str, Any]]] = None,
+) -> dict[str, np.ndarray]:
+    """各参数的取值
+
+    Args:
+        strategy_type: 策略类型
+        ranges: 参数名 -> {"min", "max", "step"} 或 {"values": [...]}，
+            未指定的参数使用策略模板的范围，步长默认整数参数为 1、小数参数为 0.1
+
+    Returns:
+        参数名 -> 升序取值 (整数参数为 int64)
+
+    Raises:
+        ValueError: 策略不支持寻优或参数范围无效
+    """
+    if strategy_type not in vectorized.STRATEGY_ACTIONS:
+        raise ValueError(f"策略不支持参数寻优: {strategy_type}")
+
+    template = next(t for t in BacktestEngine.get_strategy_templates() if t["id"] == strategy_type)
+    specs = template["params"]
+    ranges = ranges or {}
+    unknown = sorted(set(ranges) - set(specs))
+    if unknown:
+        raise ValueError(f"策略 {strategy_type} 没有参数: {', '.join(unknown)}")
+
+    limit = settings.OPTIMIZE_MAX_COMBINATIONS
+    values = {}
+    for name, spec in specs.items():
+        integer = isinstance(spec["default"], int)
+        override = ranges.get(name) or {}
+        if override.get("values") is not None:
+            grid = np.unique(np.asarray(override["values"], dtype=np.float64))
+        else:
+            low = override.get("min", spec["min"])
+            high = override.get("max", spec["max"])
+            step = override.get("step") or spec.get("step", 1 if integer else 0.1)
+            if step <= 0 or low > high:
+                raise ValueError(f"参数 {name} 的范围无效: min={low}, max={high}, step={step}")
+            count = math.floor((high - low) / step + 1e-9) + 1
+            if count > limit:
+                raise ValueError(f"参数 {name} 的取值数 {count} 超过上限 {limit}")
+            grid = np.round(low + step * np.arange(count), 10)
+
+        if not len(grid) or not np.all(np.isfinite(grid)):
+            raise ValueError(f"参数 {name} 没有有效取值")
+        if integer:
+            if np.any(grid != np.round(grid)) or grid[0] < 1:
+                raise ValueError(f"参数 {name} 必须为正整数")
+            grid = grid.astype(np.int64)
+        values[name] = grid
+    return values
+
+
+def _feasible(strategy_type: str, names: list[str], rows: np.ndarray) -> np.ndarray:
+    """满足参数约束的组合"""
+    mask = np.ones(len(rows), dtype=bool)
+    for lower, upper in CONSTRAINTS.get(strategy_type, ()):
+        mask &= rows[:, names.index(lower)] < rows[:, names.index(upper)]
+    return mask
+
+
+def combinations(
+    strategy_type: str,
+    values: dict[str, np.ndarray],
+    method: str = "grid",
+    samples: int = 1000,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """生成参数组合
+
+    Args:
+        strategy_type: 策略类型
+        values: 参数名 -> 取值 (见 parameter_values)
+        method: grid (全部组合) 或 random (均匀随机抽取 samples 个不重复组合)
+        samples: 随机搜索的组合数
+        seed: 随机种子
+
+    Returns:
+        参数组合矩阵 (每行一个组合，列顺序同 values)，按字典序排列以便相邻组合共享中间指标
+
+    Raises:
+        ValueError: 方法未知或网格组合数超过上限
+    """
+    names = list(values)
+    limit = settings.OPTIMIZE_MAX_COMBINATIONS
+    total = math.prod(len(v) for v in values.values())
+
+    if method == "grid":
+        if total > limit:
+            raise ValueError(f"参数组合数 {total} 超过上限 {limit}，请缩小范围、增大步长或使用随机搜索")
+    elif method != "random":
+        raise ValueError(f"未知的搜索方法: {method}")
+
+    samples = min(samples, limit)
+    rng = np.random.default_rng(seed)
+    if total <= limit:
+        mesh = np.meshgrid(*values.values(), indexing="ij")
+        rows = np.stack([m.ravel() for m in mesh], axis=1).astype(np.float64)
+        rows = rows[_feasible(strategy_type, names, rows)]
+        if method == "random" and len(rows) > samples:
+            rows = rows[np.sort(rng.choice(len(rows), samples, replace=False))]
+        return rows
+
+    # 组合空间过大时按下标独立抽取各参数，去重、过滤后不足再补抽
+    columns = list(values.values())
+    rows = np.empty((0, len(names)))
+    for _ in range(_MAX_SAMPLE_ROUNDS):
+        drawn = np.column_stack(
+            [column[rng.integers(0, len(column), 2 * samples)] for column in columns]
+        ).astype(np.float64)
+        drawn = drawn[_feasible(strategy_type, names, drawn)]
+        rows = np.unique(np.concatenate([rows, drawn]), axis=0)
+        if len(rows) >= samples:
+            break
+    if len(rows) > samples:
+        rows = rows[np.sort(rng.choice(len(rows), samples, replace=False))]
+    return rows
+
+
+def evaluate(
+    close: np.ndarray,
+    strategy_type: str,
+    names: list[str],
+    integer: list[bool],
+    rows: np.ndarray,
+    initial_capital: float,
+    cache: Optional[dict] = None,
+) -> np.ndarray:
+    """逐个参数组合做向量化回测
+
+    Args:
+        close: 收盘价
+        strategy_type: 策略类型
+        names: 参数名 (对应 rows 的列)
+        integer: 各参数是否为整数
+        rows: 参数组合矩阵
+        initial_capital: 初始资金
+        cache: 中间指标缓存 (同一 close 共享)
+
+    Returns:
+        指标矩阵 (每行对应一个组合，列见 METRICS)
+    """
+    metrics = np.empty((len(rows), len(METRICS)))
+    for i, row in enumerate(rows.tolist()):
+        params = {
+            name: int(value) if is_int else value
+            for name, is_int, value in zip(names, integer, row)
+        }
+        execution, result = vectorized.backtest(close, strategy_type, params, initial_capital, cache)
+        metrics[i] = (
+            result["total_return"],
+            result["sharpe_ratio"],
+            result["max_drawdown"],
+            np.count_nonzero(execution.trade_action == SELL),
+        )
+    return metrics
+
+
+# 工作进程中当前映射的共享内存、收盘价视图和中间指标缓存 (同一次寻优的各分块复用)
+_worker_state: dict[str, Any] = {}
+
+
+def _attach(name: str, length: int) -> tuple[np.ndarray, dict]:
+    """映射主进程写入的收盘价 (切换到新的寻优任务时释放上一块内存)"""
+    if _worker_state.get("name") != name:
+        shm = _worker_state.get("shm")
+        _worker_state.clear()
+        if shm is not None:
+            shm.close()
+
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_state.update(
+            name=name,
+            shm=shm,
+            close=np.ndarray((length,), dtype=np.float64, buffer=shm.buf),
+            cache={},
+        )
+    return _worker_state["close"], _worker_state["cache"]
+
+
+def _evaluate_shared(
+    shm_name: str,
+    length: int,
+    strategy_type: str,
+    names: list[str],
+    integer: list[bool],
+    rows: np.ndarray,
+    initial_capital: float,
+) -> np.ndarray:
+    """工作进程入口: 从共享内存读取收盘价后回测一个分块"""
+    close, cache = _attach(shm_name, length)
+    return evaluate(close, strategy_type, names, integer, rows, initial_capital, cache)
+
+
+def rank(
+    rows: np.ndarray,
+    metrics: np.ndarray,
+    names: list[str],
+    integer: list[bool],
+    objective: str = "sharpe_ratio",
+    max_drawdown: Optional[float] = None,
+    top_n: int = 20,
+) -> tuple[list[dict[str, Any]], int]:
+    """按目标函数排序
+
+    Args:
+        rows: 参数组合矩阵
+        metrics: 指标矩阵
+        names: 参数名
+        integer: 各参数是否为整数
+        objective: 目标函数 (见 OBJECTIVES)
+        max_drawdown: 最大回撤上限 (百分比)，超过的组合不参与排名
+        top_n: 返回的组合数
+
+    Returns:
+        (得分从高到低的前 top_n 个组合, 参与排名的组合数)
+    """
+    score = OBJECTIVES[objective](metrics)
+    feasible = np.isfinite(score)
+    if max_drawdown is not None:
+        feasible &= metrics[:, _DRAWDOWN] <= max_drawdown
+
+    candidates = np.flatnonzero(feasible)
+    # 得分相同时保持组合顺序
+    best = candidates[np.argsort(-score[candidates], kind="stable")][:top_n]
+
+    results = []
+    for position, i in enumerate(best.tolist(), start=1):
+        results.append(
+            {
+                "rank": position,
+                "params": {
+                    name: int(value) if is_int else value
+                    for name, is_int, value in zip(names, integer, rows[i].tolist())
+                },
+                "score": float(score[i]),
+                "total_return": float(metrics[i, _RETURN]),
+                "sharpe_ratio": float(metrics[i, _SHARPE]),
+                "max_drawdown": float(metrics[i, _DRAWDOWN]),
+                "total_trades": int(metrics[i, _TRADES]),
+            }
+        )
+    return results, len(candidates)
+
+
+class ParameterOptimizer:
+    """策略参数寻优"""
+
+    def __init__(self, data_service, executor: Optional[Executor] = None):
+        """初始化寻优器
+
+        Args:
+            data_service: 数据服务 (akshare_service)
+            executor: 进程池，默认使用全局回测进程池
+        """
+        self.data_service = data_service
+        self._executor = executor
+
+    @property
+    def executor(self) -> Executor:
+        return self._executor or get_backtest_pool()
+
+    async def optimize(
+        self,
+        stock_code: str,
+        strategy_type: str,
+        start_date: str,
+        end_date: str,
+        initial_capital: float = 100000.0,
+        param_ranges: Optional[dict[str, dict[str, Any]]] = None,
+        method: str = "grid",
+        samples: int = 1000,
+        objective: str = "sharpe_ratio",
+        max_drawdown: Optional[float] = None,
+        top_n: int = 20,
+        seed: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """
+        参数寻优
+
+        Args:
+            stock_code: 股票代码
+            strategy_type: 策略类型 (sma_cross, macd, rsi, boll)
+            start_date: 开始日期 (YYYYMMDD)
+            end_date: 结束日期 (YYYYMMDD)
+            initial_capital: 初始资金
+            param_ranges: 参数范围，默认使用策略模板的范围 (见 parameter_values)
+            method: grid (网格搜索) 或 random (随机搜索)
+            samples: 随机搜索的组合数
+            objective: 目标函数 sharpe_ratio, total_return 或 return_drawdown (收益回撤比)
+            max_drawdown: 最大回撤上限 (百分比)
+            top_n: 返回的组合数
+            seed: 随机搜索的随机种子
+
+        Returns:
+            寻优结果
+        """
+        try:
+            if objective not in OBJECTIVES:
+                raise ValueError(f"未知的目标函数: {objective}")
+
+            values = parameter_values(strategy_type, param_ranges)
+            rows = combinations(strategy_type, values, method, samples, seed)
+            if not len(rows):
+                raise ValueError("没有满足约束的参数组合")
+
+            kline_data = await self.data_service.get_kline_data(
+                stock_code,
+                period="daily",
+                start_date=start_date,
+                end_date=end_date,
+                adjust="qfq",
+            )
+            if not kline_data or len(kline_data) < 50:
+                return {
+                    "success": False,
+                    "error": "数据不足，无法回测",
+                }
+
+            names = list(values)
+            integer = [values[name].dtype.kind == "i" for name in names]
+            close = np.array([d["close"] for d in kline_data], dtype=np.float64)
+
+            started = time.perf_counter()
+            metrics, workers = await self._evaluate(
+                close, strategy_type, names, integer, rows, initial_capital
+            )
+            elapsed = time.perf_counter() - started
+            results, feasible = rank(rows, metrics, names, integer, objective, max_drawdown, top_n)
+
+            return {
+                "success": True,
+                "stock_code": stock_code,
+                "stock_name": kline_data[0].get("name", ""),
+                "strategy_type": strategy_type,
+                "start_date": start_date,
+                "end_date": end_date,
+                "initial_capital": initial_capital,
+                "method": method,
+                "objective": objective,
+                "max_drawdown": max_drawdown,
+                "param_space": {
+                    name: {
+                        "min": values[name][0].item(),
+                        "max": values[name][-1].item(),
+                        "count": len(values[name]),
+                    }
+                    for name in names
+                },
+                "combinations": len(rows),
+                "feasible": feasible,
+                "workers": workers,
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "results": results,
+            }
+
+        except Exception as e:
+            logger.error(f"参数寻优失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+            }
+
+    async def _evaluate(
+        self,
+        close: np.ndarray,
+        strategy_type: str,
+        names: list[str],
+        integer: list[bool],
+        rows: np.ndarray,
+        initial_capital: float,
+    ) -> tuple[np.ndarray, int]:
+        """回测全部组合，返回 (指标矩阵, 使用的进程数)"""
+        if len(rows) < settings.OPTIMIZE_PARALLEL_MIN:
+            metrics = await asyncio.to_thread(
+                evaluate, close, strategy_type, names, integer, rows, initial_capital, {}
+            )
+            return metrics, 1
+
+        workers = pool_size()
+        # 每个进程分到多个分块，计算快慢不均时仍能均衡负载
+        chunks = np.array_split(rows, min(len(rows), workers * 4))
+
+        shm = shared_memory.SharedMemory(create=True, size=close.nbytes)
+        try:
+            shared = np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = close
+            del shared
+
+            loop = asyncio.get_running_loop()
+            parts = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self.executor,
+                        _evaluate_shared,
+                        shm.name,
+                        len(close),
+                        strategy_type,
+                        names,
+                        integer,
+                        chunk,
+                        initial_capital,
+                    )
+                    for chunk in chunks
+                )
+            )
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return np.concatenate(parts), min(workers, len(chunks))
+
+
+def get_parameter_optimizer(data_service):
+    """获取参数寻优器实例"""
+    return ParameterOptimizer(data_service)
@@ -0,0 +1,39 @@
+"""回测进程池
+
+回测是纯 CPU 计算，受 GIL 限制无法在线程中并行，统一提交到进程池。
+进程以 spawn 方式启动 (主进程有事件循环和线程池，fork 不安全)，
+首次使用时创建，之后在请求间复用，应用关闭时释放。
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from ...core.config import settings
+
+# 全局单例
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def pool_size() -> int:
+    """进程池大小"""
+    return settings.BACKTEST_MAX_WORKERS or os.cpu_count() or 1
+
+
+def get_backtest_pool() -> ProcessPoolExecutor:
+    """获取回测进程池单例"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=pool_size(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_backtest_pool():
+    """关闭进程池 (取消排队中的任务)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,418 @@
+"""多股票组合回测
+
+股票池的日线并发加载后按日期对齐为 股票 x 日期 的价格矩阵 (PricePanel)：
+1. 每只股票在自己的 K 线上计算策略信号 (与单股票回测相同)，再按日期写入信号矩阵
+2. 只在有信号的日期更新组合：先卖出有卖出信号的持仓，再按股票池顺序买入，
+   受持仓数上限和可用现金限制；每只股票的买入金额由分配规则决定
+   - equal_weight: 可用现金在空余仓位间平分 (持仓数上限默认为股票数)
+   - fixed_cash: 每个仓位固定金额，现金不足时只买得起的部分
+3. 两次调仓之间持仓不变，逐日的持仓、市值和权益按矩阵一次计算，
+   停牌日按最近收盘价估值
+
+买卖规则与单股票回测一致：整数股，收盘价成交，空仓时的卖出信号忽略；
+持仓时的买入信号也忽略 (单股票回测会用剩余现金覆盖原持仓，组合中不沿用)。
+除此之外，单只股票、equal_weight 时结果与单股票回测相同。
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..data.kline_store import Bars
+from ..indicators.panel import PricePanel
+from . import vectorized
+from .execution import BUY, SELL
+
+logger = logging.getLogger(__name__)
+
+ALLOCATIONS = ("equal_weight", "fixed_cash")
+
+_ACTION_NAMES = {BUY: "buy", SELL: "sell"}
+
+
+def buy_hold_actions(
+    close: np.ndarray,
+    params: Dict[str, Any],
+    cache: Optional[dict] = None,
+) -> np.ndarray:
+    """买入持有: 第一根 K 线买入"""
+    actions = np.zeros(len(close), dtype=np.int8)
+    actions[:1] = BUY
+    return actions
+
+
+# 组合回测支持的策略: 信号类策略和买入持有
+PORTFOLIO_STRATEGIES: Dict[str, vectorized.ActionFunc] = {
+    **vectorized.STRATEGY_ACTIONS,
+    "buy_hold": buy_hold_actions,
+}
+
+
+@dataclass
+class PortfolioExecution:
+    """组合回测执行结果
+
+    cash/positions/equity 为每个日期收盘时 (当日调仓后) 的现金、持仓股票数和总权益；
+    values 为各股票每日持仓市值 (股票 x 日期)；trade_* 为成交记录 (按时间顺序)。
+    """
+
+    cash: np.ndarray
+    positions: np.ndarray
+    equity: np.ndarray
+    values: np.ndarray
+    trade_row: np.ndarray
+    trade_index: np.ndarray
+    trade_action: np.ndarray
+    trade_price: np.ndarray
+    trade_shares: np.ndarray
+
+
+def _forward_fill(close: np.ndarray) -> np.ndarray:
+    """按行向后填充缺失价格 (停牌日取最近收盘价，上市前为 0)"""
+    valid = np.isfinite(close)
+    columns = np.arange(close.shape[1])
+    last = np.maximum.accumulate(np.where(valid, columns, -1), axis=1)
+    filled = np.take_along_axis(close, np.maximum(last, 0), axis=1)
+    return np.where(last >= 0, filled, 0.0)
+
+
+def simulate(
+    close: np.ndarray,
+    actions: np.ndarray,
+    initial_capital: float,
+    allocation: str = "equal_weight",
+    slot_cash: Optional[float] = None,
+    max_positions: Optional[int] = None,
+) -> PortfolioExecution:
+    """按信号矩阵执行组合回测
+
+    Args:
+        close: 收盘价矩阵 (股票 x 日期，缺失为 NaN)
+        actions: 信号矩阵 (BUY/SELL/0)
+        initial_capital: 初始资金
+        allocation: 分配规则 equal_weight (空余仓位平分现金) 或 fixed_cash (每仓固定金额)
+        slot_cash: fixed_cash 时每个仓位的金额
+        max_positions: 同时持有的股票数上限，默认不限 (股票数)
+
+    Returns:
+        执行结果
+
+    Raises:
+        ValueError: 分配规则或参数无效
+    """
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f"未知的分配规则: {allocation}")
+    if allocation == "fixed_cash" and not (slot_cash and slot_cash > 0):
+        raise ValueError("fixed_cash 分配需要指定每仓金额 slot_cash")
+
+    rows, n = close.shape
+    slots = min(max_positions or rows, rows)
+    actions = np.where(np.isfinite(close) & (close > 0), actions, 0)
+    events = np.flatnonzero(actions.any(axis=0))
+
+    shares = np.zeros(rows)
+    held = np.zeros(rows, dtype=bool)
+    capital = float(initial_capital)
+    cash_after = np.empty(len(events))
+    shares_after = np.empty((len(events), rows))
+    trade_row, trade_index, trade_action, trade_price, trade_shares = [], [], [], [], []
+
+    # 只遍历有信号的日期，每个日期内只处理有信号的股票 (买入逐个检查仓位和现金)
+    for k, t in enumerate(events.tolist()):
+        column = actions[:, t]
+        price = close[:, t]
+
+        sell = np.flatnonzero(held & (column == SELL))
+        for i, p, count in zip(sell.tolist(), price[sell].tolist(), shares[sell].tolist()):
+            capital = capital + count * p
+            trade_row.append(i)
+            trade_index.append(t)
+            trade_action.append(SELL)
+            trade_price.append(p)
+            trade_shares.append(count)
+        shares[sell] = 0.0
+        held[sell] = False
+
+        free = slots - int(np.count_nonzero(held))
+        for i in np.flatnonzero(~held & (column == BUY)).tolist():
+            if free <= 0 or capital <= 0:
+                break
+            p = float(price[i])
+            budget = capital / free if allocation == "equal_weight" else min(slot_cash, capital)
+            count = budget // p
+            if count <= 0:
+                continue
+            capital = capital - count * p
+            shares[i] = count
+            held[i] = True
+            free -= 1
+            trade_row.append(i)
+            trade_index.append(t)
+            trade_action.append(BUY)
+            trade_price.append(p)
+            trade_shares.append(count)
+
+        cash_after[k] = capital
+        shares_after[k] = shares
+
+    # 每个日期对应截至当日的最后一次调仓
+    last = np.searchsorted(events, np.arange(n), side="right") - 1
+    started = last >= 0
+    cash = np.full(n, float(initial_capital))
+    cash[started] = cash_after[last[started]]
+    holdings = np.zeros((rows, n))
+    holdings[:, started] = shares_after[last[started]].T
+
+    values = holdings * _forward_fill(close)
+    equity = cash + values.sum(axis=0)
+
+    return PortfolioExecution(
+        cash=cash,
+        positions=np.count_nonzero(holdings, axis=0),
+        equity=equity,
+        values=values,
+        trade_row=np.array(trade_row, dtype=np.int64),
+        trade_index=np.array(trade_index, dtype=np.int64),
+        trade_action=np.array(trade_action, dtype=np.int8),
+        trade_price=np.array(trade_price, dtype=np.float64),
+        trade_shares=np.array(trade_shares, dtype=np.float64),
+    )
+
+
+def attribution(execution: PortfolioExecution, initial_capital: float) -> Dict[str, np.ndarray]:
+    """各股票的收益归因
+
+    盈亏 = 卖出所得 - 买入成本 + 期末持仓市值，各股票贡献之和等于组合总收益。
+
+    Returns:
+        字段 -> 每只股票的数组: pnl, contribution (占初始资金百分比), total_trades (卖出次数),
+        win_trades (卖出价高于买入价的次数), holding_days (持仓天数), final_value (期末市值)
+    """
+    rows = len(execution.values)
+    row = execution.trade_row
+    amount = execution.trade_price * execution.trade_shares
+    sold = execution.trade_action == SELL
+    flow = np.where(sold, amount, -amount)
+    pnl = np.bincount(row, weights=flow, minlength=rows) + execution.values[:, -1]
+
+    # 同一股票的成交买卖交替，每笔卖出的前一笔成交即对应的买入
+    order = np.lexsort((np.arange(len(row)), row))
+    sorted_sold = sold[order]
+    previous_price = np.roll(execution.trade_price[order], 1)
+    wins = sorted_sold & (execution.trade_price[order] > previous_price)
+
+    return {
+        "pnl": pnl,
+        "contribution": pnl / initial_capital * 100,
+        "total_trades": np.bincount(row[sold], minlength=rows),
+        "win_trades": np.bincount(row[order][wins], minlength=rows),
+        "holding_days": np.count_nonzero(execution.values > 0, axis=1),
+        "final_value": execution.values[:, -1],
+    }
+
+
+class PortfolioBacktestEngine:
+    """组合回测引擎"""
+
+    def __init__(self, data_service):
+        """
+        初始化组合回测引擎
+
+        Args:
+            data_service: 数据服务 (akshare_service)
+        """
+        self.data_service = data_service
+
+    async def run(
+        self,
+        stock_pool: List[str],
+        strategy_type: str,
+        strategy_params: Dict[str, Any],
+        start_date: str,
+        end_date: str,
+        initial_capital: float = 100000.0,
+        allocation: str = "equal_weight",
+        slot_cash: Optional[float] = None,
+        max_positions: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        执行组合回测
+
+        Args:
+            stock_pool: 股票池
+            strategy_type: 策略类型 (sma_cross, macd, rsi, boll, buy_hold)，每只股票独立产生信号
+            strategy_params: 策略参数
+            start_date: 开始日期 (YYYYMMDD)
+            end_date: 结束日期 (YYYYMMDD)
+            initial_capital: 初始资金
+            allocation: 分配规则 equal_weight 或 fixed_cash
+            slot_cash: fixed_cash 时每个仓位的金额
+            max_positions: 同时持有的股票数上限
+
+        Returns:
+            回测结果
+        """
+        try:
+            func = PORTFOLIO_STRATEGIES.get(strategy_type)
+            if func is None:
+                return {
+                    "success": False,
+                    "error": f"未知策略类型: {strategy_type}",
+                }
+
+            codes = list(dict.fromkeys(stock_pool))
+            bars_by_code, skipped = await self._load(codes, start_date, end_date)
+            panel = PricePanel.from_bars(bars_by_code, fields=("close",))
+
+            if not len(panel) or len(panel.dates) < 50:
+                return {
+                    "success": False,
+                    "error": "数据不足，无法回测",
+                }
+
+            close = panel.fields["close"]
+            actions = self._actions(panel, bars_by_code, func, strategy_params)
+            execution = simulate(close, actions, initial_capital, allocation, slot_cash, max_positions)
+            metrics = vectorized.performance(execution.equity, initial_capital)
+
+            # 基准: 股票池等权买入持有
+            benchmark = simulate(
+                close,
+                self._actions(panel, bars_by_code, buy_hold_actions, {}),
+                initial_capital,
+            )
+            benchmark_return = vectorized.performance(benchmark.equity, initial_capital)["total_return"]
+
+            result = self._format_result(panel, execution, metrics, initial_capital)
+            result["benchmark_return"] = benchmark_return
+            result["excess_return"] = result["total_return"] - benchmark_return
+
+            result["stock_pool"] = panel.codes.tolist()
+            result["skipped"] = skipped
+            result["strategy_type"] = strategy_type
+            result["allocation"] = allocation
+            result["max_positions"] = min(max_positions or len(panel), len(panel))
+            result["start_date"] = start_date
+            result["end_date"] = end_date
+            result["initial_capital"] = initial_capital
+            result["success"] = True
+
+            return result
+
+        except Exception as e:
+            logger.error(f"组合回测失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+            }
+
+    async def _load(
+        self,
+        codes: List[str],
+        start_date: str,
+        end_date: str,
+    ) -> tuple[Dict[str, Bars], List[str]]:
+        """并发加载股票池日线 (上游并发由数据服务的调度器限制)
+
+        Returns:
+            (有数据的股票 -> 列式 K 线, 无数据或加载失败的股票)
+        """
+        results = await asyncio.gather(
+            *(
+                self.data_service.get_kline_bars(
+                    code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq"
+                )
+                for code in codes
+            ),
+            return_exceptions=True,
+        )
+
+        bars_by_code, skipped = {}, []
+        for code, bars in zip(codes, results):
+            if isinstance(bars, Exception):
+                logger.warning(f"组合回测加载 {code} 失败: {bars}")
+                skipped.append(code)
+            elif not len(bars["date"]):
+                skipped.append(code)
+            else:
+                bars_by_code[code] = bars
+        return bars_by_code, skipped
+
+    @staticmethod
+    def _actions(
+        panel: PricePanel,
+        bars_by_code: Dict[str, Bars],
+        func: vectorized.ActionFunc,
+        params: Dict[str, Any],
+    ) -> np.ndarray:
+        """各股票在自己的 K 线上计算信号，按日期写入信号矩阵 (停牌日不连续计算)"""
+        actions = np.zeros(panel.shape, dtype=np.int8)
+        for i, bars in enumerate(bars_by_code.values()):
+            columns = np.searchsorted(panel.dates, bars["date"])
+            actions[i, columns] = func(np.asarray(bars["close"], dtype=np.float64), params, None)
+        return actions
+
+    @staticmethod
+    def _format_result(
+        panel: PricePanel,
+        execution: PortfolioExecution,
+        metrics: Dict[str, float],
+        initial_capital: float,
+    ) -> Dict[str, Any]:
+        """执行结果转为返回记录"""
+        dates = panel.dates.astype(object).tolist()
+        codes = panel.codes.tolist()
+
+        trades = [
+            {
+                "date": dates[t],
+                "code": codes[i],
+                "action": _ACTION_NAMES[action],
+                "price": price,
+                "shares": shares,
+            }
+            for i, t, action, price, shares in zip(
+                execution.trade_row.tolist(),
+                execution.trade_index.tolist(),
+                execution.trade_action.tolist(),
+                execution.trade_price.tolist(),
+                execution.trade_shares.tolist(),
+            )
+        ]
+
+        columns = {name: values.tolist() for name, values in attribution(execution, initial_capital).items()}
+        symbols = [
+            {"code": code, **{name: values[i] for name, values in columns.items()}}
+            for i, code in enumerate(codes)
+        ]
+        symbols.sort(key=lambda item: item["pnl"], reverse=True)
+
+        total_trades = int(np.count_nonzero(execution.trade_action == SELL))
+        win_trades = sum(item["win_trades"] for item in symbols)
+
+        return {
+            "total_return": metrics["total_return"],
+            "final_capital": metrics["final_capital"],
+            "max_drawdown": metrics["max_drawdown"],
+            "sharpe_ratio": metrics["sharpe_ratio"],
+            "total_trades": total_trades,
+            "win_rate": win_trades / total_trades * 100 if total_trades else 0.0,
+            "trades": trades,
+            "equity_curve": [
+                {"date": day, "equity": equity, "cash": cash, "positions": positions}
+                for day, equity, cash, positions in zip(
+                    dates,
+                    execution.equity.tolist(),
+                    execution.cash.tolist(),
+                    execution.positions.tolist(),
+                )
+            ],
+            "attribution": symbols,
+        }
+
+
+def get_portfolio_engine(data_service):
+    """获取组合回测引擎实例"""
+    return PortfolioBacktestEngine(data_service)
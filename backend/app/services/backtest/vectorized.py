@@ -0,0 +1,282 @@
+"""向量化回测
+
+SMA 金叉死叉、MACD、RSI、布林带都是 "信号 -> 满仓/空仓" 策略：
+1. 指标和买卖信号在 NumPy 中整列计算 (每根 K 线至多一个信号)
+2. 按状态机从信号中找出真正改变持仓的信号：空仓时第一个买得起的买入、
+   持仓时第一个卖出 (以及剩余现金仍够买入时覆盖持仓的买入，与事件循环一致)，
+   每次查找是对信号数组的一次向量化比较，Python 循环次数等于成交笔数
+3. 成交信号交给 execute_signals 计算逐日现金、持仓和权益，
+   收益率用 diff、回撤用 maximum.accumulate 计算
+
+成交、权益曲线与逐 K 线的事件循环完全一致，夏普比率只在浮点求和顺序上有差异。
+
+参数扫描时同一收盘价序列要回测大量参数组合，可传入 cache 字典复用
+与部分参数无关的中间结果 (各周期的均线、EMA、RSI、布林带标准差)。
+"""
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from ..indicators import kernels
+from .execution import BUY, SELL, Execution, execute_signals
+
+# 策略类型 -> (收盘价, 参数, 中间结果缓存) -> 每根 K 线的信号 (BUY/SELL/0)
+ActionFunc = Callable[[np.ndarray, dict[str, Any], Optional[dict]], np.ndarray]
+
+
+def _memo(cache: Optional[dict], key: tuple, func: Callable[..., Any], *args) -> Any:
+    """有缓存时按 key 复用中间结果 (缓存只对同一收盘价序列有效)"""
+    if cache is None:
+        return func(*args)
+    value = cache.get(key)
+    if value is None:
+        value = cache[key] = func(*args)
+    return value
+
+
+def _truthy(values: np.ndarray) -> np.ndarray:
+    """与事件循环的真值判断一致 (None/NaN 和 0 视为无效)"""
+    return np.isfinite(values) & (values != 0)
+
+
+def window_mean(close: np.ndarray, period: int) -> np.ndarray:
+    """简单移动平均 (按窗口从左到右逐项求和，与事件循环的 SMA 结果逐位相同)"""
+    n = len(close)
+    result = np.full(n, np.nan)
+    if period < 1 or period > n:
+        return result
+
+    count = n - period + 1
+    total = close[:count].copy()
+    for k in range(1, period):
+        total += close[k:k + count]
+    result[period - 1:] = total / period
+    return result
+
+
+def crossover_actions(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+    """快线上穿慢线买入、下穿卖出"""
+    actions = np.zeros(len(fast), dtype=np.int8)
+    if len(fast) < 2:
+        return actions
+
+    prev_fast, prev_slow, cur_fast, cur_slow = fast[:-1], slow[:-1], fast[1:], slow[1:]
+    valid = _truthy(cur_fast) & _truthy(cur_slow) & _truthy(prev_fast) & _truthy(prev_slow)
+    buy = valid & (prev_fast <= prev_slow) & (cur_fast > cur_slow)
+    sell = valid & ~buy & (prev_fast >= prev_slow) & (cur_fast < cur_slow)
+    actions[1:] = np.where(buy, BUY, np.where(sell, SELL, 0))
+    return actions
+
+
+def sma_cross_actions(
+    close: np.ndarray,
+    params: dict[str, Any],
+    cache: Optional[dict] = None,
+) -> np.ndarray:
+    """SMA 金叉死叉"""
+    short_period = params.get("short_period", 5)
+    long_period = params.get("long_period", 20)
+    short = _memo(cache, ("sma", short_period), window_mean, close, short_period)
+    long = _memo(cache, ("sma", long_period), window_mean, close, long_period)
+    return crossover_actions(short, long)
+
+
+def macd_actions(
+    close: np.ndarray,
+    params: dict[str, Any],
+    cache: Optional[dict] = None,
+) -> np.ndarray:
+    """MACD 上穿 Signal 买入，下穿卖出 (与 kernels.macd 的计算步骤相同)"""
+    fast_period = params.get("fast_period", 12)
+    slow_period = params.get("slow_period", 26)
+    fast = _memo(cache, ("ema", fast_period), kernels.ema, close, fast_period)
+    slow = _memo(cache, ("ema", slow_period), kernels.ema, close, slow_period)
+    macd_line = fast - slow
+    signal_line = kernels.ema(macd_line, params.get("signal_period", 9))
+    return crossover_actions(macd_line, signal_line)
+
+
+def rsi_actions(
+    close: np.ndarray,
+    params: dict[str, Any],
+    cache: Optional[dict] = None,
+) -> np.ndarray:
+    """RSI 下穿超卖线买入，上穿超买线卖出"""
+    oversold = params.get("oversold", 30)
+    overbought = params.get("overbought", 70)
+    period = params.get("period", 14)
+    rsi = _memo(cache, ("rsi", period), kernels.rsi, close, period)
+
+    actions = np.zeros(len(close), dtype=np.int8)
+    if len(close) < 2:
+        return actions
+
+    prev, cur = rsi[:-1], rsi[1:]
+    valid = _truthy(cur) & _truthy(prev)
+    buy = valid & (prev >= oversold) & (cur < oversold)
+    sell = valid & ~buy & (prev <= overbought) & (cur > overbought)
+    actions[1:] = np.where(buy, BUY, np.where(sell, SELL, 0))
+    return actions
+
+
+def _mean_std(close: np.ndarray, period: int) -> tuple[np.ndarray, np.ndarray]:
+    """布林带中轨和标准差"""
+    middle = kernels.rolling_mean(close, period)
+    return middle, kernels.rolling_std(close, period, mean=middle)
+
+
+def boll_actions(
+    close: np.ndarray,
+    params: dict[str, Any],
+    cache: Optional[dict] = None,
+) -> np.ndarray:
+    """价格触及下轨买入，触及中轨或上轨卖出 (与 kernels.bollinger_bands 的计算步骤相同)"""
+    period = params.get("period", 20)
+    std_dev = params.get("std_dev", 2.0)
+    middle, std = _memo(cache, ("boll", period), _mean_std, close, period)
+    upper = middle + std_dev * std
+    lower = middle - std_dev * std
+
+    valid = _truthy(close) & _truthy(upper) & _truthy(lower) & _truthy(middle)
+    valid[0] = False
+    buy = valid & (close <= lower)
+    sell = valid & ~buy & ((close >= upper) | (close >= middle))
+    return np.where(buy, BUY, np.where(sell, SELL, 0)).astype(np.int8)
+
+
+STRATEGY_ACTIONS: dict[str, ActionFunc] = {
+    "sma_cross": sma_cross_actions,
+    "macd": macd_actions,
+    "rsi": rsi_actions,
+    "boll": boll_actions,
+}
+
+
+def fill_signals(
+    close: np.ndarray,
+    actions: np.ndarray,
+    initial_capital: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """从逐日信号中找出会成交的信号 (下标、动作、价格)
+
+    与 execute_signals 的规则相同：有现金时买入 现金 // 价格 股 (持仓时会覆盖原持仓)，
+    有持仓时全部卖出；其余信号不改变状态，直接跳过。
+    """
+    buy_index = np.flatnonzero(actions == BUY)
+    buy_price = close[buy_index]
+    # 逐笔查找用列表 + bisect，比对 NumPy 标量调用快得多
+    buy_bars, buy_prices = buy_index.tolist(), buy_price.tolist()
+    sell_bars = np.flatnonzero(actions == SELL).tolist()
+    n = len(close)
+
+    index, action, price = [], [], []
+    capital = initial_capital
+    position = 0.0
+    cursor = 0  # 下一个待检查的买入信号
+    bar = -1  # 最近一次成交所在的 K 线
+
+    while capital > 0 or position > 0:
+        # 下一个卖出信号之前的买入信号 (空仓时卖出信号无效，不限制)
+        if position > 0:
+            k = bisect_right(sell_bars, bar)
+            sell_bar = sell_bars[k] if k < len(sell_bars) else n
+            stop = bisect_left(buy_bars, sell_bar, cursor)
+        else:
+            sell_bar = n
+            stop = len(buy_bars)
+
+        # 第一个至少能买入一股的买入信号
+        hit = -1
+        if capital > 0 and cursor < stop:
+            if buy_prices[cursor] <= capital:
+                hit = cursor
+            else:
+                affordable = buy_price[cursor:stop] <= capital
+                j = int(np.argmax(affordable))
+                if affordable[j]:
+                    hit = cursor + j
+
+        if hit >= 0:
+            p = buy_prices[hit]
+            shares = capital // p
+            position = shares
+            capital = capital - shares * p
+            bar = buy_bars[hit]
+            index.append(bar)
+            action.append(BUY)
+            price.append(p)
+            cursor = hit + 1
+        elif position > 0 and sell_bar < n:
+            p = float(close[sell_bar])
+            capital = capital + position * p
+            position = 0.0
+            bar = sell_bar
+            index.append(bar)
+            action.append(SELL)
+            price.append(p)
+            cursor = stop
+        else:
+            break
+
+    return (
+        np.array(index, dtype=np.int64),
+        np.array(action, dtype=np.int8),
+        np.array(price, dtype=np.float64),
+    )
+
+
+def run_actions(close: np.ndarray, actions: np.ndarray, initial_capital: float) -> Execution:
+    """按逐日信号执行回测"""
+    return execute_signals(close, *fill_signals(close, actions, initial_capital), initial_capital)
+
+
+def performance(equity: np.ndarray, initial_capital: float, risk_free_rate: float = 0.03) -> dict[str, float]:
+    """权益曲线的收益、最大回撤 (百分比) 和年化夏普比率"""
+    final_capital = float(equity[-1])
+    peak = np.maximum.accumulate(equity)
+    drawdown = (peak - equity) / peak * 100
+
+    returns = np.diff(equity) / equity[:-1]
+    sharpe = 0.0
+    if len(returns):
+        std = float(returns.std())
+        if std != 0:
+            sharpe = (float(returns.mean()) - risk_free_rate / 252) / std * (252 ** 0.5)
+
+    return {
+        "total_return": ((final_capital - initial_capital) / initial_capital) * 100,
+        "final_capital": final_capital,
+        "max_drawdown": max(0, float(drawdown.max())),
+        "sharpe_ratio": sharpe,
+    }
+
+
+def backtest(
+    close: np.ndarray,
+    strategy_type: str,
+    params: dict[str, Any],
+    initial_capital: float,
+    cache: Optional[dict] = None,
+) -> tuple[Execution, dict[str, float]]:
+    """向量化回测
+
+    Args:
+        close: 收盘价
+        strategy_type: 策略类型 (sma_cross, macd, rsi, boll)
+        params: 策略参数
+        initial_capital: 初始资金
+        cache: 中间结果缓存 (同一 close 的多次回测共享)，默认不缓存
+
+    Returns:
+        (执行结果, 绩效指标)
+
+    Raises:
+        ValueError: 策略不支持向量化
+    """
+    func = STRATEGY_ACTIONS.get(strategy_type)
+    if func is None:
+        raise ValueError(f"策略不支持向量化回测: {strategy_type}")
+
+    execution = run_actions(close, func(close, params, cache), initial_capital)
+    return execution, performance(execution.equity, initial_capital)
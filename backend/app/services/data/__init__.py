@@ -1,4 +1,14 @@
 """数据服务模块"""
 from .akshare import AkshareService, get_akshare_service
+from .cache import CacheService, get_cache_service
+from .snapshot import MarketSnapshot, MarketSnapshotService, get_snapshot_service
 
-__all__ = ["AkshareService", "get_akshare_service"]
+__all__ = [
+    "AkshareService",
+    "get_akshare_service",
+    "CacheService",
+    "get_cache_service",
+    "MarketSnapshot",
+    "MarketSnapshotService",
+    "get_snapshot_service",
+]
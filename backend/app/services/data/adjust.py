@@ -0,0 +1,100 @@
+"""复权计算
+
+本地只存储不复权 K 线和后复权因子 (每次除权除息一行，向后沿用)，
+前复权/后复权价格在读取时按因子向量化相乘得到：
+- hfq: 价格 x 当日因子
+- qfq: 价格 x 当日因子 / 最新因子 (以最新一次除权后的价格为基准)
+
+新的除权除息只改变因子序列，不需要重新下载历史 K 线。
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .convert import to_day_array, to_float_array
+from .kline_store import Bars
+
+# 需要复权的价格列 (成交量、成交额不复权)
+PRICE_COLUMNS = ("open_price", "high", "low", "close")
+
+ADJUSTMENTS = ("", "qfq", "hfq")
+
+# 复权因子: date 为除权除息日 (升序)，factor 为当日起生效的后复权累计因子
+Factors = dict[str, np.ndarray]
+
+
+def empty_factors() -> Factors:
+    return {"date": np.array([], dtype="datetime64[D]"), "factor": np.array([], dtype=np.float64)}
+
+
+def validate_adjust(adjust: Optional[str]) -> str:
+    """校验复权类型 (None 视为不复权)
+
+    Raises:
+        ValueError: 复权类型无效
+    """
+    adjust = adjust or ""
+    if adjust not in ADJUSTMENTS:
+        raise ValueError(f"不支持的复权类型: {adjust}")
+    return adjust
+
+
+def market_symbol(code: str) -> str:
+    """新浪行情代码 (sh600519、sz000001、bj830799)"""
+    if code.startswith(("6", "9")):
+        return f"sh{code}"
+    if code.startswith(("4", "8")):
+        return f"bj{code}"
+    return f"sz{code}"
+
+
+def factors_from_frame(df: Optional[pd.DataFrame]) -> Factors:
+    """stock_zh_a_daily(adjust="hfq-factor") 结果转为因子序列"""
+    if df is None or df.empty:
+        return empty_factors()
+
+    dates = to_day_array(df["date"])
+    factors = to_float_array(df["hfq_factor"])
+    valid = ~np.isnat(dates) & np.isfinite(factors) & (factors > 0)
+    order = np.argsort(dates[valid], kind="stable")
+    return {"date": dates[valid][order], "factor": factors[valid][order]}
+
+
+def factor_version(factors: Factors) -> str:
+    """因子序列的版本标识 (最近一次除权除息日和因子)，用于缓存 key"""
+    if len(factors["date"]) == 0:
+        return "none"
+    return f"{factors['date'][-1]}:{format(float(factors['factor'][-1]), '.10g')}"
+
+
+def daily_factors(factors: Factors, dates: np.ndarray) -> np.ndarray:
+    """每根 K 线当日生效的因子 (早于首个因子日期的沿用首个因子)"""
+    if len(factors["date"]) == 0:
+        return np.ones(len(dates))
+    index = np.searchsorted(factors["date"], dates, side="right") - 1
+    return factors["factor"][np.maximum(index, 0)]
+
+
+def adjust_bars(raw: Bars, factors: Factors, adjust: str) -> Bars:
+    """由不复权 K 线计算复权 K 线
+
+    Args:
+        raw: 不复权列式 K 线
+        factors: 后复权因子
+        adjust: 复权类型 (qfq、hfq、空)
+
+    Returns:
+        复权后的列式 K 线 (不复权时原样返回)
+    """
+    if not validate_adjust(adjust) or len(raw["date"]) == 0 or len(factors["date"]) == 0:
+        return raw
+
+    scale = daily_factors(factors, raw["date"])
+    if adjust == "qfq":
+        scale = scale / factors["factor"][-1]
+
+    adjusted = dict(raw)
+    for column in PRICE_COLUMNS:
+        adjusted[column] = raw[column] * scale
+    return adjusted
@@ -1,22 +1,115 @@
 """Akshare 数据采集服务"""
-import asyncio
-from datetime import datetime, date, timedelta
-from typing import Optional
+import threading
+import time
+from datetime import datetime, date
+from typing import Callable, Optional, TypeVar
 import logging
 import akshare as ak
+import numpy as np
 import pandas as pd
 
+from ...core.config import settings
+from .adjust import (
+    Factors,
+    adjust_bars,
+    factor_version,
+    factors_from_frame,
+    market_symbol,
+    validate_adjust,
+)
+from .convert import bars_to_records, hist_to_bars, item_value_to_dict
+from .kline_store import (
+    Bars,
+    KLineStore,
+    get_kline_store,
+    merge_bars,
+    slice_bars,
+    to_day,
+)
+from .resample import (
+    CALENDAR_PERIODS,
+    DAILY,
+    period_keys,
+    period_start,
+    resample_bars,
+    validate_period,
+)
+from .scheduler import FetchScheduler, get_fetch_scheduler
+from .search import SymbolSearchService
+from .singleflight import SingleFlight
+from .snapshot import MarketSnapshot, MarketSnapshotService, get_snapshot_service
+from .trading_calendar import TradingCalendar, get_trading_calendar
+
+T = TypeVar("T")
+
 logger = logging.getLogger(__name__)
 
 
 class AkshareService:
     """Akshare 数据服务"""
 
-    def __init__(self):
-        """初始化服务"""
+    def __init__(
+        self,
+        snapshot_service: Optional[MarketSnapshotService] = None,
+        kline_store: Optional[KLineStore] = None,
+        scheduler: Optional[FetchScheduler] = None,
+        search_service: Optional[SymbolSearchService] = None,
+        calendar: Optional[TradingCalendar] = None,
+    ):
+        """初始化服务
+
+        Args:
+            snapshot_service: 全市场行情快照服务，默认使用全局单例
+            kline_store: 本地 K 线存储，默认使用全局单例
+            scheduler: 上游调用调度器，默认使用全局单例
+            search_service: 股票搜索服务，默认基于 snapshot_service 创建
+            calendar: 交易日历，默认使用全局单例
+        """
         self.enabled = True
+        self.snapshot_service = snapshot_service or get_snapshot_service()
+        self.kline_store = kline_store or get_kline_store()
+        self.scheduler = scheduler or get_fetch_scheduler()
+        self.search_service = search_service or SymbolSearchService(self.snapshot_service)
+        self.calendar = calendar or get_trading_calendar()
+        # 每个 代码/周期/复权 最近一次向上游检查新 K 线的时间
+        self._kline_checked: dict[tuple[str, str, str], float] = {}
+        # 每个 代码/周期/复权 最近一次拉取最新 K 线的北京时间 (判断收盘后是否仍需刷新)
+        self._kline_fetched: dict[tuple[str, str, str], datetime] = {}
+        # 每个代码最近一次向上游检查复权因子的时间
+        self._factors_checked: dict[str, float] = {}
+        # 每个 代码/周期/复权 的同步锁 (读取、拉取、保存期间持有)
+        self._sync_locks: dict[tuple[str, str, str], threading.Lock] = {}
+        self._sync_locks_guard = threading.Lock()
+        # 相同参数的并发上游调用合并
+        self.single_flight = SingleFlight()
         logger.info("Akshare 数据服务初始化完成")
 
+    async def _call(self, endpoint: str, func: Callable[..., T], *args, **kwargs) -> T:
+        """通过调度器执行阻塞的上游调用
+
+        相同函数和参数的并发调用合并为一次执行，共享结果。
+
+        Args:
+            endpoint: 上游端点 (spot, hist, financial, news, info)
+            func: 阻塞函数
+        """
+        name = getattr(func, "__name__", repr(func))
+        key = (name, args, tuple(sorted(kwargs.items())))
+
+        return await self.single_flight.do(
+            key,
+            lambda: self.scheduler.run(endpoint, func, *args, **kwargs),
+            name=name,
+        )
+
+    def upstream_stats(self) -> dict:
+        """上游调用统计"""
+        return {
+            "coalescing": self.single_flight.stats(),
+            "scheduler": self.scheduler.stats(),
+            "calendar": self.calendar.info(),
+        }
+
     async def get_spot_quote(self, code: str) -> Optional[dict]:
         """获取实时行情
 
@@ -27,41 +120,28 @@ class AkshareService:
             行情数据字典
         """
         try:
-            # 在线程池中执行同步的 akshare 调用
-            loop = asyncio.get_event_loop()
-            df = await loop.run_in_executor(
-                None,
-                lambda: ak.stock_zh_a_spot_em(),
-            )
-
-            # 查找目标股票
-            stock_data = df[df["代码"] == code]
-
-            if stock_data.empty:
-                logger.warning(f"未找到股票 {code} 的行情数据")
+            # 从全市场快照中按代码查找，避免每次下载全市场行情
+            snapshot = await self.snapshot_service.get_snapshot()
+            if snapshot is None:
                 return None
 
-            row = stock_data.iloc[0]
-
-            return {
-                "code": row["代码"],
-                "name": row["名称"],
-                "price": float(row["最新价"]),
-                "change": float(row["涨跌额"]),
-                "change_pct": float(row["涨跌幅"]),
-                "volume": float(row["成交量"]),
-                "amount": float(row["成交额"]),
-                "high": float(row["最高"]),
-                "low": float(row["最低"]),
-                "open_price": float(row["今开"]),
-                "close_prev": float(row["昨收"]),
-                "timestamp": datetime.now(),
-            }
+            quote = snapshot.get_quote(code)
+            if quote is None:
+                logger.warning(f"未找到股票 {code} 的行情数据")
+            return quote
 
         except Exception as e:
             logger.error(f"获取股票 {code} 实时行情失败: {e}")
             return None
 
+    async def get_market_snapshot(self) -> Optional[MarketSnapshot]:
+        """获取全市场行情快照
+
+        Returns:
+            列式行情快照，上游不可用且无旧快照时返回 None
+        """
+        return await self.snapshot_service.get_snapshot()
+
     async def get_stock_info(self, code: str) -> Optional[dict]:
         """获取股票基本信息
 
@@ -72,20 +152,14 @@ class AkshareService:
             股票信息字典
         """
         try:
-            loop = asyncio.get_event_loop()
-            df = await loop.run_in_executor(
-                None,
-                lambda: ak.stock_individual_info_em(symbol=code),
-            )
+            df = await self._call("info", ak.stock_individual_info_em, symbol=code)
 
             if df is None or df.empty:
                 logger.warning(f"未找到股票 {code} 的基本信息")
                 return None
 
             # 转换为字典
-            info = {}
-            for _, row in df.iterrows():
-                info[row["item"]] = row["value"]
+            info = item_value_to_dict(df)
 
             return {
                 "code": code,
@@ -111,60 +185,265 @@ class AkshareService:
 
         Args:
             code: 股票代码
-            period: 周期 (daily, weekly, monthly)
+            period: 周期 (daily, weekly, monthly, quarterly, Nd)
             start_date: 开始日期 (YYYYMMDD)
             end_date: 结束日期 (YYYYMMDD)
             adjust: 复权类型 (qfq-前复权, hfq-后复权, ""-不复权)
 
         Returns:
-            K 线数据列表
+            K 线数据列表 (需要列式数组时使用 get_kline_bars)
         """
         try:
-            # 默认获取最近一年数据
-            if end_date is None:
-                end_date = datetime.now().strftime("%Y%m%d")
-            if start_date is None:
-                start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
-
-            loop = asyncio.get_event_loop()
-            symbol = f"{code}上海" if code.startswith("6") else f"{code}深圳"
-
-            df = await loop.run_in_executor(
-                None,
-                lambda: ak.stock_zh_a_hist(
-                    symbol=symbol,
-                    period=period,
-                    start_date=start_date,
-                    end_date=end_date,
-                    adjust=adjust,
-                ),
-            )
+            bars = await self.get_kline_bars(code, period, start_date, end_date, adjust)
 
-            if df is None or df.empty:
+            if len(bars["date"]) == 0:
                 logger.warning(f"未找到股票 {code} 的K线数据")
                 return []
 
-            # 转换数据格式
-            kline_data = []
-            for _, row in df.iterrows():
-                kline_data.append(
-                    {
-                        "date": self._parse_date(str(row["日期"])),
-                        "open_price": float(row["开盘"]),
-                        "high": float(row["最高"]),
-                        "low": float(row["最低"]),
-                        "close": float(row["收盘"]),
-                        "volume": float(row["成交量"]),
-                        "amount": float(row["成交额"]),
-                    }
-                )
-
-            return kline_data
+            return bars_to_records(bars)
 
         except Exception as e:
             logger.error(f"获取股票 {code} K线数据失败: {e}")
             return []
 
+    async def get_kline_bars(
+        self,
+        code: str,
+        period: str = "daily",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        adjust: str = "qfq",
+    ) -> Bars:
+        """获取列式 K 线 (优先读取本地存储，只向上游补齐缺失区间)
+
+        Args:
+            code: 股票代码
+            period: 周期 (daily, weekly, monthly, quarterly, Nd)
+            start_date: 开始日期 (YYYYMMDD)
+            end_date: 结束日期 (YYYYMMDD)
+            adjust: 复权类型
+
+        Returns:
+            列名 -> 数组 的 K 线
+        """
+        start, end = self.kline_range(start_date, end_date)
+        bars = await self.get_kline_history(code, period, start, end, adjust)
+        return slice_bars(bars, start, None)
+
+    async def get_kline_history(
+        self,
+        code: str,
+        period: str = "daily",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        adjust: str = "qfq",
+    ) -> Bars:
+        """获取本地存储中截至 end_date 的全部 K 线 (至少覆盖 [start_date, end_date])
+
+        指标计算使用完整历史，结果不随请求区间的起点变化，便于缓存和增量扩展。
+        本地只存储不复权日线，复权价格在读取时由复权因子计算。
+
+        Args:
+            code: 股票代码
+            period: 周期 (daily, weekly, monthly, quarterly, Nd)
+            start_date: 至少需要覆盖的开始日期 (YYYYMMDD)
+            end_date: 结束日期 (YYYYMMDD)
+            adjust: 复权类型
+
+        Returns:
+            列名 -> 数组 的 K 线
+        """
+        adjust = validate_adjust(adjust)
+        start, end = self.kline_range(start_date, end_date)
+        # 其他周期由本地日线聚合，日线向前补齐到周期起点，保证首个周期完整
+        sync_from = start if validate_period(period) == DAILY else period_start(start, period)
+        daily, covered_from = await self._call(
+            "hist", self._sync_kline, code, DAILY, "", sync_from, end
+        )
+        daily = slice_bars(daily, None, end)
+        if adjust:
+            daily = adjust_bars(daily, await self.get_adjust_factors(code), adjust)
+        if period == DAILY:
+            return daily
+
+        partial_head = period_start(covered_from, period) < covered_from
+        if period in CALENDAR_PERIODS and partial_head and len(daily["date"]):
+            # 更早的历史来自其他请求，覆盖起点不在周期开头时丢弃不完整的首个周期
+            partial = period_keys(daily["date"], period) == period_keys(covered_from, period)
+            daily = {column: values[~partial] for column, values in daily.items()}
+        return resample_bars(daily, period)
+
+    async def get_adjust_factors(self, code: str) -> Factors:
+        """获取复权因子 (本地存储，按间隔向上游检查新的除权除息)
+
+        Args:
+            code: 股票代码
+
+        Returns:
+            后复权因子序列
+
+        Raises:
+            RuntimeError: 上游不可用且无本地存储
+        """
+        return await self._call("hist", self._sync_factors, code)
+
+    async def adjust_version(self, code: str, adjust: str) -> str:
+        """复权价格的版本标识 (复权因子变化时改变)，用于缓存 key"""
+        if not validate_adjust(adjust):
+            return "none"
+        return factor_version(await self.get_adjust_factors(code))
+
+    @staticmethod
+    def kline_range(start_date=None, end_date=None) -> tuple[np.datetime64, np.datetime64]:
+        """K 线请求区间，默认最近一年"""
+        end = to_day(end_date)
+        if end is None:
+            end = np.datetime64(date.today(), "D")
+        start = to_day(start_date)
+        if start is None:
+            start = end - np.timedelta64(365, "D")
+        return start, end
+
+    def _sync_kline(
+        self,
+        code: str,
+        period: str,
+        adjust: str,
+        start: np.datetime64,
+        end: np.datetime64,
+    ) -> tuple[Bars, np.datetime64]:
+        """同步本地 K 线存储 (阻塞调用，在线程池中执行)
+
+        合并请求的 key 包含起止日期，同一 K 线的不同区间可能同时同步；
+        读取到保存整个过程持有该 K 线的锁，避免向前补齐和向后追加互相覆盖。
+
+        Returns:
+            (全部已存储的 K 线, covered_from)
+        """
+        key = (code, period, adjust)
+        with self._sync_lock(key):
+            return self._sync_kline_locked(key, start, end)
+
+    def _sync_lock(self, key: tuple[str, str, str]) -> threading.Lock:
+        with self._sync_locks_guard:
+            return self._sync_locks.setdefault(key, threading.Lock())
+
+    def _sync_kline_locked(
+        self,
+        key: tuple[str, str, str],
+        start: np.datetime64,
+        end: np.datetime64,
+    ) -> tuple[Bars, np.datetime64]:
+        """同步本地 K 线存储 (调用方持有该 K 线的锁)"""
+        code, period, adjust = key
+        loaded = self.kline_store.load(code, period, adjust)
+
+        if loaded is None:
+            bars = self._fetch_hist(code, period, start, end, adjust)
+            self.kline_store.save(code, period, adjust, bars, start)
+            self._kline_checked[key] = time.monotonic()
+            self._kline_fetched[key] = self.calendar.now()
+            return bars, start
+
+        bars, covered_from = loaded
+        changed = False
+
+        # 向前补齐更早的历史
+        if start < covered_from:
+            head = self._fetch_hist(code, period, start, covered_from - np.timedelta64(1, "D"), adjust)
+            bars = merge_bars(bars, head)
+            covered_from = start
+            changed = True
+
+        # 向后追加新 K 线，包含最后一根以刷新盘中未收盘的数据
+        last = bars["date"][-1] if len(bars["date"]) else covered_from
+        checked = self._kline_checked.get(key, 0.0)
+        if (
+            end >= last
+            and time.monotonic() - checked > settings.KLINE_STORE_REFRESH_INTERVAL
+            and self._kline_stale(key, last, end)
+        ):
+            tail = self._fetch_hist(code, period, last, end, adjust)
+            self._kline_checked[key] = time.monotonic()
+            self._kline_fetched[key] = self.calendar.now()
+            if len(tail["date"]):
+                bars = merge_bars(bars, tail)
+                changed = True
+
+        if changed:
+            self.kline_store.save(code, period, adjust, bars, covered_from)
+
+        return bars, covered_from
+
+    def _kline_stale(self, key: tuple[str, str, str], last: np.datetime64, end: np.datetime64) -> bool:
+        """本地最后一根 K 线之后是否可能有新数据
+
+        周末、节假日和收盘后，已取得最近交易日收盘数据时不再请求上游。
+        """
+        latest = np.datetime64(self.calendar.latest_trading_day(), "D")
+        if last < min(end, latest):
+            # 之后还有已开盘的交易日
+            return True
+        if last < latest:
+            # 请求区间的 K 线都已收盘
+            return False
+        return self.calendar.changed_since(self._kline_fetched.get(key))
+
+    def _sync_factors(self, code: str) -> Factors:
+        """同步本地复权因子 (阻塞调用，在线程池中执行)
+
+        因子只在出现新的除权除息时变化，不复权 K 线存储不受影响。
+
+        Raises:
+            RuntimeError: 上游不可用且没有本地存储 (不能把不复权价格当作复权价格返回)
+        """
+        stored = self.kline_store.load_factors(code)
+        checked = self._factors_checked.get(code, 0.0)
+        if stored is not None and time.monotonic() - checked <= settings.ADJUST_FACTOR_REFRESH_INTERVAL:
+            return stored
+
+        try:
+            factors = self._fetch_factors(code)
+        except Exception as e:
+            logger.warning(f"获取股票 {code} 复权因子失败: {e}")
+            if stored is None:
+                raise RuntimeError(f"股票 {code} 复权因子不可用: {e}") from e
+            return stored
+        finally:
+            self._factors_checked[code] = time.monotonic()
+
+        if len(factors["date"]) == 0 and stored is not None:
+            return stored
+        if stored is None or factor_version(stored) != factor_version(factors) or (
+            len(stored["date"]) != len(factors["date"])
+        ):
+            self.kline_store.save_factors(code, factors)
+        return factors
+
+    def _fetch_factors(self, code: str) -> Factors:
+        """从上游拉取后复权因子 (阻塞调用)"""
+        df = ak.stock_zh_a_daily(symbol=market_symbol(code), adjust="hfq-factor")
+        return factors_from_frame(df)
+
+    def _fetch_hist(
+        self,
+        code: str,
+        period: str,
+        start: np.datetime64,
+        end: np.datetime64,
+        adjust: str,
+    ) -> Bars:
+        """从上游拉取指定区间的 K 线 (阻塞调用)"""
+        df = ak.stock_zh_a_hist(
+            symbol=code,
+            period=period,
+            start_date=str(start).replace("-", ""),
+            end_date=str(end).replace("-", ""),
+            adjust=adjust,
+        )
+
+        return hist_to_bars(df)
+
     async def get_financial_data(
         self,
         code: str,
@@ -180,24 +459,19 @@ class AkshareService:
             财务数据字典
         """
         try:
-            loop = asyncio.get_event_loop()
-
             # 获取利润表
-            profit_df = await loop.run_in_executor(
-                None,
-                lambda: ak.stock_profit_sheet_by_yearly_em(symbol=code),
+            profit_df = await self._call(
+                "financial", ak.stock_profit_sheet_by_yearly_em, symbol=code
             )
 
             # 获取资产负债表
-            balance_df = await loop.run_in_executor(
-                None,
-                lambda: ak.stock_balance_sheet_by_yearly_em(symbol=code),
+            balance_df = await self._call(
+                "financial", ak.stock_balance_sheet_by_yearly_em, symbol=code
             )
 
             # 获取现金流量表
-            cashflow_df = await loop.run_in_executor(
-                None,
-                lambda: ak.stock_cash_flow_sheet_by_yearly_em(symbol=code),
+            cashflow_df = await self._call(
+                "financial", ak.stock_cash_flow_sheet_by_yearly_em, symbol=code
             )
 
             # 简化处理，返回最新一期数据
@@ -225,39 +499,14 @@ class AkshareService:
         """搜索股票
 
         Args:
-            keyword: 搜索关键词 (代码或名称)
+            keyword: 搜索关键词 (代码、名称或拼音首字母)
             limit: 返回结果数量限制
 
         Returns:
             股票列表
         """
         try:
-            loop = asyncio.get_event_loop()
-            df = await loop.run_in_executor(
-                None,
-                lambda: ak.stock_zh_a_spot_em(),
-            )
-
-            # 按代码或名称筛选
-            if keyword.isdigit():
-                result = df[df["代码"].str.contains(keyword)]
-            else:
-                result = df[df["名称"].str.contains(keyword)]
-
-            result = result.head(limit)
-
-            stocks = []
-            for _, row in result.iterrows():
-                stocks.append(
-                    {
-                        "code": row["代码"],
-                        "name": row["名称"],
-                        "price": float(row["最新价"]),
-                        "change_pct": float(row["涨跌幅"]),
-                    }
-                )
-
-            return stocks
+            return await self.search_service.search(keyword, limit)
 
         except Exception as e:
             logger.error(f"搜索股票失败: {e}")
@@ -1,52 +1,216 @@
 """缓存服务"""
-import json
+import asyncio
 import logging
+import time
+import uuid
+from collections import OrderedDict
 from typing import Optional, Any
 
 import redis.asyncio as redis
 
 from ...core.config import settings
+from .codec import CacheCodec, create_codec
 
 logger = logging.getLogger(__name__)
 
+# 失效订阅断开后的重连间隔 (秒)，连续失败时加倍
+_RECONNECT_DELAY = 1.0
+_MAX_RECONNECT_DELAY = 30.0
+
+
+class LocalCache:
+    """进程内 LRU 缓存 (L1)
+
+    按条目数和估算字节数双重限制，超出时淘汰最久未使用的条目；
+    每个条目有独立的过期时间。返回的是共享对象，调用方不应修改。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value, _ = item
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float, size: int):
+        if ttl <= 0 or size > self.max_bytes:
+            self.delete(key)
+            return
+
+        self.delete(key)
+        self._data[key] = (time.monotonic() + ttl, value, size)
+        self.bytes += size
+
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self.bytes -= evicted_size
+
+    def delete(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.bytes -= item[2]
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
 
 class CacheService:
-    """Redis 缓存服务"""
+    """两级缓存服务: 进程内 LRU (L1) + Redis (L2)
+
+    L1 保存编码后再解码的值 (与 Redis 命中时相同)，返回类型不取决于命中哪一级，
+    也不与调用方写入的对象共享。
+    L1 条目的过期时间不超过 Redis 中的剩余 TTL；写入和删除时通过 Redis
+    pub/sub 广播失效消息，使多个 uvicorn worker 的 L1 保持一致。
+    Redis 中的 key 带有编码格式前缀 (如 orjson1:stock:600519:info)。
+    """
+
+    def __init__(self, codec: Optional[CacheCodec] = None):
+        """初始化服务
 
-    def __init__(self):
-        """初始化服务"""
+        Args:
+            codec: 缓存编码器，默认按配置创建
+        """
         self.redis: Optional[redis.Redis] = None
         self.default_ttl = settings.CACHE_TTL
+        self.codec = codec or create_codec()
+        self.local: Optional[LocalCache] = None
+        if settings.CACHE_L1_ENABLED:
+            self.local = LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_MAX_BYTES)
+        self.channel = settings.CACHE_INVALIDATION_CHANNEL
+        self.instance_id = uuid.uuid4().hex
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        self._listener: Optional[asyncio.Task] = None
 
     async def connect(self):
         """连接 Redis"""
         try:
-            self.redis = await redis.from_url(
-                settings.REDIS_URL,
-                encoding="utf-8",
-                decode_responses=True,
-            )
+            self.redis = await redis.from_url(settings.REDIS_URL)
             await self.redis.ping()
             logger.info("Redis 连接成功")
         except Exception as e:
-            logger.warning(f"Redis 连接失败: {e}，缓存功能将不可用")
+            self.redis = None
+            logger.warning(f"Redis 连接失败: {e}，仅使用进程内缓存")
+            return
+
+        if self.local is not None and self.channel:
+            self._listener = asyncio.create_task(self._run_invalidation_listener())
 
     async def disconnect(self):
         """断开 Redis 连接"""
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
         if self.redis:
             await self.redis.close()
             logger.info("Redis 连接已关闭")
 
+    async def _run_invalidation_listener(self):
+        """保持失效订阅，断开后按退避间隔重连"""
+        delay = _RECONNECT_DELAY
+        reconnect = False
+        while True:
+            if await self._listen_invalidations(clear=reconnect):
+                delay = _RECONNECT_DELAY
+            reconnect = True
+            logger.warning(f"缓存失效订阅断开，{delay:.0f} 秒后重连")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _MAX_RECONNECT_DELAY)
+
+    async def _listen_invalidations(self, clear: bool = False) -> bool:
+        """订阅其他 worker 的失效消息，直到连接断开
+
+        Args:
+            clear: 订阅成功后清空一级缓存 (重连时，断开期间的失效消息已丢失)
+
+        Returns:
+            是否订阅成功
+        """
+        subscribed = False
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            subscribed = True
+            if clear:
+                self.local.clear()
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                sender, _, key = data.partition(":")
+                if sender != self.instance_id:
+                    self.local.delete(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"缓存失效订阅中断: {e}")
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+        return subscribed
+
+    async def _publish_invalidation(self, key: str):
+        """广播失效消息"""
+        if self.local is not None and self.channel:
+            await self.redis.publish(self.channel, f"{self.instance_id}:{key}")
+
+    def _redis_key(self, key: str) -> str:
+        """Redis 中的实际 key (带编码格式前缀)"""
+        return f"{self.codec.tag}:{key}"
+
     async def get(self, key: str) -> Optional[Any]:
         """获取缓存"""
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                self.stats["l1_hits"] += 1
+                return value
+
         if not self.redis:
+            self.stats["misses"] += 1
             return None
 
         try:
-            value = await self.redis.get(key)
-            if value:
-                return json.loads(value)
-            return None
+            redis_key = self._redis_key(key)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                raw, pttl = await pipe.get(redis_key).pttl(redis_key).execute()
+
+            if not raw:
+                self.stats["misses"] += 1
+                return None
+
+            value = self.codec.decode(raw)
+            self.stats["l2_hits"] += 1
+
+            # L1 过期时间不超过 Redis 剩余 TTL
+            if self.local is not None and pttl and pttl > 0:
+                self.local.set(key, value, pttl / 1000, len(raw))
+
+            return value
         except Exception as e:
             logger.error(f"获取缓存失败: {e}")
             return None
@@ -58,16 +222,22 @@ class CacheService:
         ttl: Optional[int] = None,
     ) -> bool:
         """设置缓存"""
-        if not self.redis:
+        ttl = ttl or self.default_ttl
+
+        try:
+            raw = self.codec.encode(value)
+            if self.local is not None:
+                self.local.set(key, self.codec.decode(raw), ttl, len(raw))
+        except Exception as e:
+            logger.error(f"设置缓存失败: {e}")
             return False
 
+        if not self.redis:
+            return self.local is not None
+
         try:
-            ttl = ttl or self.default_ttl
-            await self.redis.setex(
-                key,
-                ttl,
-                json.dumps(value, ensure_ascii=False),
-            )
+            await self.redis.setex(self._redis_key(key), ttl, raw)
+            await self._publish_invalidation(key)
             return True
         except Exception as e:
             logger.error(f"设置缓存失败: {e}")
@@ -75,11 +245,15 @@ class CacheService:
 
     async def delete(self, key: str) -> bool:
         """删除缓存"""
+        if self.local is not None:
+            self.local.delete(key)
+
         if not self.redis:
-            return False
+            return self.local is not None
 
         try:
-            await self.redis.delete(key)
+            await self.redis.delete(self._redis_key(key))
+            await self._publish_invalidation(key)
             return True
         except Exception as e:
             logger.error(f"删除缓存失败: {e}")
@@ -87,15 +261,26 @@ class CacheService:
 
     async def exists(self, key: str) -> bool:
         """检查缓存是否存在"""
+        if self.local is not None and self.local.get(key) is not None:
+            return True
+
         if not self.redis:
             return False
 
         try:
-            return await self.redis.exists(key) > 0
+            return await self.redis.exists(self._redis_key(key)) > 0
         except Exception as e:
             logger.error(f"检查缓存失败: {e}")
             return False
 
+    def info(self) -> dict:
+        """缓存命中统计"""
+        return {
+            **self.stats,
+            "l1_entries": len(self.local) if self.local is not None else 0,
+            "l1_bytes": self.local.bytes if self.local is not None else 0,
+        }
+
 
 # 全局单例
 _cache_service: Optional[CacheService] = None
@@ -0,0 +1,236 @@
+"""缓存编解码"""
+import json
+import logging
+import math
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+import numpy as np
+
+from ...core.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 压缩标记 (编码结果的第一个字节)
+RAW = 0
+ZSTD = 1
+ZLIB = 2
+
+
+def _to_builtin(value: Any) -> Any:
+    """将 JSON 不支持的类型转为内置类型"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
+
+
+def _nan_to_none(value: Any) -> Any:
+    """递归将 NaN/Inf 替换为 None (与 orjson 行为一致)"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _nan_to_none(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_nan_to_none(v) for v in value]
+    return value
+
+
+class JsonCodec:
+    """标准库 JSON 编解码 (无第三方依赖时的兜底)
+
+    日期编码为 ISO 字符串，NaN 编码为 null。
+    """
+
+    name = "json"
+    version = 1
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(
+            _nan_to_none(value),
+            ensure_ascii=False,
+            default=_to_builtin,
+            allow_nan=False,
+        ).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """orjson 编解码
+
+    原生支持 date/datetime 和 NumPy 数组，NaN 编码为 null。
+    """
+
+    name = "orjson"
+    version = 1
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(
+            value,
+            default=_to_builtin,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    """msgpack 编解码 (保留类型)
+
+    date/datetime 和 NumPy 数组通过扩展类型编码，解码后恢复为原类型。
+    """
+
+    name = "msgpack"
+    version = 1
+
+    EXT_DATE = 1
+    EXT_DATETIME = 2
+    EXT_NDARRAY = 3
+
+    def _default(self, value: Any) -> Any:
+        if isinstance(value, datetime):
+            return msgpack.ExtType(self.EXT_DATETIME, value.isoformat().encode())
+        if isinstance(value, date):
+            return msgpack.ExtType(self.EXT_DATE, value.isoformat().encode())
+        if isinstance(value, np.ndarray):
+            header = f"{value.dtype.str}|{','.join(map(str, value.shape))}".encode()
+            body = np.ascontiguousarray(value).tobytes()
+            return msgpack.ExtType(self.EXT_NDARRAY, header + b"\0" + body)
+        return _to_builtin(value)
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        if code == self.EXT_DATETIME:
+            return datetime.fromisoformat(data.decode())
+        if code == self.EXT_DATE:
+            return date.fromisoformat(data.decode())
+        if code == self.EXT_NDARRAY:
+            header, _, body = data.partition(b"\0")
+            dtype, _, shape = header.decode().partition("|")
+            shape = tuple(int(s) for s in shape.split(",") if s)
+            return np.frombuffer(body, dtype=np.dtype(dtype)).reshape(shape).copy()
+        return msgpack.ExtType(code, data)
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+
+
+CODECS = {
+    "json": JsonCodec,
+    "orjson": OrjsonCodec,
+    "msgpack": MsgpackCodec,
+}
+
+
+class CacheCodec:
+    """缓存编码: 序列化 + 超过阈值时压缩
+
+    编码结果首字节为压缩标记；codec 名称和版本写入 key 前缀 (tag)，
+    更换格式后旧数据自然失效，不会被错误解码。
+    """
+
+    def __init__(
+        self,
+        codec: str = "orjson",
+        compression: str = "zstd",
+        compress_min_bytes: int = 1024,
+    ):
+        """初始化编码器
+
+        Args:
+            codec: 序列化格式 (orjson, msgpack, json)，依赖未安装时回退
+            compression: 压缩算法 (zstd, zlib, none)，zstd 未安装时回退为 zlib
+            compress_min_bytes: 超过该字节数才压缩
+        """
+        if codec == "msgpack" and msgpack is None:
+            logger.warning("msgpack 未安装，缓存编码回退为 orjson")
+            codec = "orjson"
+        if codec == "orjson" and orjson is None:
+            logger.warning("orjson 未安装，缓存编码回退为 json")
+            codec = "json"
+        self.serializer = CODECS.get(codec, JsonCodec)()
+
+        if compression == "zstd" and zstandard is None:
+            compression = "zlib"
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+
+        self._zstd_compressor = None
+        self._zstd_decompressor = None
+        if zstandard is not None:
+            self._zstd_compressor = zstandard.ZstdCompressor(level=3)
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    @property
+    def tag(self) -> str:
+        """key 前缀，如 orjson1"""
+        return f"{self.serializer.name}{self.serializer.version}"
+
+    def encode(self, value: Any) -> bytes:
+        """序列化并按需压缩"""
+        payload = self.serializer.dumps(value)
+
+        if len(payload) >= self.compress_min_bytes:
+            if self.compression == "zstd":
+                return bytes([ZSTD]) + self._zstd_compressor.compress(payload)
+            if self.compression == "zlib":
+                return bytes([ZLIB]) + zlib.compress(payload, 6)
+
+        return bytes([RAW]) + payload
+
+    def decode(self, data: bytes) -> Any:
+        """解压并反序列化"""
+        flag, payload = data[0], data[1:]
+
+        if flag == ZSTD:
+            if self._zstd_decompressor is None:
+                raise ValueError("缺少 zstandard，无法解压缓存数据")
+            payload = self._zstd_decompressor.decompress(payload)
+        elif flag == ZLIB:
+            payload = zlib.decompress(payload)
+
+        return self.serializer.loads(payload)
+
+
+def create_codec(
+    codec: Optional[str] = None,
+    compression: Optional[str] = None,
+    compress_min_bytes: Optional[int] = None,
+) -> CacheCodec:
+    """按配置创建缓存编码器"""
+    return CacheCodec(
+        codec=codec or settings.CACHE_CODEC,
+        compression=compression or settings.CACHE_COMPRESSION,
+        compress_min_bytes=compress_min_bytes or settings.CACHE_COMPRESS_MIN_BYTES,
+    )
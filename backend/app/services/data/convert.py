@@ -0,0 +1,86 @@
+"""DataFrame 向量化转换"""
+from datetime import date
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .kline_store import KLINE_COLUMNS, Bars, empty_bars
+
+# stock_zh_a_hist 列名 -> K 线字段
+HIST_COLUMNS = {
+    "日期": "date",
+    "开盘": "open_price",
+    "最高": "high",
+    "最低": "low",
+    "收盘": "close",
+    "成交量": "volume",
+    "成交额": "amount",
+}
+
+
+def detect_date_format(sample: str) -> Optional[str]:
+    """根据样本推断日期字符串格式 (每列只推断一次)"""
+    sample = sample.strip()
+    if len(sample) == 8 and sample.isdigit():
+        return "%Y%m%d"
+    if "/" in sample:
+        return "%Y/%m/%d"
+    if ":" in sample:
+        return "%Y-%m-%d %H:%M:%S"
+    if "-" in sample:
+        return "%Y-%m-%d"
+    return None
+
+
+def to_day_array(values: pd.Series) -> np.ndarray:
+    """将日期列整体转为 datetime64[D]
+
+    支持 datetime64 列、date 对象列以及单一格式的字符串列；
+    字符串按首个非空值推断一次格式，再用显式格式整体解析。
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy().astype("datetime64[D]")
+
+    non_null = values.dropna()
+    if non_null.empty:
+        return np.full(len(values), np.datetime64("NaT"), dtype="datetime64[D]")
+
+    first = non_null.iloc[0]
+    if isinstance(first, date):
+        return np.array(values.tolist(), dtype="datetime64[D]")
+
+    fmt = detect_date_format(str(first))
+    parsed = pd.to_datetime(values.astype(str), format=fmt, errors="coerce")
+    return parsed.to_numpy().astype("datetime64[D]")
+
+
+def to_float_array(values: pd.Series) -> np.ndarray:
+    """数值列整体转为 float64，无法解析的值为 NaN"""
+    if pd.api.types.is_float_dtype(values):
+        return values.to_numpy(dtype=np.float64)
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def hist_to_bars(df: Optional[pd.DataFrame]) -> Bars:
+    """stock_zh_a_hist 结果转为列式 K 线"""
+    if df is None or df.empty:
+        return empty_bars()
+
+    bars = {"date": to_day_array(df["日期"])}
+    for source, column in HIST_COLUMNS.items():
+        if column != "date":
+            bars[column] = to_float_array(df[source])
+    return bars
+
+
+def bars_to_records(bars: Bars) -> list[dict]:
+    """列式 K 线转为记录列表 (date 为 datetime.date)"""
+    columns = [bars["date"].astype(object)]
+    columns += [bars[column].tolist() for column in KLINE_COLUMNS[1:]]
+    return [dict(zip(KLINE_COLUMNS, row)) for row in zip(*columns)]
+
+
+def item_value_to_dict(df: pd.DataFrame) -> dict:
+    """item/value 两列的表转为字典 (如 stock_individual_info_em)"""
+    return dict(zip(df["item"].tolist(), df["value"].tolist()))
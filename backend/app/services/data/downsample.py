@@ -0,0 +1,98 @@
+"""图表数据降采样
+
+长序列按图表可显示的点数降采样，返回的数据量与像素数相关而与历史长度无关：
+- 折线 (指标、权益曲线): Largest-Triangle-Three-Buckets (LTTB)，保留视觉上的峰谷
+- K 线: 按连续分桶聚合 OHLC (开盘取首根、收盘取末根、最高/最低取极值、量额求和)
+"""
+from typing import Optional
+
+import numpy as np
+
+from .kline_store import Bars
+from .resample import aggregate_bars
+
+
+def lttb_indices(
+    values: np.ndarray,
+    max_points: int,
+    x: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """LTTB 降采样，返回保留点的下标 (升序，包含首尾)
+
+    多条序列共用同一组下标 (共享日期轴)：每条序列按自身取值范围归一化，
+    桶内选择各序列三角形面积之和最大的点。NaN 不参与面积计算。
+
+    Args:
+        values: 一维序列，或 (序列数 x 点数) 的二维数组
+        max_points: 最多保留的点数 (至少 3)
+        x: 横坐标，默认为下标
+
+    Returns:
+        保留点的下标
+    """
+    y = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n = y.shape[-1]
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # 归一化，使不同量纲的序列权重相当；全为 NaN 的序列不参与
+    y = np.where(np.isfinite(y), y, np.nan)
+    y = y[~np.isnan(y).all(axis=1)]
+    if len(y):
+        lo = np.nanmin(y, axis=1, keepdims=True)
+        span = np.nanmax(y, axis=1, keepdims=True) - lo
+        y = (y - lo) / np.where(span > 0, span, 1.0)
+
+    # 首尾之外的 n-2 个点均分到 max_points-2 个桶，末尾追加最后一个点作为最后一个桶的后继
+    edges = np.append(np.linspace(1, n - 1, max_points - 1).astype(np.int64), n)
+
+    # 每个桶的后继桶 (下一个桶，最后一个桶为末尾点) 的平均点
+    heads = edges[1:-1]
+    observed = ~np.isnan(y)
+    counts = np.add.reduceat(observed, heads, axis=1)
+    sums = np.add.reduceat(np.where(observed, y, 0.0), heads, axis=1)
+    y_next = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+    x_next = np.add.reduceat(x, heads) / np.diff(edges[1:])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(max_points - 2):
+        start, end = edges[b], edges[b + 1]
+        y_a = y[:, a:a + 1]
+        area = np.abs(
+            (x[a] - x_next[b]) * (y[:, start:end] - y_a)
+            - (x[a] - x[start:end]) * (y_next[:, b:b + 1] - y_a)
+        )
+        a = start + int(np.argmax(np.nansum(area, axis=0)))
+        selected[b + 1] = a
+
+    return selected
+
+
+def downsample_bars(bars: Bars, max_points: int) -> Bars:
+    """K 线按连续分桶聚合为至多 max_points 根 (日期取桶内最后一根)
+
+    Args:
+        bars: 列式 K 线
+        max_points: 最多保留的 K 线数
+
+    Returns:
+        聚合后的列式 K 线 (数量不超过 max_points 时原样返回)
+    """
+    n = len(bars["date"])
+    if max_points >= n or max_points < 1:
+        return bars
+
+    starts = np.linspace(0, n, max_points + 1).astype(np.int64)[:-1]
+    return aggregate_bars(bars, starts)
+
+
+def downsample_records(records: list[dict], field: str, max_points: int) -> list[dict]:
+    """按某个数值字段对记录列表做 LTTB 降采样 (如权益曲线的 equity)"""
+    if max_points >= len(records):
+        return records
+    values = np.array([record[field] for record in records], dtype=np.float64)
+    return [records[i] for i in lttb_indices(values, max_points).tolist()]
@@ -0,0 +1,172 @@
+"""本地 K 线存储"""
+import logging
+import os
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from ...core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# K 线列 (与接口返回字段同名)
+KLINE_COLUMNS = ("date", "open_price", "high", "low", "close", "volume", "amount")
+
+# 列式 K 线: 列名 -> 数组，date 为 datetime64[D]，其余为 float64
+Bars = dict[str, np.ndarray]
+
+
+def empty_bars() -> Bars:
+    """空 K 线"""
+    bars = {"date": np.array([], dtype="datetime64[D]")}
+    for column in KLINE_COLUMNS[1:]:
+        bars[column] = np.array([], dtype=np.float64)
+    return bars
+
+
+def to_day(value) -> Optional[np.datetime64]:
+    """将 YYYYMMDD / YYYY-MM-DD / date 转为 datetime64[D]"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (date, np.datetime64)):
+        return np.datetime64(value, "D")
+    text = str(value)
+    if len(text) == 8 and text.isdigit():
+        text = f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    return np.datetime64(text, "D")
+
+
+def slice_bars(bars: Bars, start=None, end=None) -> Bars:
+    """按日期区间 [start, end] 截取 (二分查找)"""
+    dates = bars["date"]
+    lo = 0 if start is None else int(np.searchsorted(dates, to_day(start), side="left"))
+    hi = len(dates) if end is None else int(np.searchsorted(dates, to_day(end), side="right"))
+    return {column: values[lo:hi] for column, values in bars.items()}
+
+
+def merge_bars(old: Bars, new: Bars) -> Bars:
+    """合并两段 K 线，日期重复时以新数据为准"""
+    if len(old["date"]) == 0:
+        return new
+    if len(new["date"]) == 0:
+        return old
+
+    keep = ~np.isin(old["date"], new["date"])
+    merged = {c: np.concatenate([old[c][keep], new[c]]) for c in KLINE_COLUMNS}
+    order = np.argsort(merged["date"], kind="stable")
+    return {c: values[order] for c, values in merged.items()}
+
+
+class KLineStore:
+    """本地 K 线存储
+
+    每个 代码/周期/复权 组合对应一个未压缩的 .npz 文件，每列一个数组；
+    另存 covered_from 记录已向上游确认过的最早日期，避免对上市前区间重复请求。
+    复权因子按股票代码单独存储 (factors/<code>.npz)。
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """初始化存储
+
+        Args:
+            root: 存储根目录，默认读取配置
+        """
+        self.root = Path(root or settings.KLINE_STORE_DIR)
+        self._locks: dict[Path, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, code: str, period: str, adjust: str) -> Path:
+        """存储文件路径"""
+        return self.root / period / (adjust or "none") / f"{code}.npz"
+
+    def _lock(self, path: Path) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def load(self, code: str, period: str, adjust: str) -> Optional[tuple[Bars, np.datetime64]]:
+        """读取全部已存储的 K 线
+
+        Returns:
+            (K 线, covered_from)，无存储时返回 None
+        """
+        path = self.path(code, period, adjust)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                bars = {column: data[column] for column in KLINE_COLUMNS}
+                covered_from = data["covered_from"][()]
+            return bars, covered_from
+        except Exception as e:
+            logger.error(f"读取本地K线失败 {path}: {e}")
+            return None
+
+    def save(
+        self,
+        code: str,
+        period: str,
+        adjust: str,
+        bars: Bars,
+        covered_from: np.datetime64,
+    ):
+        """原子写入 K 线 (先写临时文件再替换)"""
+        path = self.path(code, period, adjust)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+
+        with self._lock(path):
+            np.savez(
+                tmp,
+                covered_from=np.datetime64(covered_from, "D"),
+                **{column: bars[column] for column in KLINE_COLUMNS},
+            )
+            os.replace(tmp, path)
+
+    def factors_path(self, code: str) -> Path:
+        """复权因子文件路径"""
+        return self.root / "factors" / f"{code}.npz"
+
+    def load_factors(self, code: str) -> Optional[dict[str, np.ndarray]]:
+        """读取复权因子 (date, factor)，无存储时返回 None"""
+        path = self.factors_path(code)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                return {"date": data["date"], "factor": data["factor"]}
+        except Exception as e:
+            logger.error(f"读取复权因子失败 {path}: {e}")
+            return None
+
+    def save_factors(self, code: str, factors: dict[str, np.ndarray]):
+        """原子写入复权因子"""
+        path = self.factors_path(code)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+
+        with self._lock(path):
+            np.savez(tmp, date=factors["date"], factor=factors["factor"])
+            os.replace(tmp, path)
+
+    def delete(self, code: str, period: str, adjust: str):
+        """删除存储"""
+        path = self.path(code, period, adjust)
+        with self._lock(path):
+            path.unlink(missing_ok=True)
+
+
+# 全局单例
+_kline_store: Optional[KLineStore] = None
+
+
+def get_kline_store() -> KLineStore:
+    """获取 K 线存储单例"""
+    global _kline_store
+    if _kline_store is None:
+        _kline_store = KLineStore()
+    return _kline_store
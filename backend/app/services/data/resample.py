@@ -0,0 +1,119 @@
+"""K 线周期转换
+
+周线、月线、季线和自定义 N 日线都由本地日线聚合得到，不再单独向上游请求：
+- weekly / monthly / quarterly: 按自然周 (周一开始)、自然月、自然季度分组
+- Nd (如 5d、20d): 每 N 个交易日一组，从最后一根日线向前计数 (分组只取决于截止日期)
+
+日线只包含交易日，每组的日期取组内最后一个交易日 (与上游周线、月线一致)；
+开盘取首根、收盘取末根、最高/最低取极值 (忽略 NaN)、成交量/成交额求和。
+"""
+import re
+
+import numpy as np
+
+from .kline_store import Bars
+
+DAILY = "daily"
+CALENDAR_PERIODS = ("weekly", "monthly", "quarterly")
+
+_N_DAYS = re.compile(r"^(\d+)d$")
+
+# 分组聚合方式 (未列出的列取组内最后一个值)
+_FIRST = ("open_price",)
+_MAX = ("high",)
+_MIN = ("low",)
+_SUM = ("volume", "amount")
+
+
+def _n_days(period: str) -> int:
+    match = _N_DAYS.match(period)
+    if match is None or int(match.group(1)) < 1:
+        raise ValueError(f"不支持的K线周期: {period}")
+    return int(match.group(1))
+
+
+def validate_period(period: str) -> str:
+    """校验周期 (daily、weekly、monthly、quarterly 或 Nd)
+
+    Raises:
+        ValueError: 周期无效
+    """
+    if period != DAILY and period not in CALENDAR_PERIODS:
+        _n_days(period)
+    return period
+
+
+def period_start(day: np.datetime64, period: str) -> np.datetime64:
+    """day 所在自然周期的第一天 (N 日线按交易日计数，返回 day 本身)"""
+    day = np.datetime64(day, "D")
+    if period == "weekly":
+        # 1970-01-01 为周四，周一开始的周序号为 (天数 + 3) // 7
+        return day - np.timedelta64((day.astype(np.int64) + 3) % 7, "D")
+    if period == "monthly":
+        return day.astype("datetime64[M]").astype("datetime64[D]")
+    if period == "quarterly":
+        month = day.astype("datetime64[M]")
+        return (month - month.astype(np.int64) % 3).astype("datetime64[D]")
+    validate_period(period)
+    return day
+
+
+def period_keys(dates: np.ndarray, period: str) -> np.ndarray:
+    """每根日线所属分组的编号 (非递减)"""
+    days = np.asarray(dates, dtype="datetime64[D]")
+    if period == "weekly":
+        return (days.astype(np.int64) + 3) // 7
+    if period == "monthly":
+        return days.astype("datetime64[M]").astype(np.int64)
+    if period == "quarterly":
+        return days.astype("datetime64[M]").astype(np.int64) // 3
+    n = _n_days(period)
+    return -((len(days) - 1 - np.arange(len(days))) // n)
+
+
+def aggregate_bars(bars: Bars, starts: np.ndarray) -> Bars:
+    """按连续分组聚合 OHLCV
+
+    Args:
+        bars: 列式 K 线
+        starts: 每组第一根 K 线的下标 (严格递增，首个为 0)
+
+    Returns:
+        每组一根的列式 K 线，日期为组内最后一根
+    """
+    ends = np.append(starts[1:], len(bars["date"])) - 1
+
+    result = {}
+    for column, values in bars.items():
+        if column in _FIRST:
+            result[column] = values[starts]
+        elif column in _MAX:
+            result[column] = np.fmax.reduceat(values, starts)
+        elif column in _MIN:
+            result[column] = np.fmin.reduceat(values, starts)
+        elif column in _SUM:
+            result[column] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            result[column] = values[ends]
+    return result
+
+
+def resample_bars(bars: Bars, period: str) -> Bars:
+    """日线转换为指定周期
+
+    Args:
+        bars: 列式日线
+        period: weekly、monthly、quarterly 或 Nd
+
+    Returns:
+        列式 K 线 (daily 原样返回)
+
+    Raises:
+        ValueError: 周期无效
+    """
+    if validate_period(period) == DAILY or len(bars["date"]) == 0:
+        return bars
+
+    keys = period_keys(bars["date"], period)
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+    return aggregate_bars(bars, starts)
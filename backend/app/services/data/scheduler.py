@@ -0,0 +1,179 @@
+"""上游数据调用调度器"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from ...core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class EndpointMetrics:
+    """单个上游端点的调用统计"""
+
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    inflight: int = 0
+    queue_time_total: float = 0.0
+    queue_time_max: float = 0.0
+    run_time_total: float = 0.0
+    run_time_max: float = 0.0
+    completed: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "inflight": self.inflight,
+            "queue_time_avg": self.queue_time_total / self.calls if self.calls else 0.0,
+            "queue_time_max": self.queue_time_max,
+            "run_time_avg": self.run_time_total / self.completed if self.completed else 0.0,
+            "run_time_max": self.run_time_max,
+        }
+
+
+class FetchScheduler:
+    """阻塞式数据调用调度器
+
+    所有 akshare 调用在独立的有界线程池中执行，不占用默认线程池；
+    每个上游端点 (spot/hist/financial/news/info) 有独立的并发上限，
+    慢接口排队不会挤占其他接口。
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        limits: Optional[dict[str, int]] = None,
+        timeout: Optional[float] = None,
+    ):
+        """初始化调度器
+
+        Args:
+            max_workers: 线程池大小，默认读取配置
+            limits: 端点 -> 并发上限，默认读取配置
+            timeout: 默认单次调用超时(秒)，默认读取配置
+        """
+        self.max_workers = max_workers or settings.FETCH_MAX_WORKERS
+        self.limits = limits or dict(settings.FETCH_CONCURRENCY)
+        self.timeout = timeout or settings.FETCH_TIMEOUT
+        self.metrics: dict[str, EndpointMetrics] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="akshare",
+            )
+        return self._executor
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        """获取端点信号量 (事件循环变化时重建)"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores = {}
+
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            limit = self.limits.get(endpoint, self.limits.get("default", 4))
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[endpoint] = semaphore
+        return semaphore
+
+    async def run(
+        self,
+        endpoint: str,
+        func: Callable[..., T],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> T:
+        """在端点配额内执行阻塞调用
+
+        超时只影响调用方；线程中的调用无法被中断，其并发配额会保留到真正结束，
+        避免超时后继续向已经很慢的上游堆积请求。
+
+        Args:
+            endpoint: 上游端点名称
+            func: 阻塞函数
+            timeout: 超时(秒)，默认使用调度器配置
+
+        Returns:
+            调用结果
+
+        Raises:
+            asyncio.TimeoutError: 调用超时
+        """
+        metrics = self.metrics.setdefault(endpoint, EndpointMetrics())
+        metrics.calls += 1
+        semaphore = self._semaphore(endpoint)
+
+        submitted = time.monotonic()
+        await semaphore.acquire()
+        queued = time.monotonic() - submitted
+        metrics.queue_time_total += queued
+        metrics.queue_time_max = max(metrics.queue_time_max, queued)
+        metrics.inflight += 1
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        future = loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+        def finished(_):
+            elapsed = time.monotonic() - started
+            metrics.inflight -= 1
+            metrics.completed += 1
+            metrics.run_time_total += elapsed
+            metrics.run_time_max = max(metrics.run_time_max, elapsed)
+            semaphore.release()
+
+        future.add_done_callback(finished)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            metrics.timeouts += 1
+            logger.warning(f"上游调用超时: {endpoint} {getattr(func, '__name__', func)}")
+            raise
+        except Exception:
+            metrics.errors += 1
+            raise
+
+    def stats(self) -> dict[str, Any]:
+        """调度统计"""
+        return {
+            "max_workers": self.max_workers,
+            "limits": self.limits,
+            "endpoints": {name: m.to_dict() for name, m in self.metrics.items()},
+        }
+
+    def shutdown(self):
+        """关闭线程池 (不等待进行中的调用)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局单例
+_fetch_scheduler: Optional[FetchScheduler] = None
+
+
+def get_fetch_scheduler() -> FetchScheduler:
+    """获取调度器单例"""
+    global _fetch_scheduler
+    if _fetch_scheduler is None:
+        _fetch_scheduler = FetchScheduler()
+    return _fetch_scheduler
@@ -0,0 +1,290 @@
+"""股票代码/名称搜索索引
+
+搜索 (自动补全) 不再逐次扫描全市场行情，而是查询预先构建的内存索引：
+- 前缀: 代码、名称、拼音首字母 (如 gzmt -> 贵州茅台) 合并为一个有序数组，二分查找
+- 子串: 单字和二元组 (bigram) 倒排索引，求交集后校验
+- 排序: 完全匹配 > 代码前缀 > 名称前缀 > 拼音前缀 > 子串，同级按匹配串长度、代码排序
+
+索引只依赖股票列表 (代码、名称)，行情快照刷新后在后台检查列表是否变化，
+变化时在线程池中重建并原子替换，查询不等待上游 (仅首次查询时同步构建)。
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .snapshot import MarketSnapshot, MarketSnapshotService, finite_or_none, get_snapshot_service
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+logger = logging.getLogger(__name__)
+
+# GB2312 一级汉字按拼音排序，各声母首字的区位码 (无 i、u、v 开头的拼音)
+_GB2312_INITIALS = (
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"),
+    (0xB7A2, "f"), (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"),
+    (0xC0AC, "l"), (0xC2E8, "m"), (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"),
+    (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"), (0xCBFA, "t"), (0xCDDA, "w"),
+    (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z"),
+)
+_GB2312_CODES = [code for code, _ in _GB2312_INITIALS]
+# 一级汉字结束位置 (之后的二级汉字按部首排序，无法推断拼音)
+_GB2312_LEVEL1_END = 0xD7F9
+
+
+def _gb2312_initial(char: str) -> str:
+    """由 GB2312 区位码推断汉字拼音首字母 (仅一级汉字)"""
+    try:
+        encoded = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return ""
+    if len(encoded) != 2:
+        return ""
+    code = (encoded[0] << 8) | encoded[1]
+    if code < _GB2312_CODES[0] or code > _GB2312_LEVEL1_END:
+        return ""
+    return _GB2312_INITIALS[bisect_left(_GB2312_CODES, code + 1) - 1][1]
+
+
+def pinyin_initials(name: str) -> str:
+    """名称的拼音首字母 (小写)，字母和数字原样保留，其他符号忽略
+
+    安装 pypinyin 时使用其多音字和生僻字词典，否则按 GB2312 区位码推断常用字。
+    """
+    if lazy_pinyin is not None:
+        letters = lazy_pinyin(name, style=Style.FIRST_LETTER, errors=lambda text: list(text))
+    else:
+        letters = [char if char.isascii() else _gb2312_initial(char) for char in name]
+    return "".join(letter for letter in letters if letter.isascii() and letter.isalnum()).lower()
+
+
+def normalize(text: str) -> str:
+    """查询和索引统一的规范化 (去空白、小写、全角转半角)"""
+    chars = []
+    for char in text.strip():
+        code = ord(char)
+        if 0xFF01 <= code <= 0xFF5E:
+            char = chr(code - 0xFEE0)
+        chars.append(char)
+    return "".join(chars).replace(" ", "").lower()
+
+
+def listing_digest(codes: Iterable[str], names: Iterable[str]) -> str:
+    """股票列表的摘要 (与顺序无关，代码或名称变化时改变)"""
+    digest = hashlib.sha1()
+    for code, name in sorted(zip(codes, names)):
+        digest.update(f"{code}\t{name}\n".encode())
+    return digest.hexdigest()
+
+
+def _grams(text: str) -> set[str]:
+    """单字和二元组"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SymbolIndex:
+    """股票搜索索引 (构建后只读，可在线程间共享)"""
+
+    def __init__(self, codes: Iterable[str], names: Iterable[str]):
+        """构建索引
+
+        Args:
+            codes: 股票代码
+            names: 股票名称 (与 codes 对齐)
+        """
+        pairs = sorted(zip((str(code) for code in codes), (str(name) for name in names)))
+        self.codes = [code for code, _ in pairs]
+        self.names = [name for _, name in pairs]
+        self.initials = [pinyin_initials(name) for name in self.names]
+        self.digest = listing_digest(self.codes, self.names)
+        # 匹配字段: 代码、名称、拼音首字母 (顺序即同级排序优先级)
+        fields = (self.codes, [normalize(name) for name in self.names], self.initials)
+        self._fields = fields
+
+        # 前缀: 所有字段的匹配串合并排序
+        entries = sorted(
+            (key, row, field)
+            for field, keys in enumerate(fields)
+            for row, key in enumerate(keys)
+            if key
+        )
+        self._keys = [key for key, _, _ in entries]
+        self._rows = np.array([row for _, row, _ in entries], dtype=np.int64)
+        self._kinds = np.array([field for _, _, field in entries], dtype=np.int64)
+        self._lengths = np.array([len(key) for key in self._keys], dtype=np.int64)
+
+        # 子串: 单字/二元组 -> 有序行号
+        postings: dict[str, set[int]] = {}
+        for keys in fields:
+            for row, key in enumerate(keys):
+                for gram in _grams(key):
+                    postings.setdefault(gram, set()).add(row)
+        self._postings = {
+            gram: np.array(sorted(rows), dtype=np.int64) for gram, rows in postings.items()
+        }
+        self._name_lengths = np.array([len(name) for name in self.names], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _prefix(self, query: str) -> np.ndarray:
+        """前缀匹配的行号 (每行取最优的匹配，按相关度排序)"""
+        lo = bisect_left(self._keys, query)
+        hi = bisect_left(self._keys, query + "\uffff", lo)
+        if lo == hi:
+            return np.array([], dtype=np.int64)
+
+        rows = self._rows[lo:hi]
+        lengths = self._lengths[lo:hi]
+        tiers = np.where(lengths == len(query), 0, 1 + self._kinds[lo:hi])
+        scores = tiers * 10_000 + lengths
+        rows = rows[np.lexsort((rows, scores))]
+        _, first = np.unique(rows, return_index=True)
+        first.sort()
+        return rows[first]
+
+    def _substring(self, query: str, exclude: np.ndarray) -> np.ndarray:
+        """子串匹配的行号 (不含 exclude)，按名称长度、代码排序"""
+        grams = [query] if len(query) <= 2 else [query[i:i + 2] for i in range(len(query) - 1)]
+        lists = [self._postings.get(gram) for gram in grams]
+        if any(rows is None for rows in lists):
+            return np.array([], dtype=np.int64)
+
+        lists.sort(key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+            if not len(rows):
+                return rows
+        rows = np.setdiff1d(rows, exclude, assume_unique=True)
+
+        if len(query) > 2:
+            # 二元组都出现不代表连续出现，逐条校验
+            rows = np.array(
+                [row for row in rows.tolist() if any(query in keys[row] for keys in self._fields)],
+                dtype=np.int64,
+            )
+        return rows[np.lexsort((rows, self._name_lengths[rows]))]
+
+    def search(self, keyword: str, limit: int = 20) -> list[int]:
+        """搜索
+
+        Args:
+            keyword: 代码、名称或拼音首字母 (可为其中一段)
+            limit: 返回结果数量限制
+
+        Returns:
+            按相关度排序的行号 (对应 self.codes / self.names)
+        """
+        query = normalize(keyword)
+        if not query or limit <= 0:
+            return []
+
+        rows = self._prefix(query)[:limit]
+        if len(rows) < limit:
+            rows = np.concatenate([rows, self._substring(query, rows)[: limit - len(rows)]])
+        return rows.tolist()
+
+
+class SymbolSearchService:
+    """股票搜索服务
+
+    持有当前的搜索索引；行情快照版本变化时在后台检查股票列表，
+    列表变化才重建索引。价格等行情字段从查询时的快照读取。
+    """
+
+    def __init__(self, snapshot_service: Optional[MarketSnapshotService] = None):
+        """初始化服务
+
+        Args:
+            snapshot_service: 全市场行情快照服务，默认使用全局单例
+        """
+        self.snapshot_service = snapshot_service or get_snapshot_service()
+        self.index: Optional[SymbolIndex] = None
+        # 已检查过的快照版本
+        self._checked_version = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"builds": 0, "last_build_ms": None}
+        self.snapshot_service.subscribe(self._on_snapshot)
+
+    def _on_snapshot(self, snapshot: MarketSnapshot):
+        """快照刷新后在后台检查股票列表"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._build(snapshot))
+
+    async def _build(self, snapshot: MarketSnapshot):
+        """检查股票列表，变化时重建索引 (在线程池中执行)"""
+        async with self._lock:
+            if snapshot.version <= self._checked_version:
+                return
+
+            codes, names = snapshot.codes.tolist(), snapshot.names.tolist()
+            digest = await asyncio.to_thread(listing_digest, codes, names)
+            if self.index is None or digest != self.index.digest:
+                started = time.perf_counter()
+                self.index = await asyncio.to_thread(SymbolIndex, codes, names)
+                self.stats["builds"] += 1
+                self.stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                logger.info(f"股票搜索索引已重建: {len(self.index)} 只股票")
+            self._checked_version = snapshot.version
+
+    async def _ensure_index(self) -> Optional[MarketSnapshot]:
+        """确保索引可用，快照更新后在后台检查是否需要重建"""
+        snapshot = self.snapshot_service.snapshot
+        if self.index is None:
+            # 首次使用时同步构建
+            snapshot = snapshot or await self.snapshot_service.get_snapshot()
+            if snapshot is None:
+                return None
+            await self._build(snapshot)
+        elif snapshot is not None and snapshot.version > self._checked_version:
+            # 刷新时后台任务仍在运行而错过的版本
+            self._on_snapshot(snapshot)
+        return snapshot
+
+    async def search(self, keyword: str, limit: int = 20) -> list[dict]:
+        """搜索股票
+
+        Args:
+            keyword: 代码、名称或拼音首字母
+            limit: 返回结果数量限制
+
+        Returns:
+            股票列表 (code, name, price, change_pct)
+        """
+        snapshot = await self._ensure_index()
+        if self.index is None:
+            return []
+
+        price = snapshot.columns["price"] if snapshot is not None else None
+        change_pct = snapshot.columns["change_pct"] if snapshot is not None else None
+        results = []
+        for row in self.index.search(keyword, limit):
+            code = self.index.codes[row]
+            i = snapshot.index.get(code) if snapshot is not None else None
+            results.append(
+                {
+                    "code": code,
+                    "name": self.index.names[row],
+                    "price": finite_or_none(price[i]) if i is not None else None,
+                    "change_pct": finite_or_none(change_pct[i]) if i is not None else None,
+                }
+            )
+        return results
+
+    def info(self) -> dict:
+        """索引元信息"""
+        return {
+            "count": len(self.index) if self.index is not None else 0,
+            "snapshot_version": self._checked_version,
+            "pinyin": "pypinyin" if lazy_pinyin is not None else "gb2312",
+            **self.stats,
+        }
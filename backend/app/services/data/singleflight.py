@@ -0,0 +1,65 @@
+"""上游请求合并 (single-flight)"""
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """并发请求合并
+
+    相同 key 的并发调用共享同一个进行中的任务，只有第一个调用真正执行；
+    任务完成后立即移除，后续调用会重新执行 (结果缓存由上层负责)。
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.calls: Counter[str] = Counter()
+        self.deduplicated: Counter[str] = Counter()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]], name: str = "") -> T:
+        """执行或加入进行中的调用
+
+        Args:
+            key: 调用标识 (函数名 + 参数)
+            func: 返回协程的无参函数
+            name: 统计分组名称
+
+        Returns:
+            调用结果
+        """
+        self.calls[name] += 1
+        task = self._inflight.get(key)
+
+        if task is not None:
+            self.deduplicated[name] += 1
+        else:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        # shield: 单个调用方取消不影响其他等待者
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        """任务结束后移除，并消费异常避免未读取告警"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"合并请求失败 {key}: {task.exception()}")
+
+    def stats(self) -> dict[str, Any]:
+        """合并统计"""
+        return {
+            "inflight": len(self._inflight),
+            "calls": sum(self.calls.values()),
+            "deduplicated": sum(self.deduplicated.values()),
+            "by_name": {
+                name: {"calls": count, "deduplicated": self.deduplicated[name]}
+                for name, count in self.calls.items()
+            },
+        }
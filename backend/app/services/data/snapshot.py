@@ -0,0 +1,312 @@
+"""全市场行情快照服务"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+from ...core.config import settings
+from .scheduler import FetchScheduler, get_fetch_scheduler
+from .trading_calendar import TradingCalendar, get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+# 快照数值字段 -> 东方财富实时行情列名
+SNAPSHOT_FIELDS: dict[str, str] = {
+    "price": "最新价",
+    "change": "涨跌额",
+    "change_pct": "涨跌幅",
+    "volume": "成交量",
+    "amount": "成交额",
+    "amplitude": "振幅",
+    "high": "最高",
+    "low": "最低",
+    "open_price": "今开",
+    "close_prev": "昨收",
+    "volume_ratio": "量比",
+    "turnover": "换手率",
+    "pe": "市盈率-动态",
+    "pb": "市净率",
+    "total_mv": "总市值",
+    "circ_mv": "流通市值",
+}
+
+# 行情接口返回的字段
+QUOTE_FIELDS = (
+    "price",
+    "change",
+    "change_pct",
+    "volume",
+    "amount",
+    "high",
+    "low",
+    "open_price",
+    "close_prev",
+)
+
+
+def finite_or_none(value) -> Optional[float]:
+    """数值转为 float，缺失 (NaN/inf) 时为 None，便于 JSON 输出"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+class MarketSnapshot:
+    """全市场行情快照 (列式存储，只读)
+
+    每个数值字段保存为一个 float64 数组，行号与 codes/names 对齐；
+    通过 code -> 行号 的映射实现 O(1) 单股查询。
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        names: np.ndarray,
+        columns: dict[str, np.ndarray],
+        version: int,
+        updated_at: datetime,
+    ):
+        self.codes = codes
+        self.names = names
+        self.columns = columns
+        self.version = version
+        self.updated_at = updated_at
+        self.index: dict[str, int] = {code: i for i, code in enumerate(codes.tolist())}
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: pd.DataFrame,
+        version: int,
+        updated_at: Optional[datetime] = None,
+    ) -> "MarketSnapshot":
+        """从 stock_zh_a_spot_em 的结果构建快照
+
+        Args:
+            df: 实时行情 DataFrame
+            version: 快照版本号
+            updated_at: 快照时间
+
+        Returns:
+            行情快照
+        """
+        codes = df["代码"].astype(str).to_numpy(dtype=str)
+        names = df["名称"].astype(str).to_numpy(dtype=str)
+
+        columns = {}
+        for field, column in SNAPSHOT_FIELDS.items():
+            if column in df.columns:
+                values = pd.to_numeric(df[column], errors="coerce")
+                columns[field] = values.to_numpy(dtype=np.float64)
+            else:
+                columns[field] = np.full(len(df), np.nan)
+
+        return cls(codes, names, columns, version, updated_at or datetime.now())
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def column(self, field: str) -> Optional[np.ndarray]:
+        """获取字段列 (code/name 返回字符串数组)"""
+        if field == "code":
+            return self.codes
+        if field == "name":
+            return self.names
+        return self.columns.get(field)
+
+    def row(self, i: int) -> dict:
+        """获取第 i 行的全部字段 (缺失值为 None)"""
+        record = {"code": str(self.codes[i]), "name": str(self.names[i])}
+        for field, values in self.columns.items():
+            record[field] = finite_or_none(values[i])
+        return record
+
+    def get_quote(self, code: str) -> Optional[dict]:
+        """获取单只股票行情
+
+        Args:
+            code: 股票代码
+
+        Returns:
+            行情数据字典，不存在时返回 None
+        """
+        i = self.index.get(code)
+        if i is None:
+            return None
+
+        quote = {"code": str(self.codes[i]), "name": str(self.names[i])}
+        for field in QUOTE_FIELDS:
+            quote[field] = float(self.columns[field][i])
+        quote["timestamp"] = self.updated_at
+        quote["snapshot_version"] = self.version
+        return quote
+
+    def search(self, keyword: str, limit: int = 20) -> list[dict]:
+        """按代码或名称搜索 (代码为数字时匹配代码，否则匹配名称)"""
+        haystack = self.codes if keyword.isdigit() else self.names
+        rows = np.flatnonzero(np.char.find(haystack, keyword) >= 0)[:limit]
+
+        price = self.columns["price"]
+        change_pct = self.columns["change_pct"]
+        return [
+            {
+                "code": str(self.codes[i]),
+                "name": str(self.names[i]),
+                "price": finite_or_none(price[i]),
+                "change_pct": finite_or_none(change_pct[i]),
+            }
+            for i in rows
+        ]
+
+    def info(self) -> dict:
+        """快照元信息"""
+        return {
+            "version": self.version,
+            "updated_at": self.updated_at,
+            "age_seconds": (datetime.now() - self.updated_at).total_seconds(),
+            "count": len(self),
+        }
+
+
+class MarketSnapshotService:
+    """全市场行情快照服务
+
+    后台循环按固定间隔拉取一次全市场行情，所有行情、搜索和选股读取共享同一份快照。
+    休市期间取得收盘行情后暂停刷新，到下一次开盘时恢复。
+    """
+
+    def __init__(
+        self,
+        refresh_interval: Optional[int] = None,
+        scheduler: Optional[FetchScheduler] = None,
+        calendar: Optional[TradingCalendar] = None,
+    ):
+        """初始化服务
+
+        Args:
+            refresh_interval: 刷新间隔(秒)，默认读取配置
+            scheduler: 上游调用调度器，默认使用全局单例
+            calendar: 交易日历，默认使用全局单例
+        """
+        self.refresh_interval = refresh_interval or settings.SNAPSHOT_REFRESH_INTERVAL
+        self.scheduler = scheduler or get_fetch_scheduler()
+        self.calendar = calendar or get_trading_calendar()
+        self.snapshot: Optional[MarketSnapshot] = None
+        self._version = 0
+        self._refreshed_monotonic = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: list[Callable[[MarketSnapshot], None]] = []
+
+    def subscribe(self, listener: Callable[[MarketSnapshot], None]):
+        """注册快照刷新回调 (在事件循环中同步调用，耗时工作应自行转入后台)"""
+        self._listeners.append(listener)
+
+    def _fetch(self) -> pd.DataFrame:
+        """拉取全市场实时行情 (同步)"""
+        return ak.stock_zh_a_spot_em()
+
+    async def refresh(self) -> Optional[MarketSnapshot]:
+        """刷新快照
+
+        并发调用只会触发一次上游请求，其余调用等待并复用结果。
+        """
+        started = self._refreshed_monotonic
+        async with self._lock:
+            # 等锁期间已被其他调用刷新
+            if self._refreshed_monotonic != started and self.snapshot is not None:
+                return self.snapshot
+
+            try:
+                df = await self.scheduler.run("spot", self._fetch)
+            except Exception as e:
+                logger.error(f"刷新行情快照失败: {e}")
+                return self.snapshot
+
+            if df is None or df.empty:
+                logger.warning("行情快照为空，保留旧快照")
+                return self.snapshot
+
+            self._version += 1
+            self.snapshot = MarketSnapshot.from_dataframe(df, self._version)
+            self._refreshed_monotonic = time.monotonic()
+            logger.debug(f"行情快照已刷新: v{self._version}, {len(self.snapshot)} 只股票")
+            for listener in self._listeners:
+                try:
+                    listener(self.snapshot)
+                except Exception as e:
+                    logger.error(f"行情快照刷新回调失败: {e}")
+            return self.snapshot
+
+    async def get_snapshot(self, max_age: Optional[float] = None) -> Optional[MarketSnapshot]:
+        """获取快照，过期或尚未加载时先刷新
+
+        休市期间快照取得后行情不再变化，不视为过期。
+
+        Args:
+            max_age: 可接受的最大快照年龄(秒)，默认 2 倍刷新间隔
+
+        Returns:
+            行情快照，上游不可用且无旧快照时返回 None
+        """
+        if max_age is None:
+            max_age = self.refresh_interval * 2
+
+        if self.snapshot is None:
+            return await self.refresh()
+        age = time.monotonic() - self._refreshed_monotonic
+        if age > max_age and self.calendar.changed_since(self.snapshot.updated_at):
+            return await self.refresh()
+        return self.snapshot
+
+    async def _refresh_loop(self):
+        """后台刷新循环"""
+        while True:
+            await self.refresh()
+            delay = self.refresh_interval
+            if not self.calendar.is_active():
+                # 休市: 已取得收盘行情，到下一次开盘再刷新
+                delay = max(delay, (self.calendar.next_open() - self.calendar.now()).total_seconds())
+            await asyncio.sleep(delay)
+
+    def start(self):
+        """启动后台刷新"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+            logger.info(f"行情快照刷新已启动，间隔 {self.refresh_interval} 秒")
+
+    async def stop(self):
+        """停止后台刷新"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("行情快照刷新已停止")
+
+    def info(self) -> dict:
+        """当前快照元信息"""
+        if self.snapshot is None:
+            return {"version": 0, "updated_at": None, "age_seconds": None, "count": 0}
+        return self.snapshot.info()
+
+
+# 全局单例
+_snapshot_service: Optional[MarketSnapshotService] = None
+
+
+def get_snapshot_service() -> MarketSnapshotService:
+    """获取行情快照服务单例"""
+    global _snapshot_service
+    if _snapshot_service is None:
+        _snapshot_service = MarketSnapshotService()
+    return _snapshot_service
@@ -0,0 +1,204 @@
+"""A 股交易日历
+
+沪深交易所交易时段 (北京时间)：
+- 早盘 9:15-11:30 (含 9:15-9:25 开盘集合竞价)
+- 午盘 13:00-15:00 (含 14:57-15:00 收盘集合竞价)
+周末和法定节假日休市。节假日从本地文件加载 (每行一个日期，# 开头为注释)，
+默认使用随代码发布的 holidays.txt，每年交易所公布休市安排后更新。
+
+行情在休市期间 (午休、收盘后、周末、节假日) 不会变化，缓存可以一直有效到下一次开盘；
+收盘后保留一小段宽限期，等待上游的收盘数据落定。
+"""
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from ...core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 交易所所在时区 (无夏令时)
+MARKET_TZ = timezone(timedelta(hours=8), "Asia/Shanghai")
+
+# 每个交易日的交易时段
+SESSIONS = ((time(9, 15), time(11, 30)), (time(13, 0), time(15, 0)))
+
+# 查找相邻交易日的最大天数 (最长的连续休市如春节、国庆加周末不超过两周，留足余量)
+_MAX_GAP_DAYS = 31
+
+DEFAULT_HOLIDAYS_FILE = Path(__file__).with_name("holidays.txt")
+
+
+def load_holidays(path: Optional[str] = None) -> set[date]:
+    """读取节假日文件
+
+    Args:
+        path: 文件路径，每行一个日期 (YYYY-MM-DD 或 YYYYMMDD)，默认使用内置文件
+
+    Returns:
+        休市日期集合，文件不存在时为空 (只按周末休市)
+    """
+    path = Path(path) if path else DEFAULT_HOLIDAYS_FILE
+    if not path.exists():
+        logger.warning(f"交易日历文件不存在: {path}，只按周末判断休市")
+        return set()
+
+    holidays = set()
+    for line in path.read_text(encoding="utf-8").splitlines():
+        text = line.split("#", 1)[0].strip()
+        if not text:
+            continue
+        try:
+            holidays.add(datetime.strptime(text.replace("-", ""), "%Y%m%d").date())
+        except ValueError:
+            logger.warning(f"交易日历文件中的无效日期: {text}")
+    return holidays
+
+
+class TradingCalendar:
+    """交易日历与休市期间的缓存策略"""
+
+    def __init__(
+        self,
+        holidays: Optional[Iterable[date]] = None,
+        close_grace: Optional[int] = None,
+        clock: Optional[Callable[[], datetime]] = None,
+    ):
+        """初始化日历
+
+        Args:
+            holidays: 休市的工作日，默认读取配置的节假日文件
+            close_grace: 每个交易时段结束后仍视为行情可能变化的秒数，默认按配置
+            clock: 返回当前时间的函数 (测试用)，默认为系统时间
+        """
+        loaded = holidays is None
+        if loaded:
+            holidays = load_holidays(settings.TRADING_CALENDAR_FILE)
+        self.holidays = frozenset(holidays)
+        self.close_grace = timedelta(
+            seconds=settings.MARKET_CLOSE_GRACE if close_grace is None else close_grace
+        )
+        self.clock = clock or (lambda: datetime.now(MARKET_TZ))
+
+        missing = self.missing_years()
+        if loaded and missing:
+            # 缺少某年的节假日时该年所有休市日都会被当作交易日
+            logger.warning(
+                f"交易日历缺少 {', '.join(map(str, missing))} 年的节假日，"
+                f"请更新 {settings.TRADING_CALENDAR_FILE or DEFAULT_HOLIDAYS_FILE}"
+            )
+
+    def now(self) -> datetime:
+        """当前北京时间"""
+        return self._local(self.clock())
+
+    @staticmethod
+    def _local(moment: datetime) -> datetime:
+        # 不带时区的时间视为本机时间
+        return moment.astimezone(MARKET_TZ)
+
+    def missing_years(self, today: Optional[date] = None) -> list[int]:
+        """今年和明年中没有任何节假日的年份 (交易所每年都有休市日，为空说明日历未更新)"""
+        year = (today or self.now().date()).year
+        years = {day.year for day in self.holidays}
+        return [y for y in (year, year + 1) if y not in years]
+
+    def info(self) -> dict:
+        """节假日覆盖范围"""
+        return {
+            "first_holiday": min(self.holidays).isoformat() if self.holidays else None,
+            "last_holiday": max(self.holidays).isoformat() if self.holidays else None,
+            "years": sorted({day.year for day in self.holidays}),
+            "missing_years": self.missing_years(),
+        }
+
+    def is_trading_day(self, day: date) -> bool:
+        """是否为交易日"""
+        return day.weekday() < 5 and day not in self.holidays
+
+    def _sessions(self, day: date) -> list[tuple[datetime, datetime]]:
+        if not self.is_trading_day(day):
+            return []
+        return [
+            (datetime.combine(day, start, MARKET_TZ), datetime.combine(day, end, MARKET_TZ))
+            for start, end in SESSIONS
+        ]
+
+    def is_open(self, moment: Optional[datetime] = None) -> bool:
+        """是否处于交易时段"""
+        moment = self._local(moment) if moment else self.now()
+        return any(start <= moment < end for start, end in self._sessions(moment.date()))
+
+    def is_active(self, moment: Optional[datetime] = None) -> bool:
+        """行情是否可能变化 (交易时段或收盘后的宽限期内)"""
+        moment = self._local(moment) if moment else self.now()
+        return any(
+            start <= moment < end + self.close_grace for start, end in self._sessions(moment.date())
+        )
+
+    def next_open(self, moment: Optional[datetime] = None) -> datetime:
+        """moment 之后 (含) 下一个交易时段的开始时间 (处于交易时段时返回 moment)"""
+        moment = self._local(moment) if moment else self.now()
+        day = moment.date()
+        for offset in range(_MAX_GAP_DAYS):
+            for start, end in self._sessions(day + timedelta(days=offset)):
+                if moment < end:
+                    return max(start, moment)
+        raise ValueError(f"{day} 之后一个月内没有交易日，请检查交易日历文件")
+
+    def last_close(self, moment: Optional[datetime] = None) -> Optional[datetime]:
+        """moment 之前 (含) 最近一个已结束交易时段的结束时间"""
+        moment = self._local(moment) if moment else self.now()
+        for offset in range(_MAX_GAP_DAYS):
+            for _, end in reversed(self._sessions(moment.date() - timedelta(days=offset))):
+                if end <= moment:
+                    return end
+        return None
+
+    def latest_trading_day(self, moment: Optional[datetime] = None) -> date:
+        """已经开盘的最近一个交易日 (今天开盘前为上一个交易日)"""
+        moment = self._local(moment) if moment else self.now()
+        for offset in range(_MAX_GAP_DAYS):
+            day = moment.date() - timedelta(days=offset)
+            sessions = self._sessions(day)
+            if sessions and sessions[0][0] <= moment:
+                return day
+        raise ValueError(f"{moment.date()} 之前一个月内没有交易日，请检查交易日历文件")
+
+    def changed_since(self, moment: Optional[datetime], now: Optional[datetime] = None) -> bool:
+        """自 moment 以来行情是否可能变化
+
+        Args:
+            moment: 上次获取数据的时间，None 表示未知 (视为已变化)
+            now: 当前时间，默认为系统时间
+        """
+        if moment is None:
+            return True
+        now = self._local(now) if now else self.now()
+        if self.is_active(now):
+            return True
+        last_close = self.last_close(now)
+        return last_close is not None and self._local(moment) < last_close + self.close_grace
+
+    def ttl(self, ttl: int, now: Optional[datetime] = None) -> int:
+        """行情类缓存的过期时间
+
+        交易期间按 ttl；休市期间缓存到下一次开盘 (不少于 ttl)。
+        """
+        now = self._local(now) if now else self.now()
+        if self.is_active(now):
+            return ttl
+        return max(ttl, int((self.next_open(now) - now).total_seconds()))
+
+
+# 全局单例
+_trading_calendar: Optional[TradingCalendar] = None
+
+
+def get_trading_calendar() -> TradingCalendar:
+    """获取交易日历单例"""
+    global _trading_calendar
+    if _trading_calendar is None:
+        _trading_calendar = TradingCalendar()
+    return _trading_calendar
@@ -1,4 +1,24 @@
 """技术指标模块"""
-from .technical import TechnicalIndicators, technical_calculator
+from .technical import TechnicalIndicators, technical_calculator, to_list
+from .batch import IndicatorSpec, compute_indicators, parse_specs
+from .cache import IndicatorCache, get_indicator_cache
+from .panel import PricePanel, compute_panel, latest_values
+from .streaming import IndicatorStream, StreamingIndicator, create_streaming, restore
 
-__all__ = ["TechnicalIndicators", "technical_calculator"]
+__all__ = [
+    "TechnicalIndicators",
+    "technical_calculator",
+    "to_list",
+    "IndicatorSpec",
+    "compute_indicators",
+    "parse_specs",
+    "IndicatorCache",
+    "get_indicator_cache",
+    "PricePanel",
+    "compute_panel",
+    "latest_values",
+    "IndicatorStream",
+    "StreamingIndicator",
+    "create_streaming",
+    "restore",
+]
@@ -0,0 +1,280 @@
+"""批量技术指标计算
+
+多个指标按依赖图一次计算，公共中间量 (同周期的均线、EMA、滚动最高/最低、
+典型价格等) 只计算一次。例如 KDJ(9) 与 WR(9) 共享滚动最高/最低，
+MACD 与 EMA(12)/EMA(26) 共享 EMA，SMA(20) 与 BOLL(20) 共享中轨。
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable, Union
+
+import numpy as np
+
+from . import kernels
+
+NodeKey = Hashable
+
+
+@dataclass(frozen=True)
+class IndicatorDefinition:
+    """指标定义: 参数名、默认参数和展示名称"""
+
+    params: tuple[str, ...]
+    defaults: tuple[Union[int, float], ...]
+    label: str
+    show_params: bool = True
+
+
+INDICATORS: dict[str, IndicatorDefinition] = {
+    "sma": IndicatorDefinition(("period",), (20,), "SMA"),
+    "ema": IndicatorDefinition(("period",), (20,), "EMA"),
+    "macd": IndicatorDefinition(
+        ("fast_period", "slow_period", "signal_period"), (12, 26, 9), "MACD", False
+    ),
+    "rsi": IndicatorDefinition(("period",), (14,), "RSI"),
+    "kdj": IndicatorDefinition(("n", "m1", "m2"), (9, 3, 3), "KDJ", False),
+    "boll": IndicatorDefinition(("period", "std_dev"), (20, 2.0), "BOLL"),
+    "cci": IndicatorDefinition(("period",), (14,), "CCI"),
+    "wr": IndicatorDefinition(("period",), (14,), "WR"),
+}
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """指标规格，如 sma:20、macd:12,26,9、boll:20,2 (省略的参数使用默认值)"""
+
+    name: str
+    params: tuple[Union[int, float], ...]
+
+    @classmethod
+    def parse(cls, text: str) -> "IndicatorSpec":
+        """解析指标规格字符串
+
+        Raises:
+            ValueError: 指标不存在或参数无效
+        """
+        name, _, args = text.strip().lower().partition(":")
+        definition = INDICATORS.get(name)
+        if definition is None:
+            raise ValueError(f"不支持的指标: {name}")
+
+        values = [arg.strip() for arg in args.split(",")] if args else []
+        if len(values) > len(definition.defaults):
+            raise ValueError(f"指标 {name} 最多 {len(definition.defaults)} 个参数: {text}")
+
+        params = list(definition.defaults)
+        for i, value in enumerate(values):
+            if not value:
+                continue
+            try:
+                params[i] = type(definition.defaults[i])(float(value))
+            except (ValueError, OverflowError):
+                raise ValueError(f"指标参数无效: {text}") from None
+            if isinstance(params[i], int) and (params[i] != float(value) or params[i] < 1):
+                raise ValueError(f"指标周期必须为正整数: {text}")
+
+        return cls(name, tuple(params))
+
+    @property
+    def key(self) -> str:
+        """规范化的规格字符串 (参数补全)"""
+        return f"{self.name}:{','.join(format(p, 'g') for p in self.params)}"
+
+    @property
+    def label(self) -> str:
+        """展示名称，如 SMA(20)、MACD"""
+        definition = INDICATORS[self.name]
+        if not definition.show_params:
+            return definition.label
+        return f"{definition.label}({','.join(format(p, 'g') for p in self.params[:1])})"
+
+    def param_dict(self) -> dict[str, Union[int, float]]:
+        return dict(zip(INDICATORS[self.name].params, self.params))
+
+
+def parse_specs(specs: Iterable[Union[str, IndicatorSpec]]) -> list[IndicatorSpec]:
+    """解析并去重指标规格 (保持顺序)"""
+    parsed: dict[str, IndicatorSpec] = {}
+    for spec in specs:
+        if not isinstance(spec, IndicatorSpec):
+            spec = IndicatorSpec.parse(spec)
+        parsed.setdefault(spec.key, spec)
+    return list(parsed.values())
+
+
+class IndicatorGraph:
+    """指标依赖图
+
+    节点 key 描述计算本身 (操作 + 参数 + 依赖节点 key)，相同的中间量只会登记一次；
+    节点按登记顺序求值，依赖总是先于使用者登记，即为拓扑序。
+    """
+
+    def __init__(self):
+        self.nodes: dict[NodeKey, tuple[Callable[..., np.ndarray], tuple[NodeKey, ...]]] = {}
+        self.outputs: dict[str, dict[str, NodeKey]] = {}
+
+    def node(self, key: NodeKey, func: Callable[..., np.ndarray], *deps: NodeKey) -> NodeKey:
+        """登记节点 (已存在时直接返回)"""
+        if key not in self.nodes:
+            self.nodes[key] = (func, deps)
+        return key
+
+    def input(self, column: str) -> NodeKey:
+        return self.node(("input", column), None)
+
+    # ---- 公共中间量 ----
+
+    def mean(self, source: NodeKey, window: int) -> NodeKey:
+        return self.node(
+            ("mean", source, window), lambda x: kernels.rolling_mean(x, window), source
+        )
+
+    def ewm(self, source: NodeKey, alpha: float) -> NodeKey:
+        return self.node(("ewm", source, alpha), lambda x: kernels.ewm(x, alpha), source)
+
+    def ema(self, source: NodeKey, period: int) -> NodeKey:
+        return self.ewm(source, 2.0 / (period + 1))
+
+    def highest(self, window: int) -> NodeKey:
+        high = self.input("high")
+        return self.node(("max", high, window), lambda x: kernels.rolling_max(x, window), high)
+
+    def lowest(self, window: int) -> NodeKey:
+        low = self.input("low")
+        return self.node(("min", low, window), lambda x: kernels.rolling_min(x, window), low)
+
+    def typical_price(self) -> NodeKey:
+        return self.node(
+            ("typical_price",),
+            kernels.typical_price,
+            self.input("high"),
+            self.input("low"),
+            self.input("close"),
+        )
+
+    # ---- 指标 ----
+
+    def add(self, spec: IndicatorSpec) -> dict[str, NodeKey]:
+        """登记指标，返回 输出名 -> 节点"""
+        if spec.key not in self.outputs:
+            self.outputs[spec.key] = getattr(self, f"_add_{spec.name}")(*spec.params)
+        return self.outputs[spec.key]
+
+    def _add_sma(self, period: int) -> dict[str, NodeKey]:
+        return {"values": self.mean(self.input("close"), period)}
+
+    def _add_ema(self, period: int) -> dict[str, NodeKey]:
+        return {"values": self.ema(self.input("close"), period)}
+
+    def _add_macd(self, fast_period: int, slow_period: int, signal_period: int) -> dict[str, NodeKey]:
+        close = self.input("close")
+        fast = self.ema(close, fast_period)
+        slow = self.ema(close, slow_period)
+        line = self.node(("sub", fast, slow), np.subtract, fast, slow)
+        signal = self.ema(line, signal_period)
+        histogram = self.node(("sub", line, signal), np.subtract, line, signal)
+        return {"macd": line, "signal": signal, "histogram": histogram}
+
+    def _add_rsi(self, period: int) -> dict[str, NodeKey]:
+        close = self.input("close")
+        gain = self.node(("gains", close), kernels.gains, close)
+        loss = self.node(("losses", close), kernels.losses, close)
+        avg_gain = self.mean(gain, period)
+        avg_loss = self.mean(loss, period)
+        values = self.node(
+            ("rsi", avg_gain, avg_loss), kernels.relative_strength, avg_gain, avg_loss
+        )
+        return {"values": values}
+
+    def _add_kdj(self, n: int, m1: int, m2: int) -> dict[str, NodeKey]:
+        close = self.input("close")
+        lowest = self.lowest(n)
+        highest = self.highest(n)
+        rsv = self.node(("rsv", close, lowest, highest), kernels.stochastic, close, lowest, highest)
+        k = self.ewm(rsv, 1.0 / m1)
+        d = self.ewm(k, 1.0 / m2)
+        j = self.node(("kdj_j", k, d), lambda k, d: 3 * k - 2 * d, k, d)
+        return {"k": k, "d": d, "j": j}
+
+    def _add_boll(self, period: int, std_dev: float) -> dict[str, NodeKey]:
+        close = self.input("close")
+        middle = self.mean(close, period)
+        std = self.node(
+            ("std", close, period),
+            lambda x, mean: kernels.rolling_std(x, period, mean=mean),
+            close,
+            middle,
+        )
+        upper = self.node(
+            ("band", middle, std, std_dev), lambda m, s: m + std_dev * s, middle, std
+        )
+        lower = self.node(
+            ("band", middle, std, -std_dev), lambda m, s: m - std_dev * s, middle, std
+        )
+        return {"upper": upper, "middle": middle, "lower": lower}
+
+    def _add_cci(self, period: int) -> dict[str, NodeKey]:
+        tp = self.typical_price()
+        ma_tp = self.mean(tp, period)
+        md = self.node(
+            ("mad", tp, period),
+            lambda x, center: kernels.rolling_mad(x, period, center),
+            tp,
+            ma_tp,
+        )
+        values = self.node(("cci", tp, ma_tp, md), kernels.commodity_channel, tp, ma_tp, md)
+        return {"values": values}
+
+    def _add_wr(self, period: int) -> dict[str, NodeKey]:
+        close = self.input("close")
+        lowest = self.lowest(period)
+        highest = self.highest(period)
+        values = self.node(("wr", close, lowest, highest), kernels.williams, close, lowest, highest)
+        return {"values": values}
+
+    def evaluate(self, bars: dict[str, Any]) -> dict[str, dict[str, np.ndarray]]:
+        """按拓扑序求值全部节点
+
+        Args:
+            bars: 列名 -> 数组或列表 (至少包含所用指标需要的 high/low/close)
+
+        Returns:
+            规格 key -> (输出名 -> 数组)
+        """
+        values: dict[NodeKey, np.ndarray] = {}
+        for key, (func, deps) in self.nodes.items():
+            if func is None:
+                values[key] = kernels.as_array(bars[key[1]])
+            else:
+                values[key] = func(*(values[dep] for dep in deps))
+
+        return {
+            spec_key: {name: values[node] for name, node in outputs.items()}
+            for spec_key, outputs in self.outputs.items()
+        }
+
+
+def build_graph(specs: Iterable[Union[str, IndicatorSpec]]) -> IndicatorGraph:
+    """为一组指标规格构建依赖图"""
+    graph = IndicatorGraph()
+    for spec in parse_specs(specs):
+        graph.add(spec)
+    return graph
+
+
+def compute_indicators(
+    bars: dict[str, Any],
+    specs: Iterable[Union[str, IndicatorSpec]],
+) -> dict[str, dict[str, np.ndarray]]:
+    """一次计算多个指标
+
+    Args:
+        bars: 列式 K 线 (列名 -> 数组)
+        specs: 指标规格，如 ["sma:5", "sma:20", "macd", "kdj:9,3,3"]
+
+    Returns:
+        规范化规格 key -> (输出名 -> 数组)，单值指标的输出名为 values
+
+    Raises:
+        ValueError: 指标规格无效
+    """
+    return build_graph(specs).evaluate(bars)
@@ -0,0 +1,267 @@
+"""技术指标结果缓存
+
+缓存 key 由内容决定: (股票代码, 周期, 复权, 最后一根 K 线日期, 指标规格哈希)，
+同一只股票同一天的重复请求 (图表加载、智能体分析) 直接命中。
+
+缓存条目保存完整历史上的指标序列，以及截至倒数第二根 K 线的增量指标状态。
+出现新 K 线 (或盘中最后一根 K 线变化) 时，从上一个条目的状态只计算新增部分，
+不再全量重算。
+前复权的新除权除息会改变全部历史价格，条目同时记录第一根 K 线，变化时全量重算。
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+
+from ...core.config import settings
+from ..data.cache import CacheService, get_cache_service
+from ..data.kline_store import Bars
+from ..data.singleflight import SingleFlight
+from .batch import IndicatorSpec, compute_indicators, parse_specs
+from .streaming import IndicatorStream
+from .technical import to_list
+
+logger = logging.getLogger(__name__)
+
+# 指标算法变化时递增，使旧缓存失效
+CACHE_VERSION = 2
+
+# 增量状态需要的列
+STREAM_COLUMNS = ("high", "low", "close")
+
+# 缓存条目: JSON 兼容的字典 (可经任意缓存编码器往返)
+Entry = dict[str, Any]
+
+
+def spec_hash(specs: Iterable[IndicatorSpec]) -> str:
+    """指标规格集合的哈希 (与顺序无关)"""
+    text = "|".join(sorted(spec.key for spec in specs))
+    return hashlib.sha1(f"v{CACHE_VERSION}|{text}".encode()).hexdigest()[:16]
+
+
+def _last_bar(bars: Bars, index: int = -1) -> list[Optional[float]]:
+    return to_list(np.array([bars[column][index] for column in STREAM_COLUMNS], dtype=np.float64))
+
+
+def _day(bars: Bars, index: int) -> str:
+    return str(bars["date"][index])
+
+
+def _rows(bars: Bars, start: int, stop: int):
+    columns = {column: bars[column][start:stop].tolist() for column in STREAM_COLUMNS}
+    for row in zip(*columns.values()):
+        yield dict(zip(columns, row))
+
+
+def build_entry(bars: Bars, specs: list[IndicatorSpec]) -> Entry:
+    """全量计算指标并生成缓存条目
+
+    Args:
+        bars: 列式 K 线 (至少一根)
+        specs: 已解析的指标规格
+
+    Returns:
+        缓存条目
+    """
+    count = len(bars["date"])
+    results = compute_indicators(bars, specs)
+
+    stream = IndicatorStream(specs)
+    for bar in _rows(bars, 0, count - 1):
+        stream.update(bar)
+
+    return {
+        "first_date": _day(bars, 0),
+        "first_bar": _last_bar(bars, 0),
+        "count": count,
+        "state_date": _day(bars, -2) if count > 1 else None,
+        "state": stream.to_state(),
+        "last_bar": _last_bar(bars),
+        "indicators": {
+            key: {name: to_list(values) for name, values in outputs.items()}
+            for key, outputs in results.items()
+        },
+    }
+
+
+def entry_matches(entry: Entry, bars: Bars) -> bool:
+    """条目是否对应这组 K 线 (起止日期、数量和首尾 K 线都相同)"""
+    count = len(bars["date"])
+    return (
+        entry["count"] == count
+        and entry["first_date"] == _day(bars, 0)
+        and entry.get("first_bar") == _last_bar(bars, 0)
+        and entry["last_bar"] == _last_bar(bars)
+    )
+
+
+def extend_entry(entry: Entry, bars: Bars) -> Optional[Entry]:
+    """由旧条目增量计算新 K 线上的指标
+
+    旧条目的历史 (截至其倒数第二根 K 线) 必须是新 K 线的前缀；
+    旧条目的最后一根 K 线可能是盘中数据，连同新增的 K 线一起重新计算。
+
+    Returns:
+        新条目，历史不一致 (如向前补齐了更早的 K 线、前复权价格变化) 时返回 None
+    """
+    old_count = entry["count"]
+    count = len(bars["date"])
+    if count < old_count or entry["first_date"] != _day(bars, 0):
+        return None
+    if entry.get("first_bar") != _last_bar(bars, 0):
+        return None
+    if old_count > 1 and entry["state_date"] != _day(bars, old_count - 2):
+        return None
+
+    stream = IndicatorStream.from_state(entry["state"])
+    tail: dict[str, dict[str, list]] = {
+        key: {name: [] for name in outputs} for key, outputs in entry["indicators"].items()
+    }
+
+    def append(values: dict[str, dict[str, float]]):
+        for key, outputs in values.items():
+            for name, value in outputs.items():
+                tail[key][name].append(value)
+
+    for bar in _rows(bars, old_count - 1, count - 1):
+        append(stream.update(bar))
+    state = stream.to_state()
+    append(stream.update(next(_rows(bars, count - 1, count))))
+
+    keep = old_count - 1
+    return {
+        "first_date": entry["first_date"],
+        "first_bar": entry["first_bar"],
+        "count": count,
+        "state_date": _day(bars, -2) if count > 1 else None,
+        "state": state,
+        "last_bar": _last_bar(bars),
+        "indicators": {
+            key: {
+                name: values[:keep] + to_list(np.array(tail[key][name], dtype=np.float64))
+                for name, values in outputs.items()
+            }
+            for key, outputs in entry["indicators"].items()
+        },
+    }
+
+
+class IndicatorCache:
+    """技术指标结果缓存
+
+    条目存放在 CacheService 中 (进程内 LRU + Redis)，另有一个指针记录
+    每组 (股票, 周期, 复权, 规格) 最新条目的日期，用于增量扩展。
+    返回的序列是共享对象，调用方不应修改。
+    """
+
+    def __init__(self, cache: Optional[CacheService] = None, ttl: Optional[int] = None):
+        """初始化缓存
+
+        Args:
+            cache: 缓存服务，默认使用全局单例
+            ttl: 条目过期时间(秒)，默认按配置
+        """
+        self.cache = cache or get_cache_service()
+        self.ttl = ttl or settings.INDICATOR_CACHE_TTL
+        self.single_flight = SingleFlight()
+        self.stats = {"hits": 0, "extended": 0, "computed": 0}
+
+    @staticmethod
+    def _key(code: str, period: str, adjust: str, last_date: str, digest: str) -> str:
+        return f"indicator:{code}:{period}:{adjust}:{last_date}:{digest}"
+
+    @staticmethod
+    def _latest_key(code: str, period: str, adjust: str, digest: str) -> str:
+        return f"indicator:{code}:{period}:{adjust}:latest:{digest}"
+
+    async def get_indicators(
+        self,
+        code: str,
+        period: str,
+        adjust: str,
+        bars: Bars,
+        specs: Iterable[Union[str, IndicatorSpec]],
+    ) -> dict[str, dict[str, list[Optional[float]]]]:
+        """获取 K 线上的指标序列 (命中缓存、增量扩展或全量计算)
+
+        Args:
+            code: 股票代码
+            period: 周期
+            adjust: 复权类型
+            bars: 列式 K 线 (通常为完整历史，见 AkshareService.get_kline_history)
+            specs: 指标规格
+
+        Returns:
+            规范化规格 key -> (输出名 -> 与 bars 等长的列表，NaN 为 None)
+
+        Raises:
+            ValueError: 指标规格无效
+        """
+        specs = parse_specs(specs)
+        if len(bars["date"]) == 0:
+            return {spec.key: {} for spec in specs}
+
+        digest = spec_hash(specs)
+        key = self._key(code, period, adjust, _day(bars, -1), digest)
+        entry = await self.single_flight.do(
+            key, lambda: self._load_or_compute(key, code, period, adjust, digest, bars, specs)
+        )
+        return {spec.key: entry["indicators"][spec.key] for spec in specs}
+
+    async def _load_or_compute(
+        self,
+        key: str,
+        code: str,
+        period: str,
+        adjust: str,
+        digest: str,
+        bars: Bars,
+        specs: list[IndicatorSpec],
+    ) -> Entry:
+        entry = await self.cache.get(key)
+        if entry and entry_matches(entry, bars):
+            self.stats["hits"] += 1
+            return entry
+
+        latest_key = self._latest_key(code, period, adjust, digest)
+        latest_date = await self.cache.get(latest_key)
+        previous = entry
+        if previous is None and latest_date:
+            previous = await self.cache.get(self._key(code, period, adjust, latest_date, digest))
+
+        # 全量计算 (批量指标加上逐根 K 线重放增量状态) 和增量扩展 (复制完整历史序列)
+        # 都与 K 线数量成正比，在线程中执行，不阻塞事件循环
+        entry = None
+        if previous:
+            try:
+                entry = await asyncio.to_thread(extend_entry, previous, bars)
+            except Exception as e:
+                logger.warning(f"指标缓存增量计算失败 {key}: {e}")
+        if entry is not None:
+            self.stats["extended"] += 1
+        else:
+            entry = await asyncio.to_thread(build_entry, bars, specs)
+            self.stats["computed"] += 1
+
+        await self.cache.set(key, entry, ttl=self.ttl)
+        if latest_date is None or latest_date <= _day(bars, -1):
+            await self.cache.set(latest_key, _day(bars, -1), ttl=self.ttl)
+        return entry
+
+    def info(self) -> dict:
+        """命中统计"""
+        return dict(self.stats)
+
+
+# 全局单例
+_indicator_cache: Optional[IndicatorCache] = None
+
+
+def get_indicator_cache() -> IndicatorCache:
+    """获取指标缓存单例"""
+    global _indicator_cache
+    if _indicator_cache is None:
+        _indicator_cache = IndicatorCache()
+    return _indicator_cache
@@ -0,0 +1,435 @@
+"""技术指标 NumPy 计算内核
+
+所有函数输入 float64 数组、输出同形状的 float64 数组，数据不足的位置为 NaN。
+计算沿最后一个轴 (时间轴) 进行：一维数组为单只股票的序列，
+二维数组 (股票 x 日期) 的每一行独立计算，结果与逐行调用一致。
+语义与原 pandas 实现保持一致:
+
+- 滚动均值/标准差: min_periods = window，窗口内有 NaN 时结果为 NaN
+- 滚动最高/最低: min_periods = 1，忽略 NaN
+- 指数平滑: 等价于 ewm(adjust=False)
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+# 分块指数平滑时，块内缩放系数的上限 (控制累加误差)
+_EWM_SCALE_LIMIT = 1e5
+
+
+def as_array(values) -> np.ndarray:
+    """转为 float64 数组 (None 转为 NaN)"""
+    return np.asarray(values, dtype=np.float64)
+
+
+def _block_scan(x: np.ndarray, window: int, func: np.ufunc, identity: float) -> np.ndarray:
+    """按窗口归约 (van Herk/Gil-Werman 分块算法，O(n))
+
+    数组按窗口长度分块，块内分别做前缀和后缀累积；跨两个块的窗口结果为
+    func(后缀[i], 前缀[i + window - 1])，与块对齐的窗口即为该块的后缀[i]。
+    前部不足一个窗口的位置以单位元补齐。
+    """
+    lead, n = x.shape[:-1], x.shape[-1]
+    size = n + window - 1
+    blocks = -(-size // window)
+    padded = np.full(lead + (blocks * window,), identity)
+    padded[..., window - 1:size] = x
+
+    grid = padded.reshape(lead + (blocks, window))
+    prefix = func.accumulate(grid, axis=-1).reshape(padded.shape)
+    suffix = func.accumulate(grid[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+
+    out = func(suffix[..., :n], prefix[..., window - 1:size])
+    aligned = slice(0, n, window)
+    out[..., aligned] = suffix[..., aligned]
+    return out
+
+
+def rolling_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """滚动求和"""
+    if window <= 0 or x.shape[-1] < window:
+        return np.full(x.shape, np.nan)
+    out = _block_scan(x, window, np.add, 0.0)
+    out[..., :window - 1] = np.nan
+    return out
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """滚动均值"""
+    return rolling_sum(x, window) / window
+
+
+def _window_deviation_sum(
+    x: np.ndarray,
+    window: int,
+    center: np.ndarray,
+    power: int,
+) -> np.ndarray:
+    """每个窗口内 |x - center[i]|^power 的和
+
+    按窗口内偏移逐列累加 (共 window 次整段向量运算)，不展开 n x window 的矩阵，
+    内存为 O(n)；窗口内有 NaN 时结果为 NaN。
+    """
+    count = x.shape[-1] - window + 1
+    reference = center[..., window - 1:]
+    total = np.zeros(reference.shape)
+    buffer = np.empty(reference.shape)
+    for offset in range(window):
+        np.subtract(x[..., offset:offset + count], reference, out=buffer)
+        if power == 1:
+            np.abs(buffer, out=buffer)
+        elif power == 2:
+            np.square(buffer, out=buffer)
+        else:
+            np.power(np.abs(buffer), power, out=buffer)
+        total += buffer
+    return total
+
+
+def rolling_std(
+    x: np.ndarray,
+    window: int,
+    ddof: int = 1,
+    mean: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """滚动标准差 (样本标准差，围绕窗口均值两遍求和，避免平方和相减的精度损失)
+
+    已算出同窗口的滚动均值时可通过 mean 传入，避免重复计算。
+    """
+    out = np.full(x.shape, np.nan)
+    if window <= ddof or x.shape[-1] < window:
+        return out
+    if mean is None:
+        mean = rolling_mean(x, window)
+    squares = _window_deviation_sum(x, window, mean, 2)
+    out[..., window - 1:] = np.sqrt(squares / (window - ddof))
+    return out
+
+
+def rolling_mad(
+    x: np.ndarray,
+    window: int,
+    center: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """滚动平均绝对偏差 mean(|x[k] - center[i]|)，k 取以 i 结尾的窗口
+
+    Args:
+        x: 输入序列
+        window: 窗口长度
+        center: 每个窗口的中心值 (与 x 等长，按窗口末尾对齐)，默认为滚动均值
+
+    Returns:
+        平均绝对偏差，前 window - 1 个位置为 NaN
+    """
+    out = np.full(x.shape, np.nan)
+    if window <= 0 or x.shape[-1] < window:
+        return out
+    if center is None:
+        center = rolling_mean(x, window)
+    out[..., window - 1:] = _window_deviation_sum(x, window, center, 1) / window
+    return out
+
+
+def _rolling_extreme(x: np.ndarray, window: int, func: np.ufunc, identity: float) -> np.ndarray:
+    """滚动极值 (min_periods=1，忽略 NaN；窗口内全为 NaN 时结果为 NaN)"""
+    n = x.shape[-1]
+    if n == 0:
+        return np.empty(x.shape)
+    window = max(1, min(window, n))
+    out = _block_scan(np.where(np.isnan(x), identity, x), window, func, identity)
+    out[out == identity] = np.nan
+    return out
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    """滚动最大值 (min_periods=1)"""
+    return _rolling_extreme(x, window, np.maximum, -np.inf)
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    """滚动最小值 (min_periods=1)"""
+    return _rolling_extreme(x, window, np.minimum, np.inf)
+
+
+def _ewm_loop(x: np.ndarray, alpha: float) -> np.ndarray:
+    """逐点指数平滑 (含 NaN 时使用，与 pandas ewm(adjust=False) 的 NaN 处理一致)
+
+    NaN 位置沿用上一个值；缺失之后的新观测，旧值权重按经过的步数衰减。
+    """
+    decay = 1.0 - alpha
+    out = np.empty(len(x))
+    weighted = math.nan
+    old_weight = 1.0
+
+    for i, value in enumerate(x.tolist()):
+        observed = value == value
+        if weighted == weighted:
+            old_weight *= decay
+            if observed:
+                if weighted != value:
+                    weighted = (old_weight * weighted + alpha * value) / (old_weight + alpha)
+                old_weight = 1.0
+        elif observed:
+            weighted = value
+        out[i] = weighted
+
+    return out
+
+
+def _ewm_rows(x: np.ndarray, alpha: float) -> np.ndarray:
+    """多行指数平滑: 沿时间轴逐步递推，每一步对所有行向量化
+
+    每行的起点 (上市日) 和缺失位置 (停牌) 各不相同，逐步递推可直接复用
+    _ewm_loop 的 NaN 语义；步数为日期数，与股票数量无关。
+    """
+    decay = 1.0 - alpha
+    out = np.empty(x.shape)
+    weighted = np.full(x.shape[:-1], np.nan)
+    old_weight = np.ones(x.shape[:-1])
+
+    for t in range(x.shape[-1]):
+        value = x[..., t]
+        observed = ~np.isnan(value)
+        started = ~np.isnan(weighted)
+
+        old_weight = np.where(started, old_weight * decay, old_weight)
+        mixed = (old_weight * weighted + alpha * value) / (old_weight + alpha)
+        update = started & observed
+        weighted = np.where(update & (weighted != value), mixed, weighted)
+        old_weight = np.where(update, 1.0, old_weight)
+        weighted = np.where(~started & observed, value, weighted)
+        out[..., t] = weighted
+
+    return out
+
+
+def ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    """指数平滑 y[t] = (1 - alpha) * y[t-1] + alpha * x[t]，y[0] = x[0]
+
+    一维且无缺失值时按块向量化: 每块内用缩放后的前缀和求出零初值的平滑结果，
+    再逐块传递块首初值。块长按衰减系数选择，使缩放系数不超过
+    _EWM_SCALE_LIMIT，保证与逐点递推的误差在浮点精度量级。
+    多维数组沿时间轴递推 (见 _ewm_rows)。
+    """
+    if x.ndim > 1:
+        with np.errstate(invalid="ignore"):
+            return _ewm_rows(x, alpha)
+
+    n = len(x)
+    out = np.full(n, np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) == 0:
+        return out
+
+    start = valid[0]
+    values = x[start:]
+    if len(valid) != len(values):
+        out[start:] = _ewm_loop(values, alpha)
+        return out
+
+    if alpha >= 1.0:
+        out[start:] = values
+        return out
+
+    decay = 1.0 - alpha
+    m = len(values)
+    block = int(math.log(_EWM_SCALE_LIMIT) / -math.log(decay))
+    block = max(1, min(block, m))
+    blocks = -(-m // block)
+
+    padded = np.zeros(blocks * block)
+    padded[:m] = values
+    grid = padded.reshape(blocks, block)
+
+    j = np.arange(block)
+    powers = decay ** (j + 1)
+    # 块内零初值结果: alpha * sum_{k<=j} decay^(j-k) * x[k]
+    partial = np.cumsum(grid * (alpha * decay ** -j), axis=1)
+    partial *= decay ** j
+
+    # 块首初值 (上一块末值) 逐块传递
+    carry = np.empty(blocks)
+    tail = decay ** block
+    previous = float(values[0])
+    for i, last in enumerate(partial[:, -1].tolist()):
+        carry[i] = previous
+        previous = last + tail * previous
+
+    partial += carry[:, None] * powers
+    out[start:] = partial.ravel()[:m]
+    return out
+
+
+# ---- 指标公共中间量 (批量计算时在多个指标之间共享) ----
+
+def price_changes(close: np.ndarray) -> np.ndarray:
+    """逐日涨跌额
+
+    首日及前一日缺失时为 0 (视为新序列的起点)，当日缺失时为 NaN，
+    使上市前的补齐区间不会被当作平盘日参与计算。
+    """
+    previous = np.full(close.shape, np.nan)
+    previous[..., 1:] = close[..., :-1]
+    delta = np.where(np.isnan(previous), 0.0, close - previous)
+    delta[np.isnan(close)] = np.nan
+    return delta
+
+
+def gains(close: np.ndarray) -> np.ndarray:
+    """逐日上涨幅度 (下跌为 0)"""
+    return np.maximum(price_changes(close), 0.0)
+
+
+def losses(close: np.ndarray) -> np.ndarray:
+    """逐日下跌幅度 (取正值，上涨为 0)"""
+    return np.maximum(-price_changes(close), 0.0)
+
+
+def relative_strength(avg_gain: np.ndarray, avg_loss: np.ndarray) -> np.ndarray:
+    """由平均涨跌幅计算 RSI (无下跌时为 100，无涨跌时为 NaN)"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100.0 * avg_gain / (avg_gain + avg_loss)
+
+
+def stochastic(close: np.ndarray, lowest: np.ndarray, highest: np.ndarray) -> np.ndarray:
+    """未成熟随机值 RSV"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (close - lowest) / (highest - lowest) * 100
+
+
+def williams(close: np.ndarray, lowest: np.ndarray, highest: np.ndarray) -> np.ndarray:
+    """威廉指标值"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (highest - close) / (highest - lowest) * -100
+
+
+def typical_price(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """典型价格 (最高 + 最低 + 收盘) / 3"""
+    return (high + low + close) / 3
+
+
+def commodity_channel(tp: np.ndarray, ma_tp: np.ndarray, md: np.ndarray) -> np.ndarray:
+    """由典型价格、均值和平均绝对偏差计算 CCI"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (tp - ma_tp) / (0.015 * md)
+
+
+# ---- 指标 ----
+
+def sma(close: np.ndarray, period: int) -> np.ndarray:
+    """简单移动平均"""
+    return rolling_mean(close, period)
+
+
+def ema(close: np.ndarray, period: int) -> np.ndarray:
+    """指数移动平均 (span=period)"""
+    return ewm(close, 2.0 / (period + 1))
+
+
+def macd(
+    close: np.ndarray,
+    fast_period: int = 12,
+    slow_period: int = 26,
+    signal_period: int = 9,
+) -> dict[str, np.ndarray]:
+    """MACD: macd, signal, histogram"""
+    macd_line = ema(close, fast_period) - ema(close, slow_period)
+    signal_line = ema(macd_line, signal_period)
+    return {
+        "macd": macd_line,
+        "signal": signal_line,
+        "histogram": macd_line - signal_line,
+    }
+
+
+def wilder_mean(x: np.ndarray, period: int) -> np.ndarray:
+    """Wilder 平滑 (RMA): 以首日之后 period 个值的均值为初值，之后按 1/period 指数平滑
+
+    首日 (第一个非 NaN 值，对应无涨跌) 不参与初值；多行时按各行的首日分组计算。
+    """
+    out = np.full(x.shape, np.nan)
+    if period <= 0:
+        return out
+
+    rows = x.reshape(-1, x.shape[-1])
+    flat = out.reshape(rows.shape)
+    observed = ~np.isnan(rows)
+    first = np.where(observed.any(axis=1), observed.argmax(axis=1), rows.shape[1])
+
+    for start in np.unique(first).tolist():
+        if rows.shape[1] - start <= period:
+            continue
+        group = np.flatnonzero(first == start)
+        series = rows[group, start + period:].copy()
+        series[:, 0] = rows[group, start + 1:start + period + 1].mean(axis=1)
+        smoothed = ewm(series[0], 1.0 / period) if len(group) == 1 else ewm(series, 1.0 / period)
+        flat[group, start + period:] = smoothed
+    return out
+
+
+def rsi(close: np.ndarray, period: int = 14, smoothing: str = "sma") -> np.ndarray:
+    """相对强弱指标
+
+    Args:
+        close: 收盘价
+        period: 周期
+        smoothing: 涨跌幅平滑方式，sma (简单平均) 或 wilder
+
+    Returns:
+        RSI 数组
+    """
+    average = wilder_mean if smoothing == "wilder" else rolling_mean
+    return relative_strength(average(gains(close), period), average(losses(close), period))
+
+
+def kdj(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    n: int = 9,
+    m1: int = 3,
+    m2: int = 3,
+) -> dict[str, np.ndarray]:
+    """KDJ: k, d, j"""
+    rsv = stochastic(close, rolling_min(low, n), rolling_max(high, n))
+    k = ewm(rsv, 1.0 / m1)
+    d = ewm(k, 1.0 / m2)
+    return {"k": k, "d": d, "j": 3 * k - 2 * d}
+
+
+def bollinger_bands(
+    close: np.ndarray,
+    period: int = 20,
+    std_dev: float = 2.0,
+) -> dict[str, np.ndarray]:
+    """布林带: upper, middle, lower"""
+    middle = rolling_mean(close, period)
+    std = rolling_std(close, period, mean=middle)
+    return {
+        "upper": middle + std_dev * std,
+        "middle": middle,
+        "lower": middle - std_dev * std,
+    }
+
+
+def cci(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    period: int = 14,
+) -> np.ndarray:
+    """顺势指标"""
+    tp = typical_price(high, low, close)
+    ma_tp = rolling_mean(tp, period)
+    return commodity_channel(tp, ma_tp, rolling_mad(tp, period, ma_tp))
+
+
+def wr(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    period: int = 14,
+) -> np.ndarray:
+    """威廉指标"""
+    return williams(close, rolling_min(low, period), rolling_max(high, period))
@@ -0,0 +1,160 @@
+"""截面技术指标计算 (股票 x 日期矩阵)
+
+全市场的价格按日期对齐为二维矩阵，缺失位置 (上市前、停牌) 为 NaN；
+指标沿时间轴一次向量化计算，每一行的结果与对该行单独计算一致。
+股票数量较多时按行分块计算，控制中间结果的内存占用。
+"""
+import logging
+from typing import Iterable, Mapping, Optional, Union
+
+import numpy as np
+
+from ..data.adjust import adjust_bars, validate_adjust
+from ..data.kline_store import KLineStore, empty_bars, get_kline_store, slice_bars
+from ..data.resample import DAILY, resample_bars
+from .batch import IndicatorSpec, build_graph
+
+logger = logging.getLogger(__name__)
+
+PANEL_FIELDS = ("open_price", "high", "low", "close", "volume")
+
+# 单个分块的默认单元格数 (股票数 x 日期数)，每个中间结果约占 8 字节/单元格
+DEFAULT_CHUNK_CELLS = 1_000_000
+
+
+class PricePanel:
+    """按日期对齐的价格矩阵
+
+    codes[i] 对应每个字段矩阵的第 i 行，dates[j] 对应第 j 列。
+    """
+
+    def __init__(self, codes: np.ndarray, dates: np.ndarray, fields: dict[str, np.ndarray]):
+        self.codes = codes
+        self.dates = dates
+        self.fields = fields
+        self.index: dict[str, int] = {code: i for i, code in enumerate(codes.tolist())}
+
+    @classmethod
+    def from_bars(
+        cls,
+        bars_by_code: Mapping[str, Mapping[str, np.ndarray]],
+        fields: Iterable[str] = PANEL_FIELDS,
+    ) -> "PricePanel":
+        """由多只股票的列式 K 线构建矩阵 (日期取并集，缺失补 NaN)
+
+        Args:
+            bars_by_code: 股票代码 -> 列式 K 线
+            fields: 需要的字段
+
+        Returns:
+            价格矩阵
+        """
+        fields = tuple(fields)
+        codes = np.array(list(bars_by_code), dtype=str)
+        date_arrays = [bars["date"] for bars in bars_by_code.values() if len(bars["date"])]
+        if date_arrays:
+            dates = np.unique(np.concatenate(date_arrays))
+        else:
+            dates = np.array([], dtype="datetime64[D]")
+
+        matrices = {field: np.full((len(codes), len(dates)), np.nan) for field in fields}
+        for i, bars in enumerate(bars_by_code.values()):
+            if not len(bars["date"]):
+                continue
+            columns = np.searchsorted(dates, bars["date"])
+            for field in fields:
+                if field in bars:
+                    matrices[field][i, columns] = bars[field]
+
+        return cls(codes, dates, matrices)
+
+    @classmethod
+    def from_store(
+        cls,
+        codes: Iterable[str],
+        period: str = "daily",
+        adjust: str = "qfq",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        store: Optional[KLineStore] = None,
+        fields: Iterable[str] = PANEL_FIELDS,
+    ) -> "PricePanel":
+        """从本地日线存储构建矩阵 (不访问上游，未存储的股票整行为 NaN)
+
+        非日线周期由日线聚合，复权价格由不复权日线和本地复权因子计算。
+        """
+        store = store or get_kline_store()
+        adjust = validate_adjust(adjust)
+
+        bars_by_code = {}
+        for code in codes:
+            loaded = store.load(code, DAILY, "")
+            if loaded is None:
+                bars = empty_bars()
+            else:
+                bars = loaded[0]
+                factors = store.load_factors(code) if adjust else None
+                if factors is not None:
+                    bars = adjust_bars(bars, factors, adjust)
+                bars = resample_bars(bars, period)
+            bars_by_code[code] = slice_bars(bars, start_date, end_date)
+
+        return cls.from_bars(bars_by_code, fields)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.codes), len(self.dates)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+def compute_panel(
+    panel: Union[PricePanel, Mapping[str, np.ndarray]],
+    specs: Iterable[Union[str, IndicatorSpec]],
+    chunk_rows: Optional[int] = None,
+    chunk_cells: int = DEFAULT_CHUNK_CELLS,
+) -> dict[str, dict[str, np.ndarray]]:
+    """对价格矩阵批量计算指标
+
+    Args:
+        panel: 价格矩阵，或 字段 -> (股票 x 日期) 数组
+        specs: 指标规格，如 ["rsi:14", "macd", "kdj"]
+        chunk_rows: 每块的股票数，默认按 chunk_cells 推算
+        chunk_cells: 每块的单元格数上限
+
+    Returns:
+        规范化规格 key -> (输出名 -> (股票 x 日期) 数组)
+
+    Raises:
+        ValueError: 指标规格无效
+    """
+    fields = panel.fields if isinstance(panel, PricePanel) else panel
+    graph = build_graph(specs)
+    matrices = {name: np.asarray(values, dtype=np.float64) for name, values in fields.items()}
+    rows, columns = next(iter(matrices.values())).shape
+
+    if chunk_rows is None:
+        chunk_rows = max(1, chunk_cells // max(columns, 1))
+
+    results: dict[str, dict[str, np.ndarray]] = {}
+    for start in range(0, max(rows, 1), chunk_rows):
+        chunk = {name: values[start:start + chunk_rows] for name, values in matrices.items()}
+        for key, outputs in graph.evaluate(chunk).items():
+            target = results.setdefault(key, {})
+            for name, values in outputs.items():
+                if name not in target:
+                    target[name] = np.empty((rows, columns))
+                target[name][start:start + chunk_rows] = values
+
+    logger.debug(f"截面指标计算完成: {rows} 只股票 x {columns} 日, 分块 {chunk_rows} 行")
+    return results
+
+
+def latest_values(values: np.ndarray) -> np.ndarray:
+    """每行最后一个非 NaN 值 (当日停牌时取停牌前的值，整行缺失为 NaN)"""
+    observed = ~np.isnan(values)
+    last = values.shape[-1] - 1 - np.argmax(observed[..., ::-1], axis=-1)
+    result = np.take_along_axis(values, last[..., None], axis=-1)[..., 0]
+    result[~observed.any(axis=-1)] = np.nan
+    return result
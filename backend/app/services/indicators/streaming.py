@@ -0,0 +1,623 @@
+"""增量技术指标
+
+每个指标保存计算所需的最小状态，新增一根 K 线只做 O(1) 更新 (CCI 的平均绝对偏差
+为 O(窗口))，结果与 kernels 中的全量计算一致。
+
+- update(bar): 追加一根已完成的 K 线并返回最新值
+- preview(bar): 用未完成的 K 线 (盘中实时行情) 试算，不改变状态
+- to_state()/restore(state): 状态序列化为 JSON 兼容的字典，可持久化后恢复
+
+bar 为包含 close (以及 KDJ/WR/CCI 需要的 high、low) 的映射。
+"""
+import math
+from collections import deque
+from typing import Any, Iterable, Mapping, Optional, Union
+
+from .batch import IndicatorSpec, parse_specs
+
+Value = Union[float, dict[str, float]]
+
+
+def _price(bar: Mapping[str, Any], field: str) -> float:
+    value = bar.get(field)
+    return math.nan if value is None else float(value)
+
+
+def _dump(value: float) -> Optional[float]:
+    """NaN 序列化为 None"""
+    return None if value != value else value
+
+
+def _load(value: Optional[float]) -> float:
+    return math.nan if value is None else float(value)
+
+
+class _EWM:
+    """指数平滑状态 (与 ewm(adjust=False) 的 NaN 处理一致)"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.weighted = math.nan
+        self.old_weight = 1.0
+
+    def _next(self, value: float) -> tuple[float, float]:
+        weighted, old_weight = self.weighted, self.old_weight
+        if weighted == weighted:
+            old_weight *= 1.0 - self.alpha
+            if value == value:
+                if weighted != value:
+                    weighted = (old_weight * weighted + self.alpha * value) / (
+                        old_weight + self.alpha
+                    )
+                old_weight = 1.0
+        elif value == value:
+            weighted = value
+        return weighted, old_weight
+
+    def push(self, value: float) -> float:
+        self.weighted, self.old_weight = self._next(value)
+        return self.weighted
+
+    def peek(self, value: float) -> float:
+        return self._next(value)[0]
+
+    def to_state(self) -> dict:
+        return {"weighted": _dump(self.weighted), "old_weight": self.old_weight}
+
+    def load(self, state: dict):
+        self.weighted = _load(state["weighted"])
+        self.old_weight = state["old_weight"]
+
+
+class _Window:
+    """定长滑动窗口的均值和方差
+
+    按 Welford 算法增删元素；每滑过一个窗口长度按缓冲区全量重算一次，
+    消除长期增删累积的浮点误差 (均摊 O(1))。窗口未满或含 NaN 时结果为 NaN。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: deque[float] = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nan_count = 0
+        self.updates = 0
+
+    @staticmethod
+    def _add(count: int, mean: float, m2: float, x: float) -> tuple[int, float, float]:
+        count += 1
+        delta = x - mean
+        mean += delta / count
+        return count, mean, m2 + delta * (x - mean)
+
+    @staticmethod
+    def _remove(count: int, mean: float, m2: float, x: float) -> tuple[int, float, float]:
+        if count <= 1:
+            return 0, 0.0, 0.0
+        count -= 1
+        delta = x - mean
+        mean -= delta / count
+        return count, mean, max(m2 - delta * (x - mean), 0.0)
+
+    def _next(self, x: float) -> tuple[int, float, float, int, bool]:
+        count, mean, m2, nan_count = self.count, self.mean, self.m2, self.nan_count
+        if len(self.values) == self.size:
+            evicted = self.values[0]
+            if evicted != evicted:
+                nan_count -= 1
+            else:
+                count, mean, m2 = self._remove(count, mean, m2, evicted)
+        if x != x:
+            nan_count += 1
+        else:
+            count, mean, m2 = self._add(count, mean, m2, x)
+        full = min(len(self.values) + 1, self.size) == self.size
+        return count, mean, m2, nan_count, full
+
+    @staticmethod
+    def _stats(count: int, mean: float, m2: float, nan_count: int, full: bool) -> tuple[float, float]:
+        if not full or nan_count:
+            return math.nan, math.nan
+        variance = m2 / (count - 1) if count > 1 else math.nan
+        return mean, math.sqrt(variance)
+
+    def push(self, x: float) -> tuple[float, float]:
+        """加入新值，返回 (均值, 样本标准差)"""
+        self.count, self.mean, self.m2, self.nan_count, full = self._next(x)
+        self.values.append(x)
+        if len(self.values) > self.size:
+            self.values.popleft()
+
+        self.updates += 1
+        if self.updates >= self.size:
+            self._recompute()
+
+        return self._stats(self.count, self.mean, self.m2, self.nan_count, full)
+
+    def peek(self, x: float) -> tuple[float, float]:
+        return self._stats(*self._next(x))
+
+    def peek_values(self, x: float) -> list[float]:
+        """加入 x 之后窗口内的值"""
+        values = list(self.values)
+        if len(values) == self.size:
+            values.pop(0)
+        values.append(x)
+        return values
+
+    def _recompute(self):
+        finite = [v for v in self.values if v == v]
+        self.count = len(finite)
+        self.nan_count = len(self.values) - self.count
+        self.mean = math.fsum(finite) / self.count if finite else 0.0
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in finite)
+        self.updates = 0
+
+    def to_state(self) -> dict:
+        return {"values": [_dump(v) for v in self.values], "updates": self.updates}
+
+    def load(self, state: dict):
+        self.values = deque(_load(v) for v in state["values"])
+        self._recompute()
+        self.updates = state["updates"]
+
+
+class _Extreme:
+    """滑动窗口最大/最小值 (单调队列，min_periods=1，忽略 NaN)"""
+
+    def __init__(self, size: int, maximum: bool):
+        self.size = size
+        self.maximum = maximum
+        self.index = 0
+        self.items: deque[tuple[int, float]] = deque()
+
+    def _dominates(self, a: float, b: float) -> bool:
+        return a >= b if self.maximum else a <= b
+
+    def _current(self, index: int) -> float:
+        """以 index 结尾的窗口内 (不含 index 本身) 的极值"""
+        for item_index, value in self.items:
+            if item_index > index - self.size:
+                return value
+        return math.nan
+
+    def push(self, x: float) -> float:
+        t = self.index
+        while self.items and self.items[0][0] <= t - self.size:
+            self.items.popleft()
+        if x == x:
+            while self.items and self._dominates(x, self.items[-1][1]):
+                self.items.pop()
+            self.items.append((t, x))
+        self.index += 1
+        return self.items[0][1] if self.items else math.nan
+
+    def peek(self, x: float) -> float:
+        # push 之后队首最多只有一个元素过期，_current 最多检查两个元素
+        current = self._current(self.index)
+        if x != x:
+            return current
+        if current != current or self._dominates(x, current):
+            return x
+        return current
+
+    def to_state(self) -> dict:
+        return {"index": self.index, "items": [list(item) for item in self.items]}
+
+    def load(self, state: dict):
+        self.index = state["index"]
+        self.items = deque((int(i), float(v)) for i, v in state["items"])
+
+
+class StreamingIndicator:
+    """增量指标基类"""
+
+    name = ""
+
+    def update(self, bar: Mapping[str, Any]) -> Value:
+        """追加一根已完成的 K 线，返回最新值"""
+        return self._step(bar, commit=True)
+
+    def preview(self, bar: Mapping[str, Any]) -> Value:
+        """用未完成的 K 线试算最新值 (不改变状态)"""
+        return self._step(bar, commit=False)
+
+    def _step(self, bar: Mapping[str, Any], commit: bool) -> Value:
+        raise NotImplementedError
+
+    @property
+    def params(self) -> tuple:
+        raise NotImplementedError
+
+    def _components(self) -> dict[str, Any]:
+        """需要序列化的状态组件"""
+        raise NotImplementedError
+
+    def to_state(self) -> dict:
+        """序列化状态 (JSON 兼容)"""
+        state = {}
+        for key, component in self._components().items():
+            state[key] = component.to_state() if hasattr(component, "to_state") else component
+        return {"indicator": self.name, "params": list(self.params), "state": state}
+
+    def _load(self, state: dict):
+        for key, component in self._components().items():
+            component.load(state[key])
+
+
+class StreamingSMA(StreamingIndicator):
+    """简单移动平均"""
+
+    name = "sma"
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.window = _Window(period)
+
+    @property
+    def params(self) -> tuple:
+        return (self.period,)
+
+    def _step(self, bar, commit):
+        close = _price(bar, "close")
+        mean, _ = self.window.push(close) if commit else self.window.peek(close)
+        return mean
+
+    def _components(self):
+        return {"window": self.window}
+
+
+class StreamingEMA(StreamingIndicator):
+    """指数移动平均"""
+
+    name = "ema"
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.ewm = _EWM(2.0 / (period + 1))
+
+    @property
+    def params(self) -> tuple:
+        return (self.period,)
+
+    def _step(self, bar, commit):
+        close = _price(bar, "close")
+        return self.ewm.push(close) if commit else self.ewm.peek(close)
+
+    def _components(self):
+        return {"ewm": self.ewm}
+
+
+class StreamingMACD(StreamingIndicator):
+    """MACD"""
+
+    name = "macd"
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        self.fast_period = fast_period
+        self.slow_period = slow_period
+        self.signal_period = signal_period
+        self.fast = _EWM(2.0 / (fast_period + 1))
+        self.slow = _EWM(2.0 / (slow_period + 1))
+        self.signal = _EWM(2.0 / (signal_period + 1))
+
+    @property
+    def params(self) -> tuple:
+        return (self.fast_period, self.slow_period, self.signal_period)
+
+    def _step(self, bar, commit):
+        close = _price(bar, "close")
+        if commit:
+            line = self.fast.push(close) - self.slow.push(close)
+            signal = self.signal.push(line)
+        else:
+            line = self.fast.peek(close) - self.slow.peek(close)
+            signal = self.signal.peek(line)
+        return {"macd": line, "signal": signal, "histogram": line - signal}
+
+    def _components(self):
+        return {"fast": self.fast, "slow": self.slow, "signal": self.signal}
+
+
+class StreamingRSI(StreamingIndicator):
+    """相对强弱指标 (smoothing: sma 简单平均 / wilder 平滑)"""
+
+    name = "rsi"
+
+    def __init__(self, period: int = 14, smoothing: str = "sma"):
+        if smoothing not in ("sma", "wilder"):
+            raise ValueError(f"不支持的 RSI 平滑方式: {smoothing}")
+        self.period = period
+        self.smoothing = smoothing
+        self.prev_close: Optional[float] = None
+        # sma: 涨跌幅滑动窗口
+        self.gains = _Window(period)
+        self.losses = _Window(period)
+        # wilder: 已有涨跌幅个数及平均值 (前 period 个为累加和)
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    @property
+    def params(self) -> tuple:
+        return (self.period, self.smoothing)
+
+    @staticmethod
+    def _strength(avg_gain: float, avg_loss: float) -> float:
+        total = avg_gain + avg_loss
+        if total != total or total == 0:
+            return math.nan
+        return 100.0 * avg_gain / total
+
+    def _step(self, bar, commit):
+        close = _price(bar, "close")
+        # 与 kernels.price_changes 一致: 当日缺失为 NaN，首日或前一日缺失为 0
+        if close != close:
+            gain = loss = math.nan
+        elif self.prev_close is None or self.prev_close != self.prev_close:
+            gain = loss = 0.0
+        else:
+            delta = close - self.prev_close
+            gain = max(delta, 0.0)
+            loss = max(-delta, 0.0)
+
+        if self.smoothing == "sma":
+            if commit:
+                avg_gain, _ = self.gains.push(gain)
+                avg_loss, _ = self.losses.push(loss)
+            else:
+                avg_gain, _ = self.gains.peek(gain)
+                avg_loss, _ = self.losses.peek(loss)
+            value = self._strength(avg_gain, avg_loss)
+        else:
+            first = self.count == 0 and (self.prev_close is None or self.prev_close != self.prev_close)
+            value, state = self._wilder(gain, loss, first)
+            if commit:
+                self.count, self.avg_gain, self.avg_loss = state
+
+        if commit:
+            self.prev_close = close
+        return value
+
+    def _wilder(self, gain: float, loss: float, first: bool) -> tuple[float, tuple[int, float, float]]:
+        count, avg_gain, avg_loss = self.count, self.avg_gain, self.avg_loss
+        if first:
+            return math.nan, (count, avg_gain, avg_loss)
+        if gain != gain:
+            # 缺失的 K 线不参与平滑，沿用当前值
+            if count < self.period:
+                return math.nan, (count, avg_gain, avg_loss)
+            return self._strength(avg_gain, avg_loss), (count, avg_gain, avg_loss)
+
+        count += 1
+        if count < self.period:
+            return math.nan, (count, avg_gain + gain, avg_loss + loss)
+        if count == self.period:
+            avg_gain = (avg_gain + gain) / self.period
+            avg_loss = (avg_loss + loss) / self.period
+        else:
+            avg_gain += (gain - avg_gain) / self.period
+            avg_loss += (loss - avg_loss) / self.period
+        return self._strength(avg_gain, avg_loss), (count, avg_gain, avg_loss)
+
+    def _components(self):
+        return {"gains": self.gains, "losses": self.losses}
+
+    def to_state(self) -> dict:
+        state = super().to_state()
+        state["state"].update(
+            prev_close=None if self.prev_close is None else _dump(self.prev_close),
+            started=self.prev_close is not None,
+            count=self.count,
+            avg_gain=self.avg_gain,
+            avg_loss=self.avg_loss,
+        )
+        return state
+
+    def _load(self, state: dict):
+        super()._load(state)
+        self.prev_close = _load(state["prev_close"]) if state["started"] else None
+        self.count = state["count"]
+        self.avg_gain = state["avg_gain"]
+        self.avg_loss = state["avg_loss"]
+
+
+class StreamingKDJ(StreamingIndicator):
+    """KDJ (单调队列维护 n 日最高/最低)"""
+
+    name = "kdj"
+
+    def __init__(self, n: int = 9, m1: int = 3, m2: int = 3):
+        self.n = n
+        self.m1 = m1
+        self.m2 = m2
+        self.highest = _Extreme(n, maximum=True)
+        self.lowest = _Extreme(n, maximum=False)
+        self.k = _EWM(1.0 / m1)
+        self.d = _EWM(1.0 / m2)
+
+    @property
+    def params(self) -> tuple:
+        return (self.n, self.m1, self.m2)
+
+    def _step(self, bar, commit):
+        close = _price(bar, "close")
+        if commit:
+            highest = self.highest.push(_price(bar, "high"))
+            lowest = self.lowest.push(_price(bar, "low"))
+        else:
+            highest = self.highest.peek(_price(bar, "high"))
+            lowest = self.lowest.peek(_price(bar, "low"))
+
+        rsv = _ratio(close - lowest, highest - lowest) * 100
+        if commit:
+            k = self.k.push(rsv)
+            d = self.d.push(k)
+        else:
+            k = self.k.peek(rsv)
+            d = self.d.peek(k)
+        return {"k": k, "d": d, "j": 3 * k - 2 * d}
+
+    def _components(self):
+        return {"highest": self.highest, "lowest": self.lowest, "k": self.k, "d": self.d}
+
+
+class StreamingBOLL(StreamingIndicator):
+    """布林带 (滑动窗口增量方差)"""
+
+    name = "boll"
+
+    def __init__(self, period: int = 20, std_dev: float = 2.0):
+        self.period = period
+        self.std_dev = std_dev
+        self.window = _Window(period)
+
+    @property
+    def params(self) -> tuple:
+        return (self.period, self.std_dev)
+
+    def _step(self, bar, commit):
+        close = _price(bar, "close")
+        middle, std = self.window.push(close) if commit else self.window.peek(close)
+        return {
+            "upper": middle + self.std_dev * std,
+            "middle": middle,
+            "lower": middle - self.std_dev * std,
+        }
+
+    def _components(self):
+        return {"window": self.window}
+
+
+class StreamingCCI(StreamingIndicator):
+    """顺势指标 (平均绝对偏差需遍历窗口，O(period))"""
+
+    name = "cci"
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.window = _Window(period)
+
+    @property
+    def params(self) -> tuple:
+        return (self.period,)
+
+    def _step(self, bar, commit):
+        tp = (_price(bar, "high") + _price(bar, "low") + _price(bar, "close")) / 3
+        values = self.window.peek_values(tp)
+        mean, _ = self.window.push(tp) if commit else self.window.peek(tp)
+        if mean != mean:
+            return math.nan
+        md = sum(abs(v - mean) for v in values) / self.period
+        return _ratio(tp - mean, 0.015 * md)
+
+    def _components(self):
+        return {"window": self.window}
+
+
+class StreamingWR(StreamingIndicator):
+    """威廉指标 (单调队列维护最高/最低)"""
+
+    name = "wr"
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.highest = _Extreme(period, maximum=True)
+        self.lowest = _Extreme(period, maximum=False)
+
+    @property
+    def params(self) -> tuple:
+        return (self.period,)
+
+    def _step(self, bar, commit):
+        close = _price(bar, "close")
+        if commit:
+            highest = self.highest.push(_price(bar, "high"))
+            lowest = self.lowest.push(_price(bar, "low"))
+        else:
+            highest = self.highest.peek(_price(bar, "high"))
+            lowest = self.lowest.peek(_price(bar, "low"))
+        return _ratio(highest - close, highest - lowest) * -100
+
+    def _components(self):
+        return {"highest": self.highest, "lowest": self.lowest}
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    """与 NumPy 一致的除法 (除零得到 ±inf 或 NaN)"""
+    if denominator == 0:
+        if numerator == 0 or numerator != numerator:
+            return math.nan
+        return math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+STREAMING_INDICATORS: dict[str, type[StreamingIndicator]] = {
+    cls.name: cls
+    for cls in (
+        StreamingSMA,
+        StreamingEMA,
+        StreamingMACD,
+        StreamingRSI,
+        StreamingKDJ,
+        StreamingBOLL,
+        StreamingCCI,
+        StreamingWR,
+    )
+}
+
+
+def create_streaming(spec: Union[str, IndicatorSpec]) -> StreamingIndicator:
+    """按指标规格创建增量指标"""
+    if not isinstance(spec, IndicatorSpec):
+        spec = IndicatorSpec.parse(spec)
+    return STREAMING_INDICATORS[spec.name](*spec.params)
+
+
+def restore(state: dict) -> StreamingIndicator:
+    """从 to_state() 的结果恢复增量指标"""
+    indicator = STREAMING_INDICATORS[state["indicator"]](*state["params"])
+    indicator._load(state["state"])
+    return indicator
+
+
+class IndicatorStream:
+    """单只股票的一组增量指标
+
+    输出结构与 compute_indicators 一致 (规格 key -> 输出名 -> 值)，
+    单值指标的输出名为 values。
+    """
+
+    def __init__(self, specs: Iterable[Union[str, IndicatorSpec]] = ()):
+        self.indicators: dict[str, StreamingIndicator] = {
+            spec.key: create_streaming(spec) for spec in parse_specs(specs)
+        }
+
+    @staticmethod
+    def _wrap(value: Value) -> dict[str, float]:
+        return value if isinstance(value, dict) else {"values": value}
+
+    def update(self, bar: Mapping[str, Any]) -> dict[str, dict[str, float]]:
+        return {key: self._wrap(ind.update(bar)) for key, ind in self.indicators.items()}
+
+    def preview(self, bar: Mapping[str, Any]) -> dict[str, dict[str, float]]:
+        return {key: self._wrap(ind.preview(bar)) for key, ind in self.indicators.items()}
+
+    def warm_up(self, bars: Mapping[str, Any]) -> Optional[dict[str, dict[str, float]]]:
+        """用历史 K 线 (列式) 初始化状态，返回最后一根 K 线的指标值"""
+        columns = {c: list(bars[c]) for c in ("high", "low", "close") if c in bars}
+        result = None
+        for row in zip(*columns.values()):
+            result = self.update(dict(zip(columns, row)))
+        return result
+
+    def to_state(self) -> dict:
+        return {key: ind.to_state() for key, ind in self.indicators.items()}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "IndicatorStream":
+        stream = cls()
+        stream.indicators = {key: restore(item) for key, item in state.items()}
+        return stream
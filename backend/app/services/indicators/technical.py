@@ -1,20 +1,27 @@
 """技术指标计算引擎"""
 from typing import Optional
-from decimal import Decimal
 import logging
 
-try:
-    import pandas as pd
-    import numpy as np
-except ImportError:
-    pd = None
-    np = None
+import numpy as np
+
+from . import kernels
 
 logger = logging.getLogger(__name__)
 
 
+def to_list(values: np.ndarray) -> list[Optional[float]]:
+    """数组转为列表，NaN/Inf 转为 None"""
+    result = values.astype(object)
+    result[~np.isfinite(values)] = None
+    return result.tolist()
+
+
 class TechnicalIndicators:
-    """技术指标计算器"""
+    """技术指标计算器
+
+    计算由 kernels 中的 NumPy 内核完成，这里负责列表输入输出的兼容：
+    数据不足的位置返回 None。
+    """
 
     @staticmethod
     def sma(data: list[float], period: int) -> list[Optional[float]]:
@@ -27,14 +34,8 @@ class TechnicalIndicators:
         Returns:
             移动平均线数据
         """
-        if pd is None:
-            logger.warning("pandas 未安装，无法计算技术指标")
-            return [None] * len(data)
-
         try:
-            df = pd.DataFrame({"value": data})
-            sma = df["value"].rolling(window=period).mean()
-            return sma.tolist()
+            return to_list(kernels.sma(kernels.as_array(data), period))
         except Exception as e:
             logger.error(f"计算 SMA 失败: {e}")
             return [None] * len(data)
@@ -50,13 +51,8 @@ class TechnicalIndicators:
         Returns:
             EMA 数据
         """
-        if pd is None:
-            return [None] * len(data)
-
         try:
-            df = pd.DataFrame({"value": data})
-            ema = df["value"].ewm(span=period, adjust=False).mean()
-            return ema.tolist()
+            return to_list(kernels.ema(kernels.as_array(data), period))
         except Exception as e:
             logger.error(f"计算 EMA 失败: {e}")
             return [None] * len(data)
@@ -79,25 +75,9 @@ class TechnicalIndicators:
         Returns:
             MACD, Signal, Histogram
         """
-        if pd is None:
-            return {
-                "macd": [None] * len(close),
-                "signal": [None] * len(close),
-                "histogram": [None] * len(close),
-            }
-
         try:
-            ema_fast = pd.Series(close).ewm(span=fast_period, adjust=False).mean()
-            ema_slow = pd.Series(close).ewm(span=slow_period, adjust=False).mean()
-            macd_line = ema_fast - ema_slow
-            signal_line = macd_line.ewm(span=signal_period, adjust=False).mean()
-            histogram = macd_line - signal_line
-
-            return {
-                "macd": macd_line.tolist(),
-                "signal": signal_line.tolist(),
-                "histogram": histogram.tolist(),
-            }
+            result = kernels.macd(kernels.as_array(close), fast_period, slow_period, signal_period)
+            return {name: to_list(values) for name, values in result.items()}
         except Exception as e:
             logger.error(f"计算 MACD 失败: {e}")
             return {
@@ -117,21 +97,8 @@ class TechnicalIndicators:
         Returns:
             RSI 数据
         """
-        if pd is None:
-            return [None] * len(close)
-
         try:
-            df = pd.DataFrame({"close": close})
-            delta = df["close"].diff()
-
-            gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-
-            # 处理除零情况
-            rs = gain / loss.replace(0, float('inf'))
-            rsi = 100 - (100 / (1 + rs))
-
-            return rsi.tolist()
+            return to_list(kernels.rsi(kernels.as_array(close), period))
         except Exception as e:
             logger.error(f"计算 RSI 失败: {e}")
             return [None] * len(close)
@@ -158,35 +125,16 @@ class TechnicalIndicators:
         Returns:
             K, D, J 数据
         """
-        if pd is None:
-            return {
-                "k": [None] * len(close),
-                "d": [None] * len(close),
-                "j": [None] * len(close),
-            }
-
         try:
-            df = pd.DataFrame(
-                {
-                    "high": high,
-                    "low": low,
-                    "close": close,
-                }
+            result = kernels.kdj(
+                kernels.as_array(high),
+                kernels.as_array(low),
+                kernels.as_array(close),
+                n,
+                m1,
+                m2,
             )
-
-            low_list = df["low"].rolling(window=n, min_periods=1).min()
-            high_list = df["high"].rolling(window=n, min_periods=1).max()
-            rsv = (df["close"] - low_list) / (high_list - low_list) * 100
-
-            k = rsv.ewm(com=m1 - 1, adjust=False).mean()
-            d = k.ewm(com=m2 - 1, adjust=False).mean()
-            j = 3 * k - 2 * d
-
-            return {
-                "k": k.tolist(),
-                "d": d.tolist(),
-                "j": j.tolist(),
-            }
+            return {name: to_list(values) for name, values in result.items()}
         except Exception as e:
             logger.error(f"计算 KDJ 失败: {e}")
             return {
@@ -211,25 +159,9 @@ class TechnicalIndicators:
         Returns:
             上轨、中轨、下轨数据
         """
-        if pd is None:
-            return {
-                "upper": [None] * len(close),
-                "middle": [None] * len(close),
-                "lower": [None] * len(close),
-            }
-
         try:
-            df = pd.DataFrame({"close": close})
-            middle = df["close"].rolling(window=period).mean()
-            std = df["close"].rolling(window=period).std()
-            upper = middle + std_dev * std
-            lower = middle - std_dev * std
-
-            return {
-                "upper": upper.tolist(),
-                "middle": middle.tolist(),
-                "lower": lower.tolist(),
-            }
+            result = kernels.bollinger_bands(kernels.as_array(close), period, std_dev)
+            return {name: to_list(values) for name, values in result.items()}
         except Exception as e:
             logger.error(f"计算 BOLL 失败: {e}")
             return {
@@ -256,24 +188,14 @@ class TechnicalIndicators:
         Returns:
             CCI 数据
         """
-        if pd is None:
-            return [None] * len(close)
-
         try:
-            df = pd.DataFrame(
-                {
-                    "high": high,
-                    "low": low,
-                    "close": close,
-                }
+            values = kernels.cci(
+                kernels.as_array(high),
+                kernels.as_array(low),
+                kernels.as_array(close),
+                period,
             )
-
-            tp = (df["high"] + df["low"] + df["close"]) / 3
-            ma_tp = tp.rolling(window=period).mean()
-            md = tp.rolling(window=period).apply(lambda x: abs(x - x.mean()).mean(), raw=True)
-            cci = (tp - ma_tp) / (0.015 * md)
-
-            return cci.tolist()
+            return to_list(values)
         except Exception as e:
             logger.error(f"计算 CCI 失败: {e}")
             return [None] * len(close)
@@ -296,23 +218,14 @@ class TechnicalIndicators:
         Returns:
             WR 数据
         """
-        if pd is None:
-            return [None] * len(close)
-
         try:
-            df = pd.DataFrame(
-                {
-                    "high": high,
-                    "low": low,
-                    "close": close,
-                }
+            values = kernels.wr(
+                kernels.as_array(high),
+                kernels.as_array(low),
+                kernels.as_array(close),
+                period,
             )
-
-            high_list = df["high"].rolling(window=period, min_periods=1).max()
-            low_list = df["low"].rolling(window=period, min_periods=1).min()
-            wr = (high_list - df["close"]) / (high_list - low_list) * -100
-
-            return wr.tolist()
+            return to_list(values)
         except Exception as e:
             logger.error(f"计算 WR 失败: {e}")
             return [None] * len(close)
@@ -4,12 +4,43 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import re
 
+import numpy as np
+import pandas as pd
+
+from ..data.convert import detect_date_format
+from ..data.scheduler import FetchScheduler, get_fetch_scheduler
+
 logger = logging.getLogger(__name__)
 
+# 东方财富新闻列名
+EM_NEWS_COLUMNS = {
+    'title': '新闻标题',
+    'content': '新闻内容',
+    'url': '新闻链接',
+    'time': '发布时间',
+}
+
+# 同花顺新闻列名
+JSU_NEWS_COLUMNS = {
+    'title': 'title',
+    'content': 'content',
+    'url': 'url',
+    'time': 'datetime',
+}
+
 
 class NewsFetcher:
     """新闻获取器"""
 
+    def __init__(self, scheduler: Optional[FetchScheduler] = None):
+        """
+        初始化新闻获取器
+
+        Args:
+            scheduler: 上游调用调度器，默认使用全局单例
+        """
+        self.scheduler = scheduler or get_fetch_scheduler()
+
     async def fetch_stock_news(
         self,
         stock_code: str,
@@ -49,23 +80,18 @@ class NewsFetcher:
             # 获取个股新闻（使用东方财富）
             try:
                 # 东财个股新闻
-                df = ak.stock_news_em_stock(stock=f"{market}{stock_code}")
+                df = await self.scheduler.run(
+                    "news", ak.stock_news_em_stock, stock=f"{market}{stock_code}"
+                )
 
                 if df is not None and not df.empty:
-                    for _, row in df.head(limit).iterrows():
-                        # 解析发布时间
-                        publish_time = self._parse_publish_time(row.get('发布时间', ''))
-
-                        # 只返回最近几天的新闻
-                        if publish_time and publish_time >= datetime.now() - timedelta(days=days):
-                            news_list.append({
-                                'title': row.get('新闻标题', ''),
-                                'content': row.get('新闻内容', '')[:500],  # 截取部分内容
-                                'url': row.get('新闻链接', ''),
-                                'source': '东方财富',
-                                'publish_time': publish_time.strftime('%Y-%m-%d %H:%M:%S') if publish_time else '',
-                                'sentiment': self._analyze_sentiment(row.get('新闻标题', '')),
-                            })
+                    # 只返回最近几天的新闻
+                    news_list = self._frame_to_news(
+                        df.head(limit),
+                        EM_NEWS_COLUMNS,
+                        source='东方财富',
+                        since=datetime.now() - timedelta(days=days),
+                    )
 
             except Exception as e:
                 logger.debug(f"获取东方财富新闻失败: {e}")
@@ -73,21 +99,17 @@ class NewsFetcher:
             # 如果东财没有数据，尝试同花顺
             if len(news_list) == 0:
                 try:
-                    df = ak.stock_news_jsu(stock=f"{market}{stock_code}")
+                    df = await self.scheduler.run(
+                        "news", ak.stock_news_jsu, stock=f"{market}{stock_code}"
+                    )
 
                     if df is not None and not df.empty:
-                        for _, row in df.head(limit).iterrows():
-                            publish_time = self._parse_publish_time(row.get('datetime', ''))
-
-                            if publish_time and publish_time >= datetime.now() - timedelta(days=days):
-                                news_list.append({
-                                    'title': row.get('title', ''),
-                                    'content': row.get('content', '')[:500],
-                                    'url': row.get('url', ''),
-                                    'source': '同花顺',
-                                    'publish_time': publish_time.strftime('%Y-%m-%d %H:%M:%S') if publish_time else '',
-                                    'sentiment': self._analyze_sentiment(row.get('title', '')),
-                                })
+                        news_list = self._frame_to_news(
+                            df.head(limit),
+                            JSU_NEWS_COLUMNS,
+                            source='同花顺',
+                            since=datetime.now() - timedelta(days=days),
+                        )
 
                 except Exception as e:
                     logger.debug(f"获取同花顺新闻失败: {e}")
@@ -101,6 +123,74 @@ class NewsFetcher:
             logger.error(f"获取股票新闻失败: {e}")
             return []
 
+    def _frame_to_news(
+        self,
+        df: pd.DataFrame,
+        columns: Dict[str, str],
+        source: str,
+        since: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        整表转换新闻数据
+
+        Args:
+            df: 新闻 DataFrame
+            columns: 字段 (title/content/url/time) -> 原列名
+            source: 新闻来源
+            since: 只保留该时间之后的新闻，None 表示不过滤
+
+        Returns:
+            新闻列表
+        """
+        def text(field: str) -> pd.Series:
+            column = columns[field]
+            if column not in df.columns:
+                return pd.Series([''] * len(df), index=df.index)
+            return df[column].fillna('').astype(str)
+
+        publish_time = self._parse_publish_times(text('time'))
+
+        if since is not None:
+            keep = (publish_time >= since).to_numpy()
+        else:
+            keep = np.ones(len(df), dtype=bool)
+
+        titles = text('title')[keep].tolist()
+        contents = text('content')[keep].str[:500].tolist()  # 截取部分内容
+        urls = text('url')[keep].tolist()
+        times = publish_time[keep].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('').tolist()
+
+        return [
+            {
+                'title': title,
+                'content': content,
+                'url': url,
+                'source': source,
+                'publish_time': time_str,
+                'sentiment': self._analyze_sentiment(title),
+            }
+            for title, content, url, time_str in zip(titles, contents, urls, times)
+        ]
+
+    def _parse_publish_times(self, values: pd.Series) -> pd.Series:
+        """整列解析发布时间
+
+        先按首个值推断的格式整体解析，只有解析失败的行 (如 "10分钟前") 才逐个处理。
+        """
+        if values.empty:
+            return pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+
+        fmt = detect_date_format(values.iloc[0])
+        parsed = pd.to_datetime(values.str.strip(), format=fmt, errors='coerce')
+
+        missing = parsed.isna() & (values != '')
+        if missing.any():
+            parsed[missing] = pd.to_datetime(
+                values[missing].map(self._parse_publish_time), errors='coerce'
+            )
+
+        return parsed
+
     def _parse_publish_time(self, time_str: str) -> Optional[datetime]:
         """解析发布时间"""
         if not time_str:
@@ -197,20 +287,10 @@ class NewsFetcher:
 
             # 获取A股市场新闻
             try:
-                df = ak.stock_news_em()
+                df = await self.scheduler.run("news", ak.stock_news_em)
 
                 if df is not None and not df.empty:
-                    for _, row in df.head(limit).iterrows():
-                        publish_time = self._parse_publish_time(row.get('发布时间', ''))
-
-                        news_list.append({
-                            'title': row.get('新闻标题', ''),
-                            'content': row.get('新闻内容', '')[:500],
-                            'url': row.get('新闻链接', ''),
-                            'source': '东方财富',
-                            'publish_time': publish_time.strftime('%Y-%m-%d %H:%M:%S') if publish_time else '',
-                            'sentiment': self._analyze_sentiment(row.get('新闻标题', '')),
-                        })
+                    news_list = self._frame_to_news(df.head(limit), EM_NEWS_COLUMNS, source='东方财富')
 
             except Exception as e:
                 logger.debug(f"获取市场新闻失败: {e}")
@@ -1,10 +1,28 @@
 """选股引擎"""
 import logging
+import operator as op
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# 数值比较操作符
+NUMERIC_OPERATORS = {
+    "<": op.lt,
+    "<=": op.le,
+    ">": op.gt,
+    ">=": op.ge,
+    "==": op.eq,
+    "=": op.eq,
+    "!=": op.ne,
+}
+
+# 对外字段名 -> 快照字段名
+FIELD_ALIASES = {
+    "open": "open_price",
+}
+
 
 class ScreenerEngine:
     """选股引擎"""
@@ -43,142 +61,145 @@ class ScreenerEngine:
             筛选结果列表
         """
         try:
-            # 获取所有A股列表
-            all_stocks = await self._get_all_stocks()
+            # 全市场列式快照
+            snapshot = await self.data_service.get_market_snapshot()
 
-            if not all_stocks:
+            if snapshot is None or len(snapshot) == 0:
                 return []
 
-            # 应用筛选条件
-            filtered_stocks = await self._apply_conditions(all_stocks, conditions)
-
-            # 排序
-            if sort_by:
-                filtered_stocks = self._sort_results(filtered_stocks, sort_by, sort_order)
-
-            # 限制返回数量
-            return filtered_stocks[:limit]
+            return self.screen_snapshot(snapshot, conditions, sort_by, sort_order, limit)
 
         except Exception as e:
             logger.error(f"选股失败: {e}")
             return []
 
-    async def _get_all_stocks(self) -> List[Dict[str, Any]]:
-        """获取所有A股列表及基础数据"""
-        try:
-            # 获取股票列表
-            stocks = await self.data_service.get_stock_list()
-
-            if not stocks:
-                return []
-
-            # 获取每只股票的实时行情
-            results = []
-            for stock in stocks[:500]:  # 限制数量避免超时
-                try:
-                    code = stock.get("code")
-                    if not code:
-                        continue
-
-                    quote = await self.data_service.get_spot_quote(code)
-                    if quote:
-                        results.append(quote)
-                except Exception as e:
-                    logger.debug(f"获取股票 {stock.get('code')} 数据失败: {e}")
-                    continue
-
-            return results
-
-        except Exception as e:
-            logger.error(f"获取股票列表失败: {e}")
-            return []
-
-    async def _apply_conditions(
+    def screen_snapshot(
         self,
-        stocks: List[Dict[str, Any]],
+        snapshot,
         conditions: List[Dict[str, Any]],
+        sort_by: Optional[str] = None,
+        sort_order: str = "desc",
+        limit: int = 100,
     ) -> List[Dict[str, Any]]:
-        """应用筛选条件"""
-        filtered = stocks
+        """在行情快照上执行选股
+
+        每个条件编译为一个布尔掩码，按位与后得到命中行，再用 argpartition 取前 N 名。
+
+        Args:
+            snapshot: 全市场行情快照 (MarketSnapshot)
+            conditions: 筛选条件列表
+            sort_by: 排序字段
+            sort_order: 排序方向 (asc/desc)
+            limit: 返回数量限制
+
+        Returns:
+            筛选结果列表
+        """
+        mask = np.ones(len(snapshot), dtype=bool)
 
         for condition in conditions:
             field = condition.get("field")
             operator = condition.get("operator")
-            value = condition.get("value")
 
             if not field or operator is None:
                 continue
 
-            filtered = [
-                stock for stock in filtered
-                if self._match_condition(stock, field, operator, value)
-            ]
+            mask &= self._condition_mask(snapshot, field, operator, condition.get("value"))
+
+        rows = np.flatnonzero(mask)
+        rows = self._top_rows(snapshot, rows, sort_by, sort_order, limit)
 
-        return filtered
+        return [snapshot.row(i) for i in rows]
 
-    def _match_condition(
+    def _condition_mask(
         self,
-        stock: Dict[str, Any],
+        snapshot,
         field: str,
         operator: str,
         value: Any,
-    ) -> bool:
-        """判断单个股票是否匹配条件"""
+    ) -> np.ndarray:
+        """将单个条件编译为布尔掩码"""
+        column = snapshot.column(FIELD_ALIASES.get(field, field))
+        size = len(snapshot)
+
+        # 未知字段不匹配任何股票
+        if column is None:
+            return np.zeros(size, dtype=bool)
+
         try:
-            # 获取字段值
-            stock_value = stock.get(field)
-
-            if stock_value is None:
-                return False
-
-            # 根据操作符判断
-            if operator == "<":
-                return stock_value < value
-            elif operator == "<=":
-                return stock_value <= value
-            elif operator == ">":
-                return stock_value > value
-            elif operator == ">=":
-                return stock_value >= value
-            elif operator == "==":
-                return stock_value == value
-            elif operator == "!=":
-                return stock_value != value
-            elif operator == "between":
+            if column.dtype.kind == "U":
+                return self._string_mask(column, operator, value)
+
+            valid = ~np.isnan(column)
+
+            if operator == "between":
                 if isinstance(value, (list, tuple)) and len(value) == 2:
-                    return value[0] <= stock_value <= value[1]
-            elif operator == "contains":
-                if isinstance(stock_value, str):
-                    return value in stock_value
-            elif operator == "startswith":
-                if isinstance(stock_value, str):
-                    return stock_value.startswith(value)
+                    low, high = float(value[0]), float(value[1])
+                    return valid & (column >= low) & (column <= high)
+                return np.zeros(size, dtype=bool)
 
-            return False
+            compare = NUMERIC_OPERATORS.get(operator)
+            if compare is None:
+                return np.zeros(size, dtype=bool)
 
-        except Exception as e:
-            logger.debug(f"条件判断失败: {e}")
-            return False
+            return valid & compare(column, float(value))
 
-    def _sort_results(
-        self,
-        stocks: List[Dict[str, Any]],
-        sort_by: str,
-        sort_order: str = "desc",
-    ) -> List[Dict[str, Any]]:
-        """排序结果"""
-        try:
-            reverse = sort_order.lower() == "desc"
+        except (TypeError, ValueError) as e:
+            logger.debug(f"条件编译失败: {field} {operator} {value}, {e}")
+            return np.zeros(size, dtype=bool)
 
-            return sorted(
-                stocks,
-                key=lambda x: x.get(sort_by, 0) or 0,
-                reverse=reverse,
-            )
+    @staticmethod
+    def _string_mask(column: np.ndarray, operator: str, value: Any) -> np.ndarray:
+        """字符串字段的条件掩码"""
+        value = str(value)
 
-        except Exception as e:
-            logger.error(f"排序失败: {e}")
-            return stocks
+        if operator in ("==", "="):
+            return column == value
+        if operator == "!=":
+            return column != value
+        if operator == "contains":
+            return np.char.find(column, value) >= 0
+        if operator == "startswith":
+            return np.char.startswith(column, value)
+
+        return np.zeros(len(column), dtype=bool)
+
+    @staticmethod
+    def _top_rows(
+        snapshot,
+        rows: np.ndarray,
+        sort_by: Optional[str],
+        sort_order: str,
+        limit: int,
+    ) -> np.ndarray:
+        """取排序后的前 limit 行 (argpartition + 局部排序)"""
+        if not sort_by or len(rows) == 0:
+            return rows[:limit]
+
+        column = snapshot.column(FIELD_ALIASES.get(sort_by, sort_by))
+        if column is None:
+            return rows[:limit]
+
+        descending = sort_order.lower() == "desc"
+        keys = column[rows]
+
+        if keys.dtype.kind == "U":
+            order = np.argsort(keys, kind="stable")
+            if descending:
+                order = order[::-1]
+            return rows[order[:limit]]
+
+        # 统一按升序处理，缺失值排在最后
+        keys = -keys if descending else keys.copy()
+        keys[np.isnan(keys)] = np.inf
+
+        if limit < len(keys):
+            part = np.argpartition(keys, limit - 1)[:limit]
+            order = part[np.argsort(keys[part], kind="stable")]
+        else:
+            order = np.argsort(keys, kind="stable")
+
+        return rows[order]
 
     @staticmethod
     def get_available_fields() -> Dict[str, Dict[str, str]]:
@@ -237,17 +258,38 @@ class ScreenerEngine:
             "pe": {
                 "name": "市盈率",
                 "type": "number",
-                "description": "静态市盈率",
+                "description": "动态市盈率",
             },
             "pb": {
                 "name": "市净率",
                 "type": "number",
                 "description": "市净率",
             },
-            "roe": {
-                "name": "净资产收益率",
+            "total_mv": {
+                "name": "总市值",
+                "type": "number",
+                "description": "总市值（元）",
+            },
+            "circ_mv": {
+                "name": "流通市值",
+                "type": "number",
+                "description": "流通市值（元）",
+            },
+            # 交易活跃度
+            "turnover": {
+                "name": "换手率",
+                "type": "number",
+                "description": "换手率 (%)",
+            },
+            "volume_ratio": {
+                "name": "量比",
+                "type": "number",
+                "description": "量比",
+            },
+            "amplitude": {
+                "name": "振幅",
                 "type": "number",
-                "description": "ROE (%)",
+                "description": "当日振幅 (%)",
             },
             # 字符串字段
             "name": {
@@ -0,0 +1,74 @@
+"""技术指标性能基准 (NumPy 内核 vs pandas 参考实现)
+
+运行: python -m tests.bench_indicators
+"""
+import sys
+import time
+
+sys.path.insert(0, '.')
+
+from app.services.indicators import kernels, technical_calculator
+from tests.test_indicators import (
+    pandas_boll,
+    pandas_cci,
+    pandas_ema,
+    pandas_kdj,
+    pandas_macd,
+    pandas_rsi,
+    pandas_sma,
+    pandas_wr,
+    random_bars,
+)
+
+SIZES = (250, 5_000, 1_000_000)
+
+
+def timeit(func, repeat: int) -> float:
+    """多次运行取最短耗时 (毫秒)"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def cases(high, low, close):
+    """指标名 -> (NumPy 内核, pandas 参考实现)"""
+    return {
+        "sma(20)": (lambda: kernels.sma(close, 20), lambda: pandas_sma(close, 20)),
+        "ema(12)": (lambda: kernels.ema(close, 12), lambda: pandas_ema(close, 12)),
+        "macd": (lambda: kernels.macd(close), lambda: pandas_macd(close)),
+        "rsi(14)": (lambda: kernels.rsi(close, 14), lambda: pandas_rsi(close, 14)),
+        "kdj": (lambda: kernels.kdj(high, low, close), lambda: pandas_kdj(high, low, close)),
+        "boll(20)": (lambda: kernels.bollinger_bands(close), lambda: pandas_boll(close)),
+        "cci(14)": (lambda: kernels.cci(high, low, close), lambda: pandas_cci(high, low, close)),
+        "wr(14)": (lambda: kernels.wr(high, low, close), lambda: pandas_wr(high, low, close)),
+    }
+
+
+def main():
+    print(f"{'bars':>9} {'indicator':<10} {'numpy ms':>10} {'pandas ms':>10} {'speedup':>8}")
+    for size in SIZES:
+        high, low, close = random_bars(size)
+        repeat = 50 if size <= 5_000 else 3
+        for name, (kernel, reference) in cases(high, low, close).items():
+            # CCI 的 pandas 参考实现逐窗口调用 Python 函数，百万级数据跳过
+            if name.startswith("cci") and size > 5_000:
+                numpy_ms = timeit(kernel, repeat)
+                print(f"{size:>9} {name:<10} {numpy_ms:>10.3f} {'-':>10} {'-':>8}")
+                continue
+            numpy_ms = timeit(kernel, repeat)
+            pandas_ms = timeit(reference, repeat)
+            print(
+                f"{size:>9} {name:<10} {numpy_ms:>10.3f} {pandas_ms:>10.3f} "
+                f"{pandas_ms / numpy_ms:>7.1f}x"
+            )
+
+        close_list = close.tolist()
+        list_ms = timeit(lambda: technical_calculator.ema(close_list, 12), repeat)
+        print(f"{size:>9} {'ema list':<10} {list_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -132,6 +132,17 @@ def mock_kline_data():
     return data
 
 
+@pytest.fixture
+def mock_kline_bars(mock_kline_data):
+    """模拟列式 K线数据"""
+    import numpy as np
+    bars = {"date": np.array([k["date"] for k in mock_kline_data], dtype="datetime64[D]")}
+    bars["open_price"] = np.array([k["open"] for k in mock_kline_data], dtype=float)
+    for column in ("high", "low", "close", "volume", "amount"):
+        bars[column] = np.array([k[column] for k in mock_kline_data], dtype=float)
+    return bars
+
+
 @pytest.fixture
 def mock_fundamental_data():
     """模拟基本面数据"""
@@ -1,8 +1,11 @@
 """测试 API 端点"""
+import numpy as np
 import pytest
 from unittest.mock import AsyncMock, patch
 from httpx import AsyncClient
 
+from app.services.data import AkshareService
+
 
 class TestHealthEndpoints:
     """健康检查端点测试"""
@@ -70,6 +73,7 @@ class TestStockAPI:
         with patch("app.api.v1.stock.akshare") as mock_akshare:
             with patch("app.api.v1.stock.cache") as mock_cache:
                 mock_akshare.get_kline_data = AsyncMock(return_value=mock_kline_data)
+                mock_akshare.adjust_version = AsyncMock(return_value="none")
                 mock_cache.get = AsyncMock(return_value=None)
                 mock_cache.set = AsyncMock(return_value=None)
 
@@ -83,6 +87,56 @@ class TestStockAPI:
                 assert "open" in data[0]
                 assert "close" in data[0]
 
+    async def test_get_kline_data_columnar(self, ac: AsyncClient, mock_kline_bars):
+        """测试列式 K线数据"""
+        mock_kline_bars["close"][3] = float("nan")
+        with patch("app.api.v1.stock.akshare") as mock_akshare:
+            mock_akshare.get_kline_bars = AsyncMock(return_value=mock_kline_bars)
+
+            response = await ac.get(
+                "/api/v1/stocks/600519/kline",
+                params={"format": "columnar", "date_format": "epoch", "precision": "float32"},
+                headers={"Accept-Encoding": "gzip"},
+            )
+            assert response.status_code == 200
+            assert response.headers["content-encoding"] == "gzip"
+
+            data = response.json()
+            assert len(data["date"]) == len(data["close"]) == len(mock_kline_bars["date"])
+            assert data["date"][0] == int(mock_kline_bars["date"][0].astype(int))
+            assert data["close"][3] is None
+            assert data["high"][0] == float(np.float32(mock_kline_bars["high"][0]))
+            assert data["amount"][0] == mock_kline_bars["amount"][0]
+
+    async def test_get_kline_data_downsampled(self, ac: AsyncClient, mock_kline_bars):
+        """测试 K线按 OHLC 分桶降采样"""
+        with patch("app.api.v1.stock.akshare") as mock_akshare:
+            mock_akshare.get_kline_bars = AsyncMock(return_value=mock_kline_bars)
+
+            response = await ac.get("/api/v1/stocks/600519/kline", params={"max_points": 10})
+            assert response.status_code == 200
+
+            data = response.json()
+            assert len(data) == 10
+            assert data[0]["open_price"] == mock_kline_bars["open_price"][0]
+            assert data[-1]["close"] == mock_kline_bars["close"][-1]
+            assert max(k["high"] for k in data) == mock_kline_bars["high"].max()
+
+    async def test_get_kline_data_errors(self, ac: AsyncClient, mock_kline_bars):
+        """测试无效周期/复权返回 400，上游失败返回 500"""
+        with patch("app.api.v1.stock.akshare") as mock_akshare:
+            mock_akshare.get_kline_bars = AsyncMock(side_effect=ValueError("不支持的K线周期: foo"))
+            mock_akshare.adjust_version = AsyncMock(return_value="none")
+
+            response = await ac.get("/api/v1/stocks/600519/kline", params={"format": "columnar", "period": "foo"})
+            assert response.status_code == 400
+            response = await ac.get("/api/v1/stocks/600519/kline", params={"period": "foo"})
+            assert response.status_code == 400
+
+            mock_akshare.get_kline_bars = AsyncMock(side_effect=RuntimeError("upstream"))
+            response = await ac.get("/api/v1/stocks/600519/kline", params={"format": "columnar"})
+            assert response.status_code == 500
+
     async def test_get_fundamental_data(self, ac: AsyncClient, mock_fundamental_data):
         """测试获取基本面数据"""
         with patch("app.api.v1.stock.akshare") as mock_akshare:
@@ -99,10 +153,11 @@ class TestStockAPI:
                 assert "pe" in data
                 assert "pb" in data
 
-    async def test_get_technical_indicator_sma(self, ac: AsyncClient, mock_kline_data):
+    async def test_get_technical_indicator_sma(self, ac: AsyncClient, mock_kline_bars):
         """测试计算 SMA 指标"""
         with patch("app.api.v1.stock.akshare") as mock_akshare:
-            mock_akshare.get_kline_data = AsyncMock(return_value=mock_kline_data)
+            mock_akshare.kline_range = AkshareService.kline_range
+            mock_akshare.get_kline_history = AsyncMock(return_value=mock_kline_bars)
 
             response = await ac.get("/api/v1/stocks/600519/indicators/sma")
             assert response.status_code == 200
@@ -112,10 +167,11 @@ class TestStockAPI:
             assert "values" in data
             assert "SMA" in data["name"]
 
-    async def test_get_technical_indicator_macd(self, ac: AsyncClient, mock_kline_data):
+    async def test_get_technical_indicator_macd(self, ac: AsyncClient, mock_kline_bars):
         """测试计算 MACD 指标"""
         with patch("app.api.v1.stock.akshare") as mock_akshare:
-            mock_akshare.get_kline_data = AsyncMock(return_value=mock_kline_data)
+            mock_akshare.kline_range = AkshareService.kline_range
+            mock_akshare.get_kline_history = AsyncMock(return_value=mock_kline_bars)
 
             response = await ac.get("/api/v1/stocks/600519/indicators/macd")
             assert response.status_code == 200
@@ -125,14 +181,66 @@ class TestStockAPI:
             assert "signal" in data
             assert "histogram" in data
 
-    async def test_get_technical_indicator_invalid(self, ac: AsyncClient, mock_kline_data):
+    async def test_get_technical_indicators_batch(self, ac: AsyncClient, mock_kline_bars):
+        """测试批量计算指标"""
+        with patch("app.api.v1.stock.akshare") as mock_akshare:
+            mock_akshare.kline_range = AkshareService.kline_range
+            mock_akshare.get_kline_history = AsyncMock(return_value=mock_kline_bars)
+
+            response = await ac.get(
+                "/api/v1/stocks/600519/indicators",
+                params=[("spec", "sma:5"), ("spec", "macd"), ("spec", "kdj")],
+            )
+            assert response.status_code == 200
+
+            data = response.json()
+            assert len(data["dates"]) == len(mock_kline_bars["date"])
+            assert set(data["indicators"]) == {"sma:5", "macd:12,26,9", "kdj:9,3,3"}
+            assert "histogram" in data["indicators"]["macd:12,26,9"]
+
+            response = await ac.get("/api/v1/stocks/600519/indicators", params={"spec": "foo"})
+            assert response.status_code == 400
+
+            response = await ac.get(
+                "/api/v1/stocks/600519/indicators",
+                params={"spec": "sma:5", "format": "columnar"},
+            )
+            assert response.status_code == 200
+
+            data = response.json()
+            assert data["dates"][0] == str(mock_kline_bars["date"][0])
+            assert data["indicators"]["sma:5"]["values"][:4] == [None] * 4
+
+            response = await ac.get(
+                "/api/v1/stocks/600519/indicators",
+                params=[("spec", "sma:5"), ("spec", "macd"), ("max_points", "10")],
+            )
+            assert response.status_code == 200
+
+            data = response.json()
+            assert len(data["dates"]) == 10
+            assert len(data["indicators"]["macd:12,26,9"]["signal"]) == 10
+
+    async def test_get_technical_indicator_invalid(self, ac: AsyncClient, mock_kline_bars):
         """测试无效指标"""
         with patch("app.api.v1.stock.akshare") as mock_akshare:
-            mock_akshare.get_kline_data = AsyncMock(return_value=mock_kline_data)
+            mock_akshare.get_kline_history = AsyncMock(return_value=mock_kline_bars)
 
             response = await ac.get("/api/v1/stocks/600519/indicators/invalid")
             assert response.status_code == 400
 
+    async def test_get_technical_indicator_errors(self, ac: AsyncClient):
+        """测试单个指标接口保留 K 线加载的 400/500 状态码"""
+        with patch("app.api.v1.stock.akshare") as mock_akshare:
+            mock_akshare.kline_range = AkshareService.kline_range
+            mock_akshare.get_kline_history = AsyncMock(side_effect=ValueError("不支持的复权类型: x"))
+            response = await ac.get("/api/v1/stocks/600519/indicators/sma")
+            assert response.status_code == 400
+
+            mock_akshare.get_kline_history = AsyncMock(side_effect=RuntimeError("upstream"))
+            response = await ac.get("/api/v1/stocks/600519/indicators/sma")
+            assert response.status_code == 500
+
 
 class TestLLMAPI:
     """LLM 配置 API 测试"""
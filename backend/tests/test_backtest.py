@@ -0,0 +1,665 @@
+"""测试回测引擎"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models.analysis import BacktestJobStatus
+from app.services.backtest import BacktestEngine, BacktestJobService, ParameterOptimizer, jobs
+from app.services.backtest.execution import BUY, SELL, execute_signals, signal_arrays
+from app.services.backtest.optimizer import combinations, evaluate, parameter_values, rank
+from app.services.backtest.portfolio import PortfolioBacktestEngine, attribution, simulate
+from app.services.backtest import vectorized
+from app.services.backtest.vectorized import backtest, run_actions, window_mean
+from app.services.data.cache import CacheService
+from app.services.data.convert import bars_to_records
+from app.services.data.kline_store import KLINE_COLUMNS
+
+
+def make_data(size: int = 500, seed: int = 3) -> list[dict]:
+    """构造随机游走的日线记录"""
+    rng = np.random.default_rng(seed)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, size)))
+    dates = np.datetime64("2005-01-04") + np.arange(size)
+    return [{"date": str(day), "close": float(price)} for day, price in zip(dates, close)]
+
+
+def make_signals(data: list[dict], count: int, seed: int = 5) -> list[dict]:
+    """随机买卖信号 (含同一根 K 线上的多个信号和越界下标)"""
+    rng = np.random.default_rng(seed)
+    signals = []
+    for i in rng.integers(-2, len(data) + 2, count).tolist():
+        price = data[min(max(i, 0), len(data) - 1)]["close"]
+        signals.append({"index": i, "action": rng.choice(["buy", "sell"]), "price": price})
+    return signals
+
+
+def reference_execute(data, signals, initial_capital):
+    """逐 K 线扫描信号列表的参考实现"""
+    capital = initial_capital
+    position = 0
+    trades = []
+    equity_curve = []
+
+    for i, d in enumerate(data):
+        for signal in signals:
+            if signal["index"] == i:
+                if signal["action"] == "buy" and capital > 0:
+                    shares = capital // signal["price"]
+                    if shares > 0:
+                        position = shares
+                        capital = capital - shares * signal["price"]
+                        trades.append({
+                            "date": d["date"],
+                            "action": "buy",
+                            "price": signal["price"],
+                            "shares": shares,
+                        })
+                elif signal["action"] == "sell" and position > 0:
+                    capital = capital + position * signal["price"]
+                    trades.append({
+                        "date": d["date"],
+                        "action": "sell",
+                        "price": signal["price"],
+                        "shares": position,
+                    })
+                    position = 0
+
+        equity_curve.append({"date": d["date"], "equity": capital + position * d["close"]})
+
+    final_capital = capital + position * data[-1]["close"]
+    returns = [
+        (equity_curve[i]["equity"] - equity_curve[i - 1]["equity"]) / equity_curve[i - 1]["equity"]
+        for i in range(1, len(equity_curve))
+    ]
+
+    peak = equity_curve[0]["equity"]
+    max_drawdown = 0
+    for item in equity_curve:
+        if item["equity"] > peak:
+            peak = item["equity"]
+        max_drawdown = max(max_drawdown, (peak - item["equity"]) / peak * 100)
+
+    return {
+        "total_return": ((final_capital - initial_capital) / initial_capital) * 100,
+        "final_capital": final_capital,
+        "trades": trades,
+        "total_trades": len([t for t in trades if t["action"] == "sell"]),
+        "equity_curve": equity_curve,
+        "max_drawdown": max_drawdown,
+        "returns": returns,
+    }
+
+
+class TestExecution:
+    """交易执行测试"""
+
+    @pytest.mark.parametrize("count", [0, 1, 40, 400])
+    def test_matches_reference(self, count):
+        """测试与逐 K 线扫描的实现结果完全一致"""
+        engine = BacktestEngine(data_service=None)
+        data = make_data()
+        signals = make_signals(data, count)
+
+        result = engine._execute_trades(data, signals, 100000.0)
+        expected = reference_execute(data, signals, 100000.0)
+
+        for key in ("total_return", "final_capital", "trades", "total_trades", "equity_curve", "max_drawdown"):
+            assert result[key] == expected[key], key
+        assert result["sharpe_ratio"] == (
+            engine._calculate_sharpe_ratio(expected["returns"]) if expected["returns"] else 0
+        )
+
+    def test_signal_arrays_keep_order(self):
+        """测试同一根 K 线上的信号保持原有顺序"""
+        signals = [
+            {"index": 3, "action": "sell", "price": 11.0},
+            {"index": 1, "action": "buy", "price": 10.0},
+            {"index": 3, "action": "buy", "price": 12.0},
+        ]
+        index, action, price = signal_arrays(signals)
+
+        np.testing.assert_array_equal(index, [1, 3, 3])
+        np.testing.assert_array_equal(action, [BUY, SELL, BUY])
+        np.testing.assert_array_equal(price, [10.0, 11.0, 12.0])
+
+    def test_state_arrays(self):
+        """测试逐日现金、持仓只在信号处变化"""
+        close = np.array([10.0, 10.0, 12.0, 12.0, 15.0])
+        index, action, price = signal_arrays(
+            [
+                {"index": 1, "action": "buy", "price": 10.0},
+                {"index": 3, "action": "sell", "price": 12.0},
+            ]
+        )
+        execution = execute_signals(close, index, action, price, 105.0)
+
+        np.testing.assert_array_equal(execution.position, [0, 10, 10, 0, 0])
+        np.testing.assert_array_equal(execution.cash, [105, 5, 5, 125, 125])
+        np.testing.assert_array_equal(execution.equity, [105, 105, 125, 125, 125])
+        assert execution.trades(["d0", "d1", "d2", "d3", "d4"]) == [
+            {"date": "d1", "action": "buy", "price": 10.0, "shares": 10.0},
+            {"date": "d3", "action": "sell", "price": 12.0, "shares": 10.0},
+        ]
+
+    def test_long_history_speed(self):
+        """测试 20 年日线的执行耗时为每根 K 线微秒级"""
+        engine = BacktestEngine(data_service=None)
+        data = make_data(5000)
+        signals = make_signals(data, 500)
+
+        started = time.perf_counter()
+        engine._execute_trades(data, signals, 100000.0)
+        elapsed = time.perf_counter() - started
+
+        assert elapsed / len(data) < 50e-6
+
+
+class TestVectorized:
+    """向量化回测测试"""
+
+    CASES = [
+        ("sma_cross", {}),
+        ("sma_cross", {"short_period": 10, "long_period": 60}),
+        ("macd", {}),
+        ("macd", {"fast_period": 6, "slow_period": 19, "signal_period": 5}),
+        ("rsi", {}),
+        ("rsi", {"period": 6, "oversold": 25, "overbought": 75}),
+        ("boll", {}),
+        ("boll", {"period": 10, "std_dev": 1.5}),
+    ]
+
+    EVENT_STRATEGIES = {
+        "sma_cross": "_sma_cross_strategy",
+        "macd": "_macd_strategy",
+        "rsi": "_rsi_strategy",
+        "boll": "_boll_strategy",
+    }
+
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    @pytest.mark.parametrize("strategy_type,params", CASES)
+    def test_matches_event_loop(self, strategy_type, params, seed):
+        """测试向量化回测与事件循环的成交和权益曲线一致"""
+        engine = BacktestEngine(data_service=None)
+        data = make_data(1000, seed)
+        # 较小的资金使剩余现金经常够再买入，覆盖持仓的边界情况
+        for capital in (100000.0, 37.5):
+            strategy = getattr(engine, self.EVENT_STRATEGIES[strategy_type])
+            expected = strategy(data, params, capital)
+            result = engine._vectorized_strategy(data, strategy_type, params, capital)
+
+            assert result["trades"] == expected["trades"]
+            assert result["equity_curve"] == expected["equity_curve"]
+            assert result["total_trades"] == expected["total_trades"]
+            assert result["final_capital"] == expected["final_capital"]
+            assert result["max_drawdown"] == expected["max_drawdown"]
+            assert result["sharpe_ratio"] == pytest.approx(expected["sharpe_ratio"], rel=1e-9, abs=1e-12)
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_fill_signals_matches_execution(self, seed):
+        """测试状态机找出的成交与逐个信号执行一致"""
+        rng = np.random.default_rng(seed)
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.05, 800)))
+        actions = rng.choice([BUY, SELL, 0], 800, p=[0.3, 0.2, 0.5]).astype(np.int8)
+
+        index = np.flatnonzero(actions)
+        expected = execute_signals(close, index, actions[index], close[index], 25.0)
+        result = run_actions(close, actions, 25.0)
+
+        np.testing.assert_array_equal(result.equity, expected.equity)
+        np.testing.assert_array_equal(result.trade_index, expected.trade_index)
+        np.testing.assert_array_equal(result.trade_shares, expected.trade_shares)
+
+    def test_window_mean_matches_event_sma(self):
+        """测试 SMA 与事件循环逐位相同"""
+        engine = BacktestEngine(data_service=None)
+        close = [d["close"] for d in make_data(300)]
+
+        expected = engine._calculate_sma(close, 20)
+        result = window_mean(np.array(close), 20)
+        assert [None if np.isnan(v) else v for v in result.tolist()] == expected
+
+    async def test_run_uses_vectorized_by_default(self):
+        """测试信号类策略默认走向量化回测，可切换为事件循环"""
+        records = make_data(300)
+        data_service = MagicMock()
+        data_service.get_kline_data = AsyncMock(return_value=records)
+        engine = BacktestEngine(data_service)
+
+        with patch.object(engine, "_sma_cross_strategy", wraps=engine._sma_cross_strategy) as event:
+            vector = await engine.run("600519", "sma_cross", {}, "20050101", "20051231")
+            assert event.call_count == 0
+            loop = await engine.run("600519", "sma_cross", {}, "20050101", "20051231", mode="event")
+            assert event.call_count == 1
+
+        assert vector["success"] and loop["success"]
+        assert vector["trades"] == loop["trades"]
+        assert vector["benchmark_return"] == loop["benchmark_return"]
+
+    def test_throughput(self):
+        """测试 5 年日线的向量化回测每秒可运行上千次"""
+        close = np.array([d["close"] for d in make_data(1250)])
+
+        started = time.perf_counter()
+        for short_period in range(2, 22):
+            backtest(close, "sma_cross", {"short_period": short_period, "long_period": 30}, 100000.0)
+        elapsed = (time.perf_counter() - started) / 20
+
+        assert elapsed < 1e-3
+
+
+class TestOptimizer:
+    """参数寻优测试"""
+
+    def test_values_from_templates(self):
+        """测试默认使用策略模板的参数范围"""
+        values = parameter_values("sma_cross")
+        assert values["short_period"].tolist() == list(range(2, 61))
+        assert values["long_period"].dtype.kind == "i"
+
+        values = parameter_values("boll", {"period": {"values": [20, 10, 20]}})
+        assert values["period"].tolist() == [10, 20]
+        assert len(values["std_dev"]) == 21
+        assert values["std_dev"][-1] == 3.0
+
+    @pytest.mark.parametrize(
+        "strategy_type,ranges",
+        [
+            ("buy_hold", None),
+            ("sma_cross", {"unknown": {"min": 1}}),
+            ("sma_cross", {"short_period": {"min": 10, "max": 5}}),
+            ("sma_cross", {"short_period": {"min": 2.5, "max": 5}}),
+            ("sma_cross", {"short_period": {"values": [0, 5]}}),
+        ],
+    )
+    def test_invalid_ranges(self, strategy_type, ranges):
+        """测试不支持的策略和无效范围"""
+        with pytest.raises(ValueError):
+            parameter_values(strategy_type, ranges)
+
+    def test_grid_constraints(self):
+        """测试网格搜索只保留满足约束的组合"""
+        rows = combinations("sma_cross", parameter_values("sma_cross"))
+        assert len(rows) == sum(1 for s in range(2, 61) for long_ in range(5, 201) if s < long_)
+        assert np.all(rows[:, 0] < rows[:, 1])
+
+        with patch.object(settings, "OPTIMIZE_MAX_COMBINATIONS", 1000):
+            with pytest.raises(ValueError):
+                combinations("sma_cross", parameter_values("sma_cross"))
+
+    def test_random_samples(self):
+        """测试随机搜索抽取不重复、满足约束的组合，种子相同时结果相同"""
+        values = parameter_values("macd")
+        with patch.object(settings, "OPTIMIZE_MAX_COMBINATIONS", 100000):
+            rows = combinations("macd", values, "random", 500, seed=7)
+            assert len(rows) == 500
+            assert len(np.unique(rows, axis=0)) == 500
+            assert np.all(rows[:, 0] < rows[:, 1])
+            np.testing.assert_array_equal(rows, combinations("macd", values, "random", 500, seed=7))
+
+        # 组合空间超过上限时按参数独立抽样
+        with patch.object(settings, "OPTIMIZE_MAX_COMBINATIONS", 1000):
+            rows = combinations("macd", values, "random", 300, seed=7)
+            assert len(rows) == 300
+            assert np.all(rows[:, 0] < rows[:, 1])
+
+    def test_evaluate_matches_backtest(self):
+        """测试寻优指标与单次回测一致 (共享缓存不影响结果)"""
+        engine = BacktestEngine(data_service=None)
+        data = make_data(600)
+        close = np.array([d["close"] for d in data])
+        rows = np.array([[5.0, 20.0], [5.0, 30.0], [8.0, 20.0]])
+
+        metrics = evaluate(close, "sma_cross", ["short_period", "long_period"], [True, True], rows, 1e5, {})
+        for row, values in zip(rows.astype(int).tolist(), metrics):
+            params = {"short_period": row[0], "long_period": row[1]}
+            expected = engine._vectorized_strategy(data, "sma_cross", params, 1e5)
+            assert values[0] == expected["total_return"]
+            assert values[1] == expected["sharpe_ratio"]
+            assert values[2] == expected["max_drawdown"]
+            assert values[3] == expected["total_trades"]
+
+    def test_rank(self):
+        """测试按目标函数排序和回撤约束"""
+        rows = np.array([[1.0], [2.0], [3.0]])
+        metrics = np.array([
+            [30.0, 1.0, 40.0, 3],
+            [20.0, 2.0, 10.0, 2],
+            [10.0, 0.5, 0.5, 1],
+        ])
+
+        results, feasible = rank(rows, metrics, ["period"], [True], "total_return")
+        assert [r["params"]["period"] for r in results] == [1, 2, 3]
+        assert feasible == 3
+
+        results, _ = rank(rows, metrics, ["period"], [True], "sharpe_ratio", top_n=1)
+        assert results[0]["params"] == {"period": 2} and results[0]["rank"] == 1
+
+        results, feasible = rank(rows, metrics, ["period"], [True], "return_drawdown", max_drawdown=20)
+        assert [r["params"]["period"] for r in results] == [3, 2]
+        assert results[0]["score"] == 10.0
+        assert feasible == 2
+
+    async def test_process_pool_matches_thread(self):
+        """测试进程池 (共享内存) 与线程中计算的排名一致"""
+        data_service = MagicMock()
+        data_service.get_kline_data = AsyncMock(return_value=make_data(400))
+        ranges = {"short_period": {"min": 2, "max": 20}, "long_period": {"min": 10, "max": 60}}
+
+        with patch.object(settings, "OPTIMIZE_PARALLEL_MIN", 10**6):
+            thread = await ParameterOptimizer(data_service).optimize(
+                "600519", "sma_cross", "20050101", "20061231", param_ranges=ranges, top_n=50
+            )
+        assert thread["success"] and thread["workers"] == 1
+
+        pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            with patch.object(settings, "OPTIMIZE_PARALLEL_MIN", 1):
+                parallel = await ParameterOptimizer(data_service, pool).optimize(
+                    "600519", "sma_cross", "20050101", "20061231", param_ranges=ranges, top_n=50
+                )
+        finally:
+            pool.shutdown()
+
+        assert parallel["success"]
+        assert parallel["combinations"] == thread["combinations"] == 19 * 51 - sum(
+            1 for s in range(2, 21) for long_ in range(10, 61) if s >= long_
+        )
+        assert parallel["results"] == thread["results"]
+        assert data_service.get_kline_data.await_count == 2
+
+    async def test_optimize_errors(self):
+        """测试数据不足和无效参数返回失败"""
+        data_service = MagicMock()
+        data_service.get_kline_data = AsyncMock(return_value=make_data(30))
+        optimizer = ParameterOptimizer(data_service)
+
+        result = await optimizer.optimize("600519", "sma_cross", "20050101", "20051231")
+        assert not result["success"]
+
+        result = await optimizer.optimize("600519", "buy_hold", "20050101", "20051231")
+        assert not result["success"] and "buy_hold" in result["error"]
+
+
+def make_bars(seed: int, size: int = 400, start: int = 0, gaps: float = 0.0) -> dict:
+    """构造列式日线 (start 之前未上市，gaps 为停牌比例)"""
+    rng = np.random.default_rng(seed)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, size)))
+    dates = np.datetime64("2005-01-04") + np.arange(size)
+    keep = rng.random(size) >= gaps
+    keep[:start] = False
+    return {"date": dates[keep], "close": close[keep]}
+
+
+class TestPortfolio:
+    """组合回测测试"""
+
+    def test_single_symbol_matches_backtest(self):
+        """测试单只股票等权组合与单股票向量化回测一致"""
+        close = np.array([d["close"] for d in make_data(800)])
+        for strategy_type, params in TestVectorized.CASES:
+            # 只保留买卖交替的信号 (单股票回测在持仓时买入会覆盖持仓，组合回测忽略)
+            actions = vectorized.STRATEGY_ACTIONS[strategy_type](close, params)
+            expected_action = BUY
+            for i in np.flatnonzero(actions).tolist():
+                if actions[i] == expected_action:
+                    expected_action = -expected_action
+                else:
+                    actions[i] = 0
+
+            execution = simulate(close[None, :], actions[None, :], 100000.0)
+            expected = run_actions(close, actions, 100000.0)
+
+            np.testing.assert_array_equal(execution.equity, expected.equity)
+            np.testing.assert_array_equal(execution.trade_index, expected.trade_index)
+            np.testing.assert_array_equal(execution.trade_shares, expected.trade_shares)
+
+    def test_max_positions(self):
+        """测试持仓数上限和按股票池顺序买入"""
+        close = np.full((3, 4), 10.0)
+        actions = np.array([
+            [0, BUY, 0, SELL],
+            [BUY, 0, 0, SELL],
+            [BUY, 0, BUY, 0],
+        ], dtype=np.int8)
+        execution = simulate(close, actions, 1000.0, max_positions=2)
+
+        np.testing.assert_array_equal(execution.positions, [2, 2, 2, 1])
+        # 第 0 天后两只占满仓位，第 0 只在第 1 天的买入和第 3 天的卖出都被忽略
+        assert execution.trade_row.tolist() == [1, 2, 1]
+        np.testing.assert_array_equal(execution.trade_shares, [50, 50, 50])
+        np.testing.assert_array_equal(execution.equity, [1000.0] * 4)
+
+    def test_fixed_cash(self):
+        """测试每仓固定金额，现金不足时跳过"""
+        close = np.array([[10.0, 11.0], [20.0, 21.0], [30.0, 31.0]])
+        actions = np.array([[BUY, 0], [BUY, 0], [BUY, 0]], dtype=np.int8)
+        execution = simulate(close, actions, 700.0, "fixed_cash", slot_cash=300.0)
+
+        assert execution.trade_row.tolist() == [0, 1, 2]
+        np.testing.assert_array_equal(execution.trade_shares, [30, 15, 3])
+        np.testing.assert_array_equal(execution.cash, [10.0, 10.0])
+        np.testing.assert_array_equal(execution.equity, [700.0, 10.0 + 330 + 315 + 93])
+
+        with pytest.raises(ValueError):
+            simulate(close, actions, 700.0, "fixed_cash")
+
+    def test_suspension_valuation(self):
+        """测试停牌日按最近收盘价估值，上市前不持仓"""
+        close = np.array([[10.0, np.nan, np.nan, 12.0], [np.nan, np.nan, 5.0, 6.0]])
+        actions = np.array([[BUY, 0, 0, 0], [0, 0, BUY, 0]], dtype=np.int8)
+        execution = simulate(close, actions, 200.0)
+
+        np.testing.assert_array_equal(execution.values[0], [100.0, 100.0, 100.0, 120.0])
+        np.testing.assert_array_equal(execution.values[1], [0.0, 0.0, 100.0, 120.0])
+        np.testing.assert_array_equal(execution.equity, [200.0, 200.0, 200.0, 240.0])
+
+    def test_attribution_sums_to_total(self):
+        """测试各股票盈亏之和等于组合盈亏"""
+        bars = [make_bars(seed, start=seed * 20, gaps=0.05) for seed in range(8)]
+        panel_dates = np.unique(np.concatenate([b["date"] for b in bars]))
+        close = np.full((len(bars), len(panel_dates)), np.nan)
+        actions = np.zeros(close.shape, dtype=np.int8)
+        for i, b in enumerate(bars):
+            columns = np.searchsorted(panel_dates, b["date"])
+            close[i, columns] = b["close"]
+            actions[i, columns] = vectorized.STRATEGY_ACTIONS["sma_cross"](b["close"], {})
+
+        execution = simulate(close, actions, 100000.0, max_positions=3)
+        result = attribution(execution, 100000.0)
+
+        assert execution.positions.max() == 3
+        assert result["pnl"].sum() == pytest.approx(execution.equity[-1] - 100000.0)
+        assert result["total_trades"].sum() == np.count_nonzero(execution.trade_action == SELL)
+        assert np.all(result["win_trades"] <= result["total_trades"])
+
+    async def test_run(self):
+        """测试并发加载、跳过无数据的股票并返回归因"""
+        data = {f"60000{i}": make_bars(i, start=i * 10) for i in range(5)}
+        data["600009"] = {"date": np.array([], dtype="datetime64[D]"), "close": np.array([])}
+
+        async def get_kline_bars(code, **kwargs):
+            if code == "600008":
+                raise RuntimeError("upstream error")
+            return data[code]
+
+        data_service = MagicMock()
+        data_service.get_kline_bars = AsyncMock(side_effect=get_kline_bars)
+        engine = PortfolioBacktestEngine(data_service)
+
+        result = await engine.run(
+            [*data, "600008", "600000"], "sma_cross", {}, "20050101", "20061231", max_positions=2
+        )
+
+        assert result["success"]
+        assert result["stock_pool"] == [f"60000{i}" for i in range(5)]
+        assert result["skipped"] == ["600009", "600008"]
+        assert data_service.get_kline_bars.await_count == 7
+        assert len(result["equity_curve"]) == 400
+        assert max(point["positions"] for point in result["equity_curve"]) <= 2
+        assert sum(item["pnl"] for item in result["attribution"]) == pytest.approx(
+            result["final_capital"] - 100000.0
+        )
+        assert {trade["code"] for trade in result["trades"]} <= set(result["stock_pool"])
+
+        result = await engine.run(["600000"], "unknown", {}, "20050101", "20061231")
+        assert not result["success"]
+
+
+def make_kline_bars(size: int = 300, seed: int = 3) -> dict:
+    """构造包含全部列的列式日线"""
+    bars = make_bars(seed, size)
+    for column in KLINE_COLUMNS[1:]:
+        bars.setdefault(column, bars["close"].copy())
+    return bars
+
+
+class TestBacktestJobs:
+    """异步回测任务测试"""
+
+    REQUEST = {
+        "stock_code": "600519",
+        "strategy_type": "sma_cross",
+        "strategy_params": {"short_period": 5},
+        "start_date": "20050101",
+        "end_date": "20051231",
+    }
+
+    @pytest.fixture
+    def executor(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        yield executor
+        executor.shutdown()
+
+    @staticmethod
+    def make_service(bars, executor, cache_service=None):
+        data_service = MagicMock()
+        data_service.get_kline_bars = AsyncMock(side_effect=lambda *args, **kwargs: bars)
+        cache_service = cache_service or CacheService()
+        return BacktestJobService(data_service, cache_service, executor)
+
+    async def test_result_matches_engine(self, executor):
+        """测试任务结果与直接回测一致"""
+        bars = make_kline_bars()
+        service = self.make_service(bars, executor)
+
+        result = await service.run(self.REQUEST)
+
+        data_service = MagicMock()
+        data_service.get_kline_data = AsyncMock(return_value=bars_to_records(bars))
+        expected = await BacktestEngine(data_service).run(**self.REQUEST)
+        # 结果经缓存编码保存 (日期为 ISO 字符串)
+        assert result == service.cache_service.codec.decode(service.cache_service.codec.encode(expected))
+        assert service.stats["computed"] == 1
+
+    async def test_identical_requests_reuse_result(self, executor):
+        """测试相同请求 (含显式的默认参数) 不重复计算，其他进程从缓存取回"""
+        bars = make_kline_bars()
+        cache_service = CacheService()
+        service = self.make_service(bars, executor, cache_service)
+
+        with patch.object(jobs, "run_backtest", wraps=jobs.run_backtest) as run:
+            first, second = await asyncio.gather(
+                service.submit(self.REQUEST),
+                service.submit({**self.REQUEST, "strategy_params": {"short_period": 5, "long_period": 20}}),
+            )
+            assert first is second
+            result = await service.run(self.REQUEST)
+            assert run.call_count == 1
+
+            # 另一个 worker (新的服务实例共享结果存储)
+            other = self.make_service(bars, executor, cache_service)
+            job = await other.submit(self.REQUEST)
+            assert job.task_id == first.task_id
+            assert job.status == BacktestJobStatus.COMPLETED and job.cached
+            assert await other.result(job.task_id) == result
+            assert (await other.get(job.task_id)).status == BacktestJobStatus.COMPLETED
+            assert run.call_count == 1
+
+        # 第二次提交和 run 都命中同一任务 (计算中或已完成)
+        assert service.stats["inflight_hits"] + service.stats["stored_hits"] == 2
+
+    async def test_concurrent_submissions_compute_once(self, executor):
+        """测试查询结果存储期间并发提交的相同请求只计算一次"""
+        cache_service = CacheService()
+
+        async def exists(key):
+            await asyncio.sleep(0.01)
+            return False
+
+        cache_service.exists = exists
+        service = self.make_service(make_kline_bars(), executor, cache_service)
+
+        first, second = await asyncio.gather(service.submit(self.REQUEST), service.submit(self.REQUEST))
+        assert first is second
+        assert service.jobs[first.task_id] is first
+        result = await service.run(self.REQUEST)
+        assert result["success"]
+        assert service.stats["computed"] == 1
+
+    async def test_expired_result_recomputed(self, executor):
+        """测试已完成任务的结果过期或被淘汰后重新提交会重新计算"""
+        service = self.make_service(make_kline_bars(), executor)
+        first = await service.run(self.REQUEST)
+        job = await service.submit(self.REQUEST)
+
+        await service.cache_service.delete(service._result_key(job.task_id))
+        result = await service.run(self.REQUEST)
+
+        assert result == first
+        assert service.stats["computed"] == 2
+        assert service.jobs[job.task_id] is not job
+
+    async def test_task_id_changes_with_data(self, executor):
+        """测试请求参数或数据变化时任务 ID 不同"""
+        bars = make_kline_bars()
+        service = self.make_service(bars, executor)
+        job = await service.submit(self.REQUEST)
+
+        changed = await service.submit({**self.REQUEST, "strategy_params": {"short_period": 6}})
+        assert changed.task_id != job.task_id
+
+        bars["close"] = bars["close"] * 1.01
+        rescaled = await service.submit(self.REQUEST)
+        assert rescaled.task_id != job.task_id
+
+    async def test_watch_status(self, executor):
+        """测试订阅任务状态变化"""
+        service = self.make_service(make_kline_bars(), executor)
+        task_id = (await service.submit(self.REQUEST)).task_id
+        queue = service.watch(task_id)
+
+        statuses = []
+        while not statuses or statuses[-1] not in (BacktestJobStatus.COMPLETED, BacktestJobStatus.FAILED):
+            job = await asyncio.wait_for(queue.get(), 5)
+            statuses.append(job.status)
+        service.unwatch(task_id, queue)
+
+        assert statuses[0] == BacktestJobStatus.RUNNING
+        assert statuses[-1] == BacktestJobStatus.COMPLETED
+        assert service._watchers == {}
+
+    async def test_failures(self, executor):
+        """测试未知策略、数据不足和计算失败"""
+        service = self.make_service(make_kline_bars(), executor)
+        with pytest.raises(ValueError):
+            await service.submit({**self.REQUEST, "strategy_type": "unknown"})
+
+        short = self.make_service(make_kline_bars(30), executor)
+        result = await short.run(self.REQUEST)
+        assert not result["success"] and "数据不足" in result["error"]
+
+        with patch.object(jobs, "run_backtest", side_effect=RuntimeError("boom")):
+            result = await service.run(self.REQUEST)
+        assert result == {"success": False, "error": "boom"}
+        job = await service.get(jobs.job_id(jobs.normalize_request(self.REQUEST), jobs.data_digest(make_kline_bars())))
+        assert job.status == BacktestJobStatus.FAILED
+
+        # 失败的任务可以重新提交
+        result = await service.run(self.REQUEST)
+        assert result["success"]
@@ -0,0 +1,1148 @@
+"""测试数据服务"""
+import asyncio
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.data.adjust import (
+    adjust_bars,
+    empty_factors,
+    factor_version,
+    factors_from_frame,
+    market_symbol,
+)
+from app.services.data.akshare import AkshareService
+from app.services.data.cache import CacheService, LocalCache
+from app.services.data.codec import CacheCodec, msgpack
+from app.services.data.convert import (
+    bars_to_records,
+    hist_to_bars,
+    item_value_to_dict,
+)
+from app.services.data.downsample import downsample_bars, downsample_records, lttb_indices
+from app.services.data.kline_store import KLineStore, merge_bars, slice_bars
+from app.services.data.resample import period_start, resample_bars
+from app.services.data.scheduler import FetchScheduler
+from app.services.data.search import SymbolIndex, SymbolSearchService, pinyin_initials
+from app.services.data.singleflight import SingleFlight
+from app.services.data.snapshot import MarketSnapshot, MarketSnapshotService
+from app.services.data.trading_calendar import MARKET_TZ, TradingCalendar, load_holidays
+from app.services.news.fetcher import EM_NEWS_COLUMNS, NewsFetcher
+
+
+def make_spot_df() -> pd.DataFrame:
+    """构造 stock_zh_a_spot_em 格式的行情数据"""
+    return pd.DataFrame(
+        {
+            "代码": ["600519", "000001", "300750", "600036"],
+            "名称": ["贵州茅台", "平安银行", "宁德时代", "招商银行"],
+            "最新价": [1800.5, 10.2, 200.0, "-"],
+            "涨跌幅": [1.42, -0.5, 3.2, 0.0],
+            "涨跌额": [25.3, -0.05, 6.2, 0.0],
+            "成交量": [125000, 900000, 300000, 0],
+            "成交额": [2.25e8, 9.2e8, 6.0e8, 0],
+            "最高": [1810.0, 10.4, 202.0, 35.0],
+            "最低": [1790.0, 10.1, 195.0, 34.0],
+            "今开": [1795.0, 10.3, 196.0, 34.5],
+            "昨收": [1775.2, 10.25, 193.8, 34.6],
+            "市盈率-动态": [35.5, 5.1, 25.0, 6.2],
+            "市净率": [12.8, 0.6, 5.0, 1.0],
+        }
+    )
+
+
+class TestMarketSnapshot:
+    """行情快照测试"""
+
+    def test_get_quote(self):
+        """测试按代码查询行情"""
+        snapshot = MarketSnapshot.from_dataframe(make_spot_df(), version=3)
+
+        quote = snapshot.get_quote("600519")
+        assert quote["name"] == "贵州茅台"
+        assert quote["price"] == pytest.approx(1800.5)
+        assert quote["open_price"] == pytest.approx(1795.0)
+        assert quote["snapshot_version"] == 3
+        assert snapshot.get_quote("999999") is None
+
+    def test_non_numeric_values(self):
+        """测试停牌等非数值字段转为 NaN"""
+        snapshot = MarketSnapshot.from_dataframe(make_spot_df(), version=1)
+
+        assert pd.isna(snapshot.get_quote("600036")["price"])
+        # 缺失的列整列为 NaN
+        assert pd.isna(snapshot.column("turnover")).all()
+
+    def test_search(self):
+        """测试按代码和名称搜索"""
+        snapshot = MarketSnapshot.from_dataframe(make_spot_df(), version=1)
+
+        assert [s["code"] for s in snapshot.search("600")] == ["600519", "600036"]
+        assert [s["name"] for s in snapshot.search("银行")] == ["平安银行", "招商银行"]
+        assert len(snapshot.search("600", limit=1)) == 1
+
+
+class TestMarketSnapshotService:
+    """行情快照服务测试"""
+
+    async def test_refresh_versions(self):
+        """测试刷新递增版本号"""
+        service = MarketSnapshotService(refresh_interval=60)
+        service._fetch = make_spot_df
+
+        first = await service.get_snapshot()
+        assert first.version == 1
+        # 未过期时复用快照
+        assert await service.get_snapshot() is first
+
+        second = await service.refresh()
+        assert second.version == 2
+        assert service.info()["count"] == 4
+
+    async def test_refresh_failure_keeps_snapshot(self):
+        """测试上游失败时保留旧快照"""
+        service = MarketSnapshotService(refresh_interval=60)
+        service._fetch = make_spot_df
+        snapshot = await service.refresh()
+
+        def fail():
+            raise ConnectionError("upstream down")
+
+        service._fetch = fail
+        assert await service.refresh() is snapshot
+
+
+class TestSymbolSearch:
+    """股票搜索索引测试"""
+
+    CODES = ["600519", "000001", "300750", "600036", "601318", "000858"]
+    NAMES = ["贵州茅台", "平安银行", "宁德时代", "招商银行", "中国平安", "五粮液"]
+
+    def search(self, index, keyword, limit=20):
+        return [index.codes[row] for row in index.search(keyword, limit)]
+
+    def test_pinyin_initials(self):
+        """测试拼音首字母 (字母数字保留，符号忽略)"""
+        assert pinyin_initials("贵州茅台") == "gzmt"
+        assert pinyin_initials("平安银行") == "payx"
+        assert pinyin_initials("*ST东方A") == "stdfa"
+
+    def test_prefix_and_ranking(self):
+        """测试代码、名称、拼音前缀匹配及排序"""
+        index = SymbolIndex(self.CODES, self.NAMES)
+
+        assert self.search(index, "600") == ["600036", "600519"]
+        assert self.search(index, "600519") == ["600519"]
+        assert self.search(index, "gzmt") == ["600519"]
+        assert self.search(index, "GZ") == ["600519"]
+        # 名称前缀优先于子串
+        assert self.search(index, "平安") == ["000001", "601318"]
+        # 代码前缀在前，其余包含 0 的代码按子串排在后面
+        assert self.search(index, "0")[:2] == ["000001", "000858"]
+        assert len(self.search(index, "0")) == 6
+        assert self.search(index, "600", limit=1) == ["600036"]
+
+    def test_substring(self):
+        """测试子串匹配"""
+        index = SymbolIndex(self.CODES, self.NAMES)
+
+        assert self.search(index, "银行") == ["000001", "600036"]
+        assert self.search(index, "州茅台") == ["600519"]
+        assert self.search(index, "粮") == ["000858"]
+        assert self.search(index, "0519") == ["600519"]
+        assert self.search(index, "茅银") == []
+        assert self.search(index, "  ") == []
+
+    async def test_rebuild_on_listing_change(self):
+        """测试股票列表变化时后台重建索引，行情变化不重建"""
+        snapshot_service = MarketSnapshotService(refresh_interval=60)
+        snapshot_service._fetch = make_spot_df
+        service = SymbolSearchService(snapshot_service)
+
+        results = await service.search("gzmt")
+        assert results[0]["code"] == "600519"
+        assert results[0]["price"] == pytest.approx(1800.5)
+        assert service.info()["builds"] == 1
+        # 无报价 (停牌) 的股票价格为 None
+        assert (await service.search("600036"))[0]["price"] is None
+
+        await snapshot_service.refresh()
+        await service._task
+        assert service.info()["builds"] == 1
+
+        def listed():
+            df = make_spot_df()
+            df.loc[len(df)] = df.loc[0]
+            df.loc[len(df) - 1, ["代码", "名称"]] = ["688981", "中芯国际"]
+            return df
+
+        snapshot_service._fetch = listed
+        await snapshot_service.refresh()
+        await service._task
+        assert service.info()["builds"] == 2
+        assert [r["code"] for r in await service.search("zxgj")] == ["688981"]
+
+
+class TestTradingCalendar:
+    """交易日历测试"""
+
+    @staticmethod
+    def at(*args) -> datetime:
+        return datetime(*args, tzinfo=MARKET_TZ)
+
+    def calendar(self):
+        # 2024-10-01 至 10-07 国庆休市 (10-05、10-06 为周末)
+        holidays = [date(2024, 10, day) for day in (1, 2, 3, 4, 7)]
+        return TradingCalendar(holidays=holidays, close_grace=600)
+
+    def test_sessions(self):
+        """测试交易时段、午休和休市日"""
+        calendar = self.calendar()
+
+        assert calendar.is_open(self.at(2024, 9, 30, 10, 0))
+        assert not calendar.is_open(self.at(2024, 9, 30, 12, 0))
+        assert calendar.is_open(self.at(2024, 9, 30, 14, 59))
+        assert not calendar.is_open(self.at(2024, 9, 30, 15, 0))
+        assert calendar.is_active(self.at(2024, 9, 30, 15, 5))
+        assert not calendar.is_active(self.at(2024, 9, 30, 15, 11))
+        assert not calendar.is_trading_day(date(2024, 10, 2))
+        assert not calendar.is_trading_day(date(2024, 9, 29))
+
+    def test_next_open_and_latest_day(self):
+        """测试跨越长假的下一次开盘和最近交易日"""
+        calendar = self.calendar()
+
+        assert calendar.next_open(self.at(2024, 9, 30, 12, 0)) == self.at(2024, 9, 30, 13, 0)
+        assert calendar.next_open(self.at(2024, 9, 30, 16, 0)) == self.at(2024, 10, 8, 9, 15)
+        assert calendar.next_open(self.at(2024, 10, 8, 10, 0)) == self.at(2024, 10, 8, 10, 0)
+        assert calendar.latest_trading_day(self.at(2024, 10, 6, 12, 0)) == date(2024, 9, 30)
+        assert calendar.latest_trading_day(self.at(2024, 10, 8, 9, 0)) == date(2024, 9, 30)
+        assert calendar.latest_trading_day(self.at(2024, 10, 8, 9, 15)) == date(2024, 10, 8)
+        assert calendar.last_close(self.at(2024, 10, 3)) == self.at(2024, 9, 30, 15, 0)
+
+    def test_ttl(self):
+        """测试交易期间按原 TTL，休市期间缓存到下一次开盘"""
+        calendar = self.calendar()
+
+        assert calendar.ttl(60, self.at(2024, 9, 30, 10, 0)) == 60
+        assert calendar.ttl(60, self.at(2024, 9, 30, 12, 0)) == 3600
+        assert calendar.ttl(60, self.at(2024, 10, 7, 9, 15)) == 86400
+        assert calendar.ttl(3600, self.at(2024, 10, 8, 9, 0)) == 3600
+
+    def test_changed_since(self):
+        """测试收盘后取得的数据在下一次开盘前不过期"""
+        calendar = self.calendar()
+        now = self.at(2024, 10, 3, 12, 0)
+
+        assert calendar.changed_since(None, now)
+        assert calendar.changed_since(self.at(2024, 9, 30, 14, 0), now)
+        assert calendar.changed_since(self.at(2024, 9, 30, 15, 5), now)
+        assert not calendar.changed_since(self.at(2024, 9, 30, 15, 30), now)
+        assert calendar.changed_since(self.at(2024, 10, 8, 9, 0), self.at(2024, 10, 8, 9, 30))
+
+    def test_coverage(self, tmp_path, monkeypatch, caplog):
+        """测试缺少今年或明年节假日时告警并在统计中报告"""
+        calendar = TradingCalendar(holidays=[date(2024, 10, 1)], clock=lambda: self.at(2024, 12, 1, 10, 0))
+        assert calendar.missing_years() == [2025]
+        assert calendar.info() == {
+            "first_holiday": "2024-10-01",
+            "last_holiday": "2024-10-01",
+            "years": [2024],
+            "missing_years": [2025],
+        }
+        assert calendar.missing_years(date(2025, 6, 1)) == [2025, 2026]
+
+        path = tmp_path / "holidays.txt"
+        path.write_text("2024-10-01\n2025-01-01\n", encoding="utf-8")
+        monkeypatch.setattr("app.services.data.trading_calendar.settings.TRADING_CALENDAR_FILE", str(path))
+        with caplog.at_level("WARNING", logger="app.services.data.trading_calendar"):
+            TradingCalendar(clock=lambda: self.at(2024, 12, 1, 10, 0))
+            assert not caplog.records
+            TradingCalendar(clock=lambda: self.at(2025, 12, 1, 10, 0))
+            assert "2026" in caplog.records[-1].getMessage()
+
+    def test_load_holidays(self, tmp_path):
+        """测试读取节假日文件 (内置文件只包含工作日)"""
+        path = tmp_path / "holidays.txt"
+        path.write_text("# 注释\n2024-10-01  # 国庆\n20241002\nbad\n\n", encoding="utf-8")
+
+        assert load_holidays(str(path)) == {date(2024, 10, 1), date(2024, 10, 2)}
+        assert load_holidays(str(tmp_path / "missing.txt")) == set()
+        builtin = load_holidays()
+        assert date(2025, 1, 28) in builtin
+        assert all(day.weekday() < 5 for day in builtin)
+
+
+def make_bars(start: str, days: int, base: float = 10.0) -> dict:
+    """构造连续日期的列式 K 线"""
+    dates = np.arange(np.datetime64(start), np.datetime64(start) + days)
+    close = base + np.arange(days, dtype=np.float64)
+    return {
+        "date": dates,
+        "open_price": close - 0.5,
+        "high": close + 1,
+        "low": close - 1,
+        "close": close,
+        "volume": np.full(days, 1000.0),
+        "amount": np.full(days, 1e6),
+    }
+
+
+class TestKLineStore:
+    """本地 K 线存储测试"""
+
+    def test_save_load_roundtrip(self, tmp_path):
+        """测试写入后读取一致"""
+        store = KLineStore(root=str(tmp_path))
+        bars = make_bars("2024-01-01", 30)
+
+        store.save("600519", "daily", "qfq", bars, np.datetime64("2023-12-01"))
+        loaded, covered_from = store.load("600519", "daily", "qfq")
+
+        assert covered_from == np.datetime64("2023-12-01")
+        np.testing.assert_array_equal(loaded["date"], bars["date"])
+        np.testing.assert_array_equal(loaded["close"], bars["close"])
+        assert store.load("600519", "daily", "hfq") is None
+
+    def test_merge_prefers_new(self):
+        """测试合并时重复日期以新数据为准"""
+        old = make_bars("2024-01-01", 10)
+        new = make_bars("2024-01-10", 5, base=100.0)
+
+        merged = merge_bars(old, new)
+
+        assert len(merged["date"]) == 14
+        assert merged["close"][9] == 100.0
+        assert np.all(np.diff(merged["date"]) > np.timedelta64(0, "D"))
+
+    def test_slice(self):
+        """测试按日期区间截取"""
+        bars = make_bars("2024-01-01", 31)
+
+        part = slice_bars(bars, "20240105", "2024-01-10")
+
+        assert part["date"][0] == np.datetime64("2024-01-05")
+        assert part["date"][-1] == np.datetime64("2024-01-10")
+
+
+class TestKLineSync:
+    """K 线增量同步测试"""
+
+    def make_service(self, tmp_path, history, factors=None, calendar=None):
+        service = AkshareService(
+            snapshot_service=MarketSnapshotService(),
+            kline_store=KLineStore(root=str(tmp_path)),
+            calendar=calendar,
+        )
+        calls = []
+
+        def fetch(code, period, start, end, adjust):
+            # 只向上游请求不复权日线
+            assert (period, adjust) == ("daily", "")
+            calls.append((start, end))
+            return slice_bars(history, start, end)
+
+        service._fetch_hist = fetch
+        service._fetch_factors = lambda code: factors if factors is not None else empty_factors()
+        return service, calls
+
+    async def test_incremental_fetch(self, tmp_path, monkeypatch):
+        """测试只拉取缺失区间"""
+        monkeypatch.setattr("app.services.data.akshare.settings.KLINE_STORE_REFRESH_INTERVAL", 0)
+        history = make_bars("2024-01-01", 60)
+        service, calls = self.make_service(tmp_path, history)
+
+        first = await service.get_kline_data("600519", start_date="20240110", end_date="20240131")
+        assert len(first) == 22
+        assert calls == [(np.datetime64("2024-01-10"), np.datetime64("2024-01-31"))]
+
+        # 子区间直接从本地读取
+        calls.clear()
+        await service.get_kline_data("600519", start_date="20240115", end_date="20240120")
+        assert calls == []
+
+        # 更早与更晚的区间只补齐缺失部分
+        bars = await service.get_kline_bars("600519", start_date="20240105", end_date="20240210")
+        assert calls == [
+            (np.datetime64("2024-01-05"), np.datetime64("2024-01-09")),
+            (np.datetime64("2024-01-31"), np.datetime64("2024-02-10")),
+        ]
+        np.testing.assert_array_equal(bars["close"], slice_bars(history, "20240105", "20240210")["close"])
+
+    async def test_refresh_throttled(self, tmp_path):
+        """测试短时间内不重复检查新 K 线"""
+        history = make_bars("2024-01-01", 60)
+        service, calls = self.make_service(tmp_path, history)
+
+        await service.get_kline_data("600519", start_date="20240110", end_date="20240131")
+        await service.get_kline_data("600519", start_date="20240110", end_date="20240205")
+
+        assert len(calls) == 1
+
+    async def test_concurrent_requests_coalesced(self, tmp_path):
+        """测试相同参数的并发请求只执行一次同步"""
+        history = make_bars("2024-01-01", 60)
+        service, calls = self.make_service(tmp_path, history)
+
+        results = await asyncio.gather(
+            *[
+                service.get_kline_data("600519", start_date="20240110", end_date="20240131")
+                for _ in range(10)
+            ]
+        )
+
+        assert len(calls) == 1
+        assert all(len(r) == 22 for r in results)
+        stats = service.upstream_stats()["coalescing"]
+        assert stats["by_name"]["_sync_kline"] == {"calls": 10, "deduplicated": 9}
+        assert stats["by_name"]["_sync_factors"] == {"calls": 10, "deduplicated": 9}
+        assert stats["inflight"] == 0
+
+
+    async def test_concurrent_ranges_merge(self, tmp_path, monkeypatch):
+        """测试同一 K 线不同区间的并发同步 (向前补齐与向后追加) 不互相覆盖"""
+        monkeypatch.setattr("app.services.data.akshare.settings.KLINE_STORE_REFRESH_INTERVAL", 0)
+        history = make_bars("2024-01-01", 60)
+        service, calls = self.make_service(tmp_path, history)
+        await service.get_kline_bars("600519", start_date="20240110", end_date="20240131")
+
+        fetch = service._fetch_hist
+
+        def slow_fetch(*args):
+            time.sleep(0.05)
+            return fetch(*args)
+
+        service._fetch_hist = slow_fetch
+        await asyncio.gather(
+            service.get_kline_bars("600519", start_date="20240101", end_date="20240131"),
+            service.get_kline_bars("600519", start_date="20240110", end_date="20240229"),
+        )
+
+        bars, covered_from = service.kline_store.load("600519", "daily", "")
+        assert covered_from == np.datetime64("2024-01-01")
+        np.testing.assert_array_equal(bars["date"], history["date"])
+
+    async def test_resampled_periods_use_daily_store(self, tmp_path):
+        """测试周线、月线由本地日线聚合"""
+        history = make_bars("2024-01-01", 120)
+        service, calls = self.make_service(tmp_path, history)
+
+        weekly = await service.get_kline_bars("600519", "weekly", "20240110", "20240331")
+        # 日线向前补齐到周一
+        assert calls == [(np.datetime64("2024-01-08"), np.datetime64("2024-03-31"))]
+        assert str(weekly["date"][0]) == "2024-01-14"
+        assert weekly["open_price"][0] == history["open_price"][7]
+        assert weekly["volume"][0] == 7000.0
+
+        monthly = await service.get_kline_bars("600519", "monthly", "20240201", "20240331")
+        assert len(calls) == 1
+        np.testing.assert_array_equal(
+            monthly["date"], np.array(["2024-02-29", "2024-03-31"], dtype="datetime64[D]")
+        )
+        np.testing.assert_array_equal(monthly["volume"], [29000.0, 31000.0])
+        assert not service.kline_store.path("600519", "weekly", "qfq").exists()
+        assert not service.kline_store.path("600519", "daily", "qfq").exists()
+
+    async def test_resampled_history_drops_partial_period(self, tmp_path):
+        """测试日线覆盖起点不在周期开头时丢弃不完整的首个周期"""
+        history = make_bars("2024-01-01", 120)
+        service, _ = self.make_service(tmp_path, history)
+
+        await service.get_kline_bars("600519", start_date="20240110", end_date="20240331")
+        monthly = await service.get_kline_history("600519", "monthly", "20240301", "20240331")
+        np.testing.assert_array_equal(
+            monthly["date"], np.array(["2024-02-29", "2024-03-31"], dtype="datetime64[D]")
+        )
+
+
+    async def test_adjusted_prices_share_raw_store(self, tmp_path, monkeypatch):
+        """测试前复权/后复权/不复权共用一份不复权日线，新除权只更新因子"""
+        history = make_bars("2024-01-01", 60)
+        factors = {
+            "date": np.array(["1990-01-01", "2024-01-20"], dtype="datetime64[D]"),
+            "factor": np.array([1.0, 2.0]),
+        }
+        service, calls = self.make_service(tmp_path, history, factors)
+
+        raw = await service.get_kline_bars("600519", start_date="20240110", end_date="20240131", adjust="")
+        hfq = await service.get_kline_bars("600519", start_date="20240110", end_date="20240131", adjust="hfq")
+        qfq = await service.get_kline_bars("600519", start_date="20240110", end_date="20240131", adjust="qfq")
+        assert len(calls) == 1
+        np.testing.assert_allclose(hfq["close"], raw["close"] * np.where(raw["date"] >= np.datetime64("2024-01-20"), 2.0, 1.0))
+        np.testing.assert_allclose(qfq["close"], hfq["close"] / 2.0)
+        np.testing.assert_array_equal(qfq["volume"], raw["volume"])
+        assert await service.adjust_version("600519", "") == "none"
+        assert await service.adjust_version("600519", "qfq") == "2024-01-20:2"
+
+        # 新的除权除息: K 线不重新下载，只有因子和前复权价格变化
+        monkeypatch.setattr("app.services.data.akshare.settings.ADJUST_FACTOR_REFRESH_INTERVAL", 0)
+        factors["date"] = np.append(factors["date"], np.datetime64("2024-01-25"))
+        factors["factor"] = np.append(factors["factor"], 4.0)
+        qfq = await service.get_kline_bars("600519", start_date="20240110", end_date="20240131", adjust="qfq")
+        assert len(calls) == 1
+        assert qfq["close"][-1] == raw["close"][-1]
+        assert qfq["close"][0] == raw["close"][0] / 4.0
+        stored = service.kline_store.load_factors("600519")
+        assert factor_version(stored) == "2024-01-25:4"
+
+
+    async def test_adjusted_prices_require_factors(self, tmp_path):
+        """测试复权因子不可用且无本地存储时复权请求失败，不复权请求不受影响"""
+        history = make_bars("2024-01-01", 60)
+        service, _ = self.make_service(tmp_path, history)
+
+        def unavailable(code):
+            raise ConnectionError("upstream down")
+
+        service._fetch_factors = unavailable
+        raw = await service.get_kline_bars("600519", start_date="20240110", end_date="20240131", adjust="")
+        assert len(raw["date"]) == 22
+        assert await service.adjust_version("600519", "") == "none"
+        with pytest.raises(RuntimeError):
+            await service.get_kline_bars("600519", start_date="20240110", end_date="20240131", adjust="qfq")
+        with pytest.raises(RuntimeError):
+            await service.adjust_version("600519", "hfq")
+
+    async def test_skip_fetch_when_market_closed(self, tmp_path, monkeypatch):
+        """测试周末和收盘后已有收盘数据时不请求上游"""
+        monkeypatch.setattr("app.services.data.akshare.settings.KLINE_STORE_REFRESH_INTERVAL", 0)
+        now = [datetime(2024, 1, 12, 14, 0, tzinfo=MARKET_TZ)]
+        calendar = TradingCalendar(holidays=[], close_grace=600, clock=lambda: now[0])
+        history = make_bars("2024-01-01", 15)
+        service, calls = self.make_service(tmp_path, history, calendar=calendar)
+
+        # 周五盘中首次拉取，收盘后宽限期结束再刷新一次
+        await service.get_kline_bars("600519", start_date="20240102", end_date="20240112")
+        now[0] = now[0].replace(hour=16)
+        await service.get_kline_bars("600519", start_date="20240102", end_date="20240112")
+        assert len(calls) == 2
+
+        # 之后到周一开盘前都不再请求
+        for moment in (datetime(2024, 1, 12, 20), datetime(2024, 1, 14, 12), datetime(2024, 1, 15, 9, 0)):
+            now[0] = moment.replace(tzinfo=MARKET_TZ)
+            await service.get_kline_bars("600519", start_date="20240102", end_date=moment.strftime("%Y%m%d"))
+        assert len(calls) == 2
+
+        now[0] = datetime(2024, 1, 15, 9, 30, tzinfo=MARKET_TZ)
+        await service.get_kline_bars("600519", start_date="20240102", end_date="20240115")
+        assert calls[-1] == (np.datetime64("2024-01-12"), np.datetime64("2024-01-15"))
+
+
+class TestAdjust:
+    """复权计算测试"""
+
+    def test_factors_from_frame(self):
+        """测试解析上游复权因子并按日期排序"""
+        df = pd.DataFrame(
+            {
+                "date": ["2024-06-01", "1990-12-19", "bad"],
+                "hfq_factor": ["2.5", "1.0", "3.0"],
+            }
+        )
+        factors = factors_from_frame(df)
+        np.testing.assert_array_equal(
+            factors["date"], np.array(["1990-12-19", "2024-06-01"], dtype="datetime64[D]")
+        )
+        np.testing.assert_array_equal(factors["factor"], [1.0, 2.5])
+        assert factor_version(factors) == "2024-06-01:2.5"
+        assert factor_version(factors_from_frame(None)) == "none"
+
+    def test_adjust_bars(self):
+        """测试前复权以最新价格为基准，后复权以上市价格为基准"""
+        raw = make_bars("2024-01-01", 10)
+        factors = {
+            "date": np.array(["2024-01-05", "2024-01-08"], dtype="datetime64[D]"),
+            "factor": np.array([1.5, 3.0]),
+        }
+        scale = np.array([1.5] * 7 + [3.0] * 3)
+
+        hfq = adjust_bars(raw, factors, "hfq")
+        np.testing.assert_allclose(hfq["open_price"], raw["open_price"] * scale)
+        np.testing.assert_allclose(hfq["low"], raw["low"] * scale)
+        qfq = adjust_bars(raw, factors, "qfq")
+        np.testing.assert_allclose(qfq["close"], raw["close"] * scale / 3.0)
+        np.testing.assert_array_equal(qfq["amount"], raw["amount"])
+        assert adjust_bars(raw, factors, "") is raw
+        assert adjust_bars(raw, empty_factors(), "qfq") is raw
+        with pytest.raises(ValueError):
+            adjust_bars(raw, factors, "bad")
+
+    def test_market_symbol(self):
+        """测试新浪行情代码前缀"""
+        assert market_symbol("600519") == "sh600519"
+        assert market_symbol("000001") == "sz000001"
+        assert market_symbol("300750") == "sz300750"
+        assert market_symbol("830799") == "bj830799"
+
+
+class TestSingleFlight:
+    """请求合并测试"""
+
+    async def test_shared_result(self):
+        """测试并发调用共享一次执行"""
+        flight = SingleFlight()
+        runs = 0
+
+        async def work():
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.01)
+            return runs
+
+        results = await asyncio.gather(*[flight.do("k", work, name="work") for _ in range(5)])
+
+        assert results == [1] * 5
+        assert flight.stats()["by_name"]["work"] == {"calls": 5, "deduplicated": 4}
+        # 完成后不再复用
+        assert await flight.do("k", work) == 2
+
+    async def test_shared_exception(self):
+        """测试异常传递给所有等待者"""
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            *[flight.do("k", fail) for _ in range(3)], return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+
+    async def test_waiter_cancel_does_not_cancel_shared(self):
+        """测试单个等待者取消不影响其他等待者"""
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "ok"
+
+
+class TestFetchScheduler:
+    """上游调用调度测试"""
+
+    async def test_endpoint_isolation(self):
+        """测试慢接口排队不阻塞其他端点"""
+        scheduler = FetchScheduler(max_workers=8, limits={"hist": 2, "spot": 2}, timeout=5)
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return "hist"
+
+        hist_tasks = [asyncio.create_task(scheduler.run("hist", slow)) for _ in range(6)]
+        await asyncio.sleep(0.05)
+
+        # hist 并发已满，spot 仍可立即执行
+        assert await scheduler.run("spot", lambda: "spot") == "spot"
+        assert scheduler.metrics["hist"].inflight == 2
+
+        release.set()
+        assert await asyncio.gather(*hist_tasks) == ["hist"] * 6
+
+        stats = scheduler.stats()["endpoints"]["hist"]
+        assert stats["calls"] == 6
+        assert stats["queue_time_max"] > 0
+        scheduler.shutdown()
+
+    async def test_timeout_keeps_slot(self):
+        """测试超时后线程结束前不释放并发配额"""
+        scheduler = FetchScheduler(max_workers=2, limits={"hist": 1}, timeout=5)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await scheduler.run("hist", time.sleep, 0.2, timeout=0.01)
+
+        assert scheduler.metrics["hist"].timeouts == 1
+        assert scheduler.metrics["hist"].inflight == 1
+
+        await asyncio.sleep(0.3)
+        assert scheduler.metrics["hist"].inflight == 0
+        assert await scheduler.run("hist", lambda: 1) == 1
+        scheduler.shutdown()
+
+    async def test_error_counted(self):
+        """测试异常计数"""
+        scheduler = FetchScheduler(max_workers=1, limits={"default": 1}, timeout=5)
+
+        def fail():
+            raise ValueError("bad")
+
+        with pytest.raises(ValueError):
+            await scheduler.run("info", fail)
+
+        assert scheduler.metrics["info"].errors == 1
+        scheduler.shutdown()
+
+
+class TestConvert:
+    """DataFrame 转换测试"""
+
+    def make_hist_df(self, dates) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "日期": dates,
+                "开盘": [10.0, 11.0],
+                "收盘": [10.5, 11.5],
+                "最高": [11.0, 12.0],
+                "最低": [9.5, 10.5],
+                "成交量": [1000, 2000],
+                "成交额": ["1e6", "-"],
+            }
+        )
+
+    @pytest.mark.parametrize(
+        "dates",
+        [
+            [date(2024, 1, 2), date(2024, 1, 3)],
+            ["2024-01-02", "2024-01-03"],
+            ["20240102", "20240103"],
+            ["2024/01/02", "2024/01/03"],
+        ],
+    )
+    def test_hist_to_bars(self, dates):
+        """测试各种日期格式整列解析"""
+        bars = hist_to_bars(self.make_hist_df(dates))
+
+        assert bars["date"].dtype == np.dtype("datetime64[D]")
+        assert bars["date"][1] == np.datetime64("2024-01-03")
+        assert bars["amount"][0] == 1e6
+        assert np.isnan(bars["amount"][1])
+
+    def test_bars_to_records(self):
+        """测试列式 K 线转记录"""
+        records = bars_to_records(hist_to_bars(self.make_hist_df(["2024-01-02", "2024-01-03"])))
+
+        assert records[0]["date"] == date(2024, 1, 2)
+        assert records[1]["close"] == 11.5
+        assert isinstance(records[0]["volume"], float)
+
+    def test_item_value_table(self):
+        """测试 item/value 表转字典"""
+        info = pd.DataFrame({"item": ["股票简称", "行业"], "value": ["贵州茅台", "白酒"]})
+        assert item_value_to_dict(info) == {"股票简称": "贵州茅台", "行业": "白酒"}
+
+    def test_news_frame(self):
+        """测试新闻整表转换与时间过滤"""
+        now = datetime.now()
+        df = pd.DataFrame(
+            {
+                "新闻标题": ["业绩大涨", "旧闻", "公司跌停"],
+                "新闻内容": ["x" * 600, "y", None],
+                "新闻链接": ["u1", "u2", "u3"],
+                "发布时间": [
+                    now.strftime("%Y-%m-%d %H:%M:%S"),
+                    "2000-01-01 00:00:00",
+                    "10分钟前",
+                ],
+            }
+        )
+
+        news = NewsFetcher(scheduler=FetchScheduler())._frame_to_news(
+            df, EM_NEWS_COLUMNS, source="东方财富", since=now - timedelta(days=1)
+        )
+
+        assert [n["title"] for n in news] == ["业绩大涨", "公司跌停"]
+        assert len(news[0]["content"]) == 500
+        assert news[0]["sentiment"] == "positive"
+        assert news[1]["content"] == ""
+        assert news[1]["publish_time"] != ""
+
+
+class TestLocalCache:
+    """进程内缓存测试"""
+
+    def test_lru_eviction_by_entries(self):
+        """测试按条目数淘汰最久未使用的条目"""
+        cache = LocalCache(max_entries=2, max_bytes=1000)
+        cache.set("a", 1, ttl=60, size=1)
+        cache.set("b", 2, ttl=60, size=1)
+        cache.get("a")
+        cache.set("c", 3, ttl=60, size=1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_eviction_by_bytes(self):
+        """测试按字节数淘汰"""
+        cache = LocalCache(max_entries=100, max_bytes=10)
+        cache.set("a", "x", ttl=60, size=6)
+        cache.set("b", "y", ttl=60, size=6)
+
+        assert cache.get("a") is None
+        assert cache.bytes == 6
+        # 超过上限的单个条目不缓存
+        cache.set("c", "z", ttl=60, size=11)
+        assert cache.get("c") is None
+
+    def test_ttl(self, monkeypatch):
+        """测试过期"""
+        cache = LocalCache(max_entries=10, max_bytes=100)
+        now = time.monotonic()
+        cache.set("a", 1, ttl=5, size=1)
+
+        monkeypatch.setattr("app.services.data.cache.time.monotonic", lambda: now + 10)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestCacheService:
+    """缓存服务测试"""
+
+    async def test_l1_without_redis(self):
+        """测试 Redis 不可用时仍使用进程内缓存"""
+        cache = CacheService()
+
+        assert await cache.set("stock:600519:info", {"name": "贵州茅台"}, ttl=60)
+        assert await cache.get("stock:600519:info") == {"name": "贵州茅台"}
+        assert cache.info()["l1_hits"] == 1
+
+        await cache.delete("stock:600519:info")
+        assert await cache.get("stock:600519:info") is None
+
+    async def test_same_value_from_both_tiers(self):
+        """测试一级缓存和 Redis 命中返回相同的解码值，且不与写入的对象共享"""
+        cache = CacheService(codec=CacheCodec(codec="orjson", compression="none"))
+
+        class FakePipeline:
+            def __init__(self, data):
+                self.data = data
+                self.keys = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                pass
+
+            def get(self, key):
+                self.keys.append(key)
+                return self
+
+            def pttl(self, key):
+                return self
+
+            async def execute(self):
+                return [self.data.get(self.keys[0]), 60000]
+
+        class FakeRedis:
+            def __init__(self):
+                self.data = {}
+
+            async def setex(self, key, ttl, raw):
+                self.data[key] = raw
+
+            async def publish(self, channel, message):
+                pass
+
+            def pipeline(self, transaction=False):
+                return FakePipeline(self.data)
+
+        cache.redis = FakeRedis()
+        value = {"date": date(2024, 1, 2), "close": [np.float64(1.5)]}
+        assert await cache.set("k", value, ttl=60)
+        value["close"].append(2.0)
+
+        l1 = await cache.get("k")
+        cache.local.clear()
+        l2 = await cache.get("k")
+
+        assert l1 == l2 == {"date": "2024-01-02", "close": [1.5]}
+        assert cache.info()["l1_hits"] == 1 and cache.info()["l2_hits"] == 1
+
+    async def test_invalidation_ignores_own_messages(self):
+        """测试失效消息只清除其他 worker 写入的键"""
+        cache = CacheService()
+        cache.local.set("k", 1, ttl=60, size=1)
+
+        class FakePubSub:
+            def __init__(self, messages):
+                self.messages = messages
+
+            async def subscribe(self, channel):
+                pass
+
+            async def listen(self):
+                for message in self.messages:
+                    yield message
+
+            async def aclose(self):
+                pass
+
+        class FakeRedis:
+            def __init__(self, messages):
+                self.messages = messages
+
+            def pubsub(self):
+                return FakePubSub(self.messages)
+
+        cache.redis = FakeRedis([{"type": "message", "data": f"{cache.instance_id}:k"}])
+        await cache._listen_invalidations()
+        assert cache.local.get("k") == 1
+
+        cache.redis = FakeRedis([{"type": "message", "data": "other:k"}])
+        await cache._listen_invalidations()
+        assert cache.local.get("k") is None
+
+
+    async def test_invalidation_listener_reconnects(self, monkeypatch):
+        """测试失效订阅断开后退避重连，重连成功时清空一级缓存"""
+        cache = CacheService()
+        cache.local.set("stale", 1, ttl=60, size=1)
+        sessions = []
+
+        class FakePubSub:
+            async def subscribe(self, channel):
+                sessions.append(channel)
+                if len(sessions) <= 2:
+                    raise ConnectionError("redis down")
+                if len(sessions) == 3:
+                    assert cache.local.get("stale") == 1
+
+            async def listen(self):
+                for message in ():
+                    yield message
+
+            async def aclose(self):
+                pass
+
+        class FakeRedis:
+            def pubsub(self):
+                return FakePubSub()
+
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+            if len(delays) == 4:
+                raise asyncio.CancelledError
+
+        monkeypatch.setattr("app.services.data.cache.asyncio.sleep", sleep)
+        cache.redis = FakeRedis()
+        with pytest.raises(asyncio.CancelledError):
+            await cache._run_invalidation_listener()
+
+        assert len(sessions) == 4
+        # 两次失败后加倍，订阅成功后恢复初始间隔
+        assert delays == [1.0, 2.0, 1.0, 1.0]
+        assert cache.local.get("stale") is None
+
+class TestCacheCodec:
+    """缓存编码测试"""
+
+    VALUE = {
+        "date": date(2024, 1, 2),
+        "timestamp": datetime(2024, 1, 2, 9, 30),
+        "price": 1800.5,
+        "missing": float("nan"),
+        "count": np.int64(3),
+        "values": np.array([1.0, 2.0]),
+    }
+
+    @pytest.mark.parametrize("codec", ["json", "orjson"])
+    def test_json_roundtrip(self, codec):
+        """测试 JSON 类编码处理日期、NaN 和 NumPy"""
+        cache_codec = CacheCodec(codec=codec, compression="none")
+
+        decoded = cache_codec.decode(cache_codec.encode(self.VALUE))
+
+        assert decoded["date"] == "2024-01-02"
+        assert decoded["timestamp"].startswith("2024-01-02T09:30")
+        assert decoded["missing"] is None
+        assert decoded["count"] == 3
+        assert decoded["values"] == [1.0, 2.0]
+
+    @pytest.mark.skipif(msgpack is None, reason="msgpack 未安装")
+    def test_msgpack_preserves_types(self):
+        """测试 msgpack 编码保留日期和数组类型"""
+        cache_codec = CacheCodec(codec="msgpack", compression="none")
+
+        decoded = cache_codec.decode(cache_codec.encode(self.VALUE))
+
+        assert decoded["date"] == date(2024, 1, 2)
+        assert decoded["timestamp"] == datetime(2024, 1, 2, 9, 30)
+        np.testing.assert_array_equal(decoded["values"], np.array([1.0, 2.0]))
+
+    @pytest.mark.parametrize("compression", ["zstd", "zlib"])
+    def test_compression_threshold(self, compression):
+        """测试超过阈值才压缩"""
+        cache_codec = CacheCodec(codec="orjson", compression=compression, compress_min_bytes=100)
+        small = {"a": 1}
+        large = [{"close": 10.0 + i, "date": date(2024, 1, 1)} for i in range(200)]
+
+        assert cache_codec.encode(small)[0] == 0
+        encoded = cache_codec.encode(large)
+        assert encoded[0] != 0
+        assert len(encoded) < len(cache_codec.serializer.dumps(large))
+        assert cache_codec.decode(encoded)[199]["close"] == 209.0
+
+    def test_tag_in_key(self):
+        """测试编码格式写入 key 前缀"""
+        cache = CacheService(codec=CacheCodec(codec="orjson"))
+        assert cache._redis_key("stock:600519:info") == "orjson1:stock:600519:info"
+
+    async def test_kline_records_cacheable(self):
+        """测试包含 date 的 K 线记录可以写入缓存"""
+        cache = CacheService(codec=CacheCodec(codec="orjson"))
+        records = [{"date": date(2024, 1, 2), "close": 10.0}]
+
+        assert await cache.set("stock:600519:kline", records, ttl=60)
+
+
+class TestDownsample:
+    """图表降采样测试"""
+
+    @staticmethod
+    def reference_lttb(y, max_points):
+        """逐桶实现的经典 LTTB"""
+        n = len(y)
+        x = np.arange(n, dtype=float)
+        every = (n - 2) / (max_points - 2)
+        selected, a = [0], 0
+        for i in range(max_points - 2):
+            start = int(i * every) + 1
+            end = int((i + 1) * every) + 1
+            next_end = min(int((i + 2) * every) + 1, n) if i < max_points - 3 else n
+            x_c, y_c = x[end:next_end].mean(), y[end:next_end].mean()
+            area = np.abs((x[a] - x_c) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (y_c - y[a]))
+            a = start + int(np.argmax(area))
+            selected.append(a)
+        return selected + [n - 1]
+
+    def test_lttb_matches_reference(self):
+        """测试与经典 LTTB 一致"""
+        y = np.cumsum(np.random.default_rng(0).normal(size=2000))
+        for max_points in (3, 10, 257):
+            np.testing.assert_array_equal(lttb_indices(y, max_points), self.reference_lttb(y, max_points))
+
+    def test_lttb_keeps_extremes(self):
+        """测试保留首尾和尖峰"""
+        y = np.zeros(1000)
+        y[377] = 50.0
+        y[810] = -50.0
+        index = lttb_indices(y, 20)
+        assert len(index) == 20
+        assert index[0] == 0 and index[-1] == 999
+        assert 377 in index and 810 in index
+        np.testing.assert_array_equal(lttb_indices(y, 2000), np.arange(1000))
+
+    def test_lttb_multiple_series_with_nan(self):
+        """测试多条序列 (含预热期 NaN) 共用下标"""
+        rng = np.random.default_rng(1)
+        lines = np.vstack([np.cumsum(rng.normal(size=500)), 1000 * rng.normal(size=500)])
+        lines[1, :100] = np.nan
+        index = lttb_indices(lines, 50)
+        assert len(index) == 50
+        assert np.all(np.diff(index) > 0)
+
+        all_nan = lttb_indices(np.full(100, np.nan), 10)
+        assert len(all_nan) == 10 and np.all(np.diff(all_nan) > 0)
+
+    def test_downsample_bars(self):
+        """测试 OHLC 分桶聚合"""
+        n = 10
+        bars = {
+            "date": np.datetime64("2024-01-01") + np.arange(n),
+            "open_price": np.arange(n) + 0.5,
+            "high": np.arange(n) + 1.0,
+            "low": np.arange(n) - 1.0,
+            "close": np.arange(n) + 0.2,
+            "volume": np.ones(n),
+            "amount": np.full(n, 2.0),
+        }
+        bars["high"][2] = np.nan
+
+        result = downsample_bars(bars, 3)
+        np.testing.assert_array_equal(
+            result["date"], np.array(["2024-01-03", "2024-01-06", "2024-01-10"], dtype="datetime64[D]")
+        )
+        np.testing.assert_array_equal(result["open_price"], [0.5, 3.5, 6.5])
+        np.testing.assert_array_equal(result["high"], [2.0, 6.0, 10.0])
+        np.testing.assert_array_equal(result["low"], [-1.0, 2.0, 5.0])
+        np.testing.assert_array_equal(result["close"], [2.2, 5.2, 9.2])
+        np.testing.assert_array_equal(result["volume"], [3.0, 3.0, 4.0])
+        assert downsample_bars(bars, 10) is bars
+
+    def test_downsample_records(self):
+        """测试权益曲线降采样"""
+        curve = [{"date": i, "equity": float(i % 7)} for i in range(100)]
+        result = downsample_records(curve, "equity", 10)
+        assert len(result) == 10
+        assert result[0] is curve[0] and result[-1] is curve[-1]
+
+
+class TestResample:
+    """K 线周期转换测试"""
+
+    def make_daily(self):
+        dates = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-07-01"))
+        dates = dates[np.is_busday(dates)]
+        n = len(dates)
+        close = 10 + np.arange(n, dtype=np.float64)
+        return {
+            "date": dates,
+            "open_price": close - 0.5,
+            "high": close + 1,
+            "low": close - 1,
+            "close": close,
+            "volume": np.full(n, 100.0),
+            "amount": np.full(n, 1e4),
+        }
+
+    def test_period_start(self):
+        """测试周期起点"""
+        day = np.datetime64("2024-08-15")
+        assert period_start(day, "weekly") == np.datetime64("2024-08-12")
+        assert period_start(day, "monthly") == np.datetime64("2024-08-01")
+        assert period_start(day, "quarterly") == np.datetime64("2024-07-01")
+        assert period_start(day, "5d") == day
+        with pytest.raises(ValueError):
+            period_start(day, "hourly")
+
+    def test_calendar_periods_match_pandas(self):
+        """测试自然周/月/季聚合与 pandas resample 一致"""
+        daily = self.make_daily()
+        daily["high"][3] = np.nan
+        df = pd.DataFrame({k: v for k, v in daily.items() if k != "date"}, index=pd.DatetimeIndex(daily["date"]))
+        rules = {"weekly": "W-SUN", "monthly": "ME", "quarterly": "QE"}
+
+        for period, rule in rules.items():
+            result = resample_bars(daily, period)
+            grouped = df.resample(rule)
+            expected = pd.DataFrame({
+                "open_price": grouped["open_price"].first(),
+                "high": grouped["high"].max(),
+                "low": grouped["low"].min(),
+                "close": grouped["close"].last(),
+                "volume": grouped["volume"].sum(),
+            }).dropna(subset=["close"])
+            last_days = df.index.to_series().resample(rule).max().dropna()
+
+            np.testing.assert_array_equal(result["date"], last_days.to_numpy().astype("datetime64[D]"))
+            for column in expected.columns:
+                np.testing.assert_array_equal(result[column], expected[column].to_numpy(), err_msg=period)
+
+    def test_n_day_periods(self):
+        """测试 N 日线从最后一根日线向前分组"""
+        daily = self.make_daily()
+        result = resample_bars(daily, "20d")
+        n = len(daily["date"])
+
+        assert result["date"][-1] == daily["date"][-1]
+        assert result["open_price"][-1] == daily["open_price"][n - 20]
+        assert result["volume"][0] == 100.0 * (n % 20 or 20)
+        assert len(result["date"]) == -(-n // 20)
+        assert resample_bars(daily, "daily") is daily
+        with pytest.raises(ValueError):
+            resample_bars(daily, "0d")
@@ -1,6 +1,100 @@
 """测试技术指标计算"""
+import json
+import threading
+
+import numpy as np
+import pandas as pd
 import pytest
-from app.services.indicators import technical_calculator
+from app.services.indicators import (
+    IndicatorSpec,
+    compute_indicators,
+    kernels,
+    parse_specs,
+    technical_calculator,
+)
+from app.services.data.cache import CacheService
+from app.services.data.codec import CacheCodec
+from app.services.indicators.batch import build_graph
+from app.services.indicators.cache import IndicatorCache, build_entry, entry_matches, extend_entry
+from app.services.indicators.panel import PricePanel, compute_panel, latest_values
+from app.services.indicators.streaming import IndicatorStream, StreamingRSI, create_streaming
+
+
+# ---- pandas 参考实现 (与改写前的 TechnicalIndicators 一致) ----
+
+def pandas_sma(close, period):
+    return pd.Series(close).rolling(window=period).mean().to_numpy()
+
+
+def pandas_ema(close, period):
+    return pd.Series(close).ewm(span=period, adjust=False).mean().to_numpy()
+
+
+def pandas_macd(close, fast_period=12, slow_period=26, signal_period=9):
+    series = pd.Series(close)
+    macd_line = (
+        series.ewm(span=fast_period, adjust=False).mean()
+        - series.ewm(span=slow_period, adjust=False).mean()
+    )
+    signal_line = macd_line.ewm(span=signal_period, adjust=False).mean()
+    return {
+        "macd": macd_line.to_numpy(),
+        "signal": signal_line.to_numpy(),
+        "histogram": (macd_line - signal_line).to_numpy(),
+    }
+
+
+def pandas_rsi(close, period=14):
+    # 原实现把 loss == 0 替换为 inf，导致单边上涨时 RSI 为 0，这里按标准定义为 100
+    delta = pd.Series(close).diff()
+    gain = delta.where(delta > 0, 0).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    return (100 - 100 / (1 + gain / loss)).to_numpy()
+
+
+def pandas_kdj(high, low, close, n=9, m1=3, m2=3):
+    df = pd.DataFrame({"high": high, "low": low, "close": close})
+    low_list = df["low"].rolling(window=n, min_periods=1).min()
+    high_list = df["high"].rolling(window=n, min_periods=1).max()
+    rsv = (df["close"] - low_list) / (high_list - low_list) * 100
+    k = rsv.ewm(com=m1 - 1, adjust=False).mean()
+    d = k.ewm(com=m2 - 1, adjust=False).mean()
+    return {"k": k.to_numpy(), "d": d.to_numpy(), "j": (3 * k - 2 * d).to_numpy()}
+
+
+def pandas_boll(close, period=20, std_dev=2.0):
+    series = pd.Series(close)
+    middle = series.rolling(window=period).mean()
+    std = series.rolling(window=period).std()
+    return {
+        "upper": (middle + std_dev * std).to_numpy(),
+        "middle": middle.to_numpy(),
+        "lower": (middle - std_dev * std).to_numpy(),
+    }
+
+
+def pandas_cci(high, low, close, period=14):
+    tp = (pd.Series(high) + pd.Series(low) + pd.Series(close)) / 3
+    ma_tp = tp.rolling(window=period).mean()
+    md = tp.rolling(window=period).apply(lambda x: abs(x - x.mean()).mean(), raw=True)
+    return ((tp - ma_tp) / (0.015 * md)).to_numpy()
+
+
+def pandas_wr(high, low, close, period=14):
+    df = pd.DataFrame({"high": high, "low": low, "close": close})
+    high_list = df["high"].rolling(window=period, min_periods=1).max()
+    low_list = df["low"].rolling(window=period, min_periods=1).min()
+    return ((high_list - df["close"]) / (high_list - low_list) * -100).to_numpy()
+
+
+def random_bars(n, seed=0):
+    """随机游走 K 线"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    high = close + spread * rng.random(n)
+    low = close - spread * rng.random(n)
+    return high, low, close
 
 
 class TestTechnicalIndicators:
@@ -151,3 +245,433 @@ class TestTechnicalIndicators:
         result = technical_calculator.sma(prices, period)
         assert len(result) == len(prices)
         assert all(r is None for r in result)
+
+
+class TestIndicatorKernels:
+    """NumPy 内核与 pandas 参考实现的一致性测试"""
+
+    @pytest.fixture(params=[30, 250, 5000])
+    def bars(self, request):
+        return random_bars(request.param, seed=request.param)
+
+    @staticmethod
+    def assert_close(actual, expected):
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+    def test_moving_averages(self, bars):
+        """测试 SMA/EMA"""
+        _, _, close = bars
+        for period in (1, 5, 20, 60):
+            self.assert_close(kernels.sma(close, period), pandas_sma(close, period))
+            self.assert_close(kernels.ema(close, period), pandas_ema(close, period))
+
+    def test_macd(self, bars):
+        """测试 MACD"""
+        _, _, close = bars
+        actual = kernels.macd(close)
+        for name, expected in pandas_macd(close).items():
+            self.assert_close(actual[name], expected)
+
+    def test_rsi(self, bars):
+        """测试 RSI"""
+        _, _, close = bars
+        for period in (6, 14):
+            self.assert_close(kernels.rsi(close, period), pandas_rsi(close, period))
+
+    def test_rsi_without_losses(self):
+        """测试窗口内只有上涨时 RSI 为 100"""
+        close = np.arange(1.0, 21.0)
+        result = kernels.rsi(close, 14)
+        assert np.isnan(result[:13]).all()
+        assert (result[13:] == 100).all()
+
+    def test_kdj(self, bars):
+        """测试 KDJ"""
+        high, low, close = bars
+        actual = kernels.kdj(high, low, close)
+        for name, expected in pandas_kdj(high, low, close).items():
+            self.assert_close(actual[name], expected)
+
+    def test_kdj_flat_bars(self):
+        """测试一字板 (最高 = 最低) 产生 NaN RSV 时与 pandas 一致"""
+        high = np.array([10.0, 10.0, 11.0, 12.0, 12.0, 11.5, 11.0, 12.5])
+        low = np.array([10.0, 10.0, 10.5, 12.0, 11.0, 11.0, 10.5, 11.5])
+        close = np.array([10.0, 10.0, 10.8, 12.0, 11.2, 11.2, 10.6, 12.0])
+        actual = kernels.kdj(high, low, close, n=1)
+        for name, expected in pandas_kdj(high, low, close, n=1).items():
+            self.assert_close(actual[name], expected)
+
+    def test_bollinger_bands(self, bars):
+        """测试布林带"""
+        _, _, close = bars
+        actual = kernels.bollinger_bands(close)
+        for name, expected in pandas_boll(close).items():
+            self.assert_close(actual[name], expected)
+
+    def test_cci_and_wr(self, bars):
+        """测试 CCI 和 WR"""
+        high, low, close = bars
+        self.assert_close(kernels.cci(high, low, close), pandas_cci(high, low, close))
+        self.assert_close(kernels.wr(high, low, close), pandas_wr(high, low, close))
+
+    def test_rolling_mad(self):
+        """测试滚动平均绝对偏差与 rolling.apply 结果一致"""
+        _, _, close = random_bars(500)
+        close[[100, 250]] = np.nan
+        series = pd.Series(close)
+
+        for window in (1, 5, 14, 60):
+            expected = series.rolling(window).apply(
+                lambda x: abs(x - x.mean()).mean(), raw=True
+            )
+            self.assert_close(kernels.rolling_mad(close, window), expected.to_numpy())
+
+        median = series.rolling(9).median().to_numpy()
+        expected = series.rolling(9).apply(lambda x: abs(x - np.median(x)).mean(), raw=True)
+        self.assert_close(kernels.rolling_mad(close, 9, median), expected.to_numpy())
+
+    def test_missing_values(self):
+        """测试输入含 NaN 时与 pandas 一致"""
+        high, low, close = random_bars(100)
+        for values in (high, low, close):
+            values[[0, 40, 41, 77]] = np.nan
+
+        self.assert_close(kernels.sma(close, 5), pandas_sma(close, 5))
+        self.assert_close(kernels.ema(close, 12), pandas_ema(close, 12))
+        self.assert_close(kernels.wr(high, low, close), pandas_wr(high, low, close))
+        actual = kernels.kdj(high, low, close)
+        for name, expected in pandas_kdj(high, low, close).items():
+            self.assert_close(actual[name], expected)
+
+    def test_wrapper_returns_none_for_gaps(self):
+        """测试列表接口将 NaN 转为 None"""
+        result = technical_calculator.bollinger_bands([1.0, 2.0, 3.0], period=2)
+        assert result["middle"] == [None, 1.5, 2.5]
+
+
+class TestBatchIndicators:
+    """批量指标计算测试"""
+
+    SPECS = ["sma:20", "ema:12", "macd", "rsi", "kdj", "boll", "cci", "wr:9"]
+
+    def test_matches_single_kernels(self):
+        """测试批量结果与单指标内核一致"""
+        high, low, close = random_bars(300)
+        results = compute_indicators({"high": high, "low": low, "close": close}, self.SPECS)
+
+        np.testing.assert_array_equal(results["sma:20"]["values"], kernels.sma(close, 20))
+        np.testing.assert_array_equal(results["ema:12"]["values"], kernels.ema(close, 12))
+        np.testing.assert_array_equal(results["rsi:14"]["values"], kernels.rsi(close, 14))
+        np.testing.assert_array_equal(results["cci:14"]["values"], kernels.cci(high, low, close))
+        np.testing.assert_array_equal(results["wr:9"]["values"], kernels.wr(high, low, close, 9))
+        for name, values in kernels.macd(close).items():
+            np.testing.assert_array_equal(results["macd:12,26,9"][name], values)
+        for name, values in kernels.kdj(high, low, close).items():
+            np.testing.assert_array_equal(results["kdj:9,3,3"][name], values)
+        for name, values in kernels.bollinger_bands(close).items():
+            np.testing.assert_array_equal(results["boll:20,2"][name], values)
+
+    def test_shared_intermediates(self):
+        """测试公共中间量只登记一次"""
+        graph = build_graph(["kdj:9", "wr:9", "ema:12", "ema:26", "macd", "sma:20", "boll:20"])
+
+        operations = [key[0] for key in graph.nodes]
+        assert operations.count("max") == 1
+        assert operations.count("min") == 1
+        # EMA12、EMA26、signal(9)、K、D
+        assert operations.count("ewm") == 5
+        assert operations.count("mean") == 1
+
+    def test_parse_specs(self):
+        """测试指标规格解析"""
+        assert IndicatorSpec.parse("MACD").key == "macd:12,26,9"
+        assert IndicatorSpec.parse("macd:5,,3").key == "macd:5,26,3"
+        assert IndicatorSpec.parse("boll:20,2.5").params == (20, 2.5)
+        assert IndicatorSpec.parse("sma:5").label == "SMA(5)"
+        assert IndicatorSpec.parse("kdj").param_dict() == {"n": 9, "m1": 3, "m2": 3}
+
+        results = compute_indicators({"close": [1.0, 2.0, 3.0]}, ["sma:2", "SMA:2"])
+        assert list(results) == ["sma:2"]
+
+    @pytest.mark.parametrize("text", ["foo", "sma:0", "sma:2.5", "sma:x", "rsi:14,1"])
+    def test_invalid_specs(self, text):
+        """测试无效规格"""
+        with pytest.raises(ValueError):
+            IndicatorSpec.parse(text)
+
+
+class TestStreamingIndicators:
+    """增量指标测试"""
+
+    SPECS = ["sma:20", "ema:12", "macd", "rsi:14", "kdj", "boll", "cci", "wr:9"]
+
+    @staticmethod
+    def rows(high, low, close):
+        return [{"high": h, "low": low_, "close": c} for h, low_, c in zip(high, low, close)]
+
+    def test_matches_batch(self):
+        """测试逐根更新结果与全量计算一致 (中途序列化并恢复)"""
+        high, low, close = random_bars(400, seed=7)
+        expected = compute_indicators({"high": high, "low": low, "close": close}, self.SPECS)
+
+        stream = IndicatorStream(self.SPECS)
+        for i, bar in enumerate(self.rows(high, low, close)):
+            if i == 150:
+                stream = IndicatorStream.from_state(json.loads(json.dumps(stream.to_state())))
+            result = stream.update(bar)
+            for key, outputs in result.items():
+                for name, value in outputs.items():
+                    np.testing.assert_allclose(
+                        value, expected[key][name][i], rtol=1e-8, atol=1e-8, equal_nan=True,
+                        err_msg=f"{key} {name} @ {i}",
+                    )
+
+    @pytest.mark.parametrize("smoothing", ["sma", "wilder"])
+    def test_rsi_smoothing(self, smoothing):
+        """测试 RSI 两种平滑方式"""
+        _, _, close = random_bars(200, seed=3)
+        expected = kernels.rsi(close, 14, smoothing=smoothing)
+
+        indicator = StreamingRSI(14, smoothing=smoothing)
+        actual = [indicator.update({"close": c}) for c in close]
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, equal_nan=True)
+
+    def test_wilder_rsi_reference(self):
+        """测试 Wilder RSI 与 ewm(alpha=1/period) 参考实现一致"""
+        _, _, close = random_bars(100, seed=5)
+        delta = pd.Series(close).diff()
+        gain = delta.clip(lower=0).iloc[1:]
+        loss = (-delta).clip(lower=0).iloc[1:]
+        seed_gain = gain.iloc[:14].mean()
+        seed_loss = loss.iloc[:14].mean()
+        avg_gain = pd.concat([pd.Series([seed_gain]), gain.iloc[14:]]).ewm(alpha=1 / 14, adjust=False).mean()
+        avg_loss = pd.concat([pd.Series([seed_loss]), loss.iloc[14:]]).ewm(alpha=1 / 14, adjust=False).mean()
+        expected = (100 * avg_gain / (avg_gain + avg_loss)).to_numpy()
+
+        np.testing.assert_allclose(kernels.rsi(close, 14, smoothing="wilder")[14:], expected, rtol=1e-9)
+
+    def test_kdj_flat_bars(self):
+        """测试一字板产生 NaN RSV 时与全量计算一致"""
+        high = [10.0, 10.0, 11.0, 12.0, 12.0, 11.5, 11.0, 12.5]
+        low = [10.0, 10.0, 10.5, 12.0, 11.0, 11.0, 10.5, 11.5]
+        close = [10.0, 10.0, 10.8, 12.0, 11.2, 11.2, 10.6, 12.0]
+        expected = kernels.kdj(np.array(high), np.array(low), np.array(close), n=1)
+
+        indicator = create_streaming("kdj:1")
+        for i, bar in enumerate(self.rows(high, low, close)):
+            result = indicator.update(bar)
+            for name in ("k", "d", "j"):
+                np.testing.assert_allclose(result[name], expected[name][i], equal_nan=True)
+
+    def test_preview_does_not_change_state(self):
+        """测试盘中试算不改变状态，且与提交后的值一致"""
+        high, low, close = random_bars(60, seed=11)
+        stream = IndicatorStream(self.SPECS)
+        stream.warm_up({"high": high[:-1], "low": low[:-1], "close": close[:-1]})
+        state = json.dumps(stream.to_state())
+
+        bar = {"high": high[-1], "low": low[-1], "close": close[-1]}
+        tick = {"high": high[-1] * 1.05, "low": low[-1] * 0.95, "close": close[-1] * 1.01}
+        stream.preview(tick)
+        previewed = stream.preview(bar)
+        assert json.dumps(stream.to_state()) == state
+
+        updated = stream.update(bar)
+        for key, outputs in updated.items():
+            for name, value in outputs.items():
+                np.testing.assert_allclose(previewed[key][name], value, equal_nan=True)
+
+
+class TestPanelIndicators:
+    """截面指标计算测试"""
+
+    SPECS = ["sma:20", "ema:12", "macd", "rsi:14", "kdj", "boll", "cci", "wr:9"]
+
+    @pytest.fixture
+    def panel(self):
+        rows = [random_bars(250, seed=s) for s in range(6)]
+        high, low, close = (np.vstack(columns) for columns in zip(*rows))
+        # 第 1 行第 80 日上市，第 2 行停牌 3 天，第 3 行整行缺失
+        for matrix in (high, low, close):
+            matrix[1, :80] = np.nan
+            matrix[2, 120:123] = np.nan
+            matrix[3] = np.nan
+        return {"high": high, "low": low, "close": close}
+
+    def test_rows_match_single_series(self, panel):
+        """测试每一行与单独计算一致"""
+        results = compute_panel(panel, self.SPECS)
+
+        for i in range(len(panel["close"])):
+            row = {name: values[i] for name, values in panel.items()}
+            expected = compute_indicators(row, self.SPECS)
+            for key, outputs in expected.items():
+                for name, values in outputs.items():
+                    np.testing.assert_allclose(
+                        results[key][name][i], values, rtol=1e-9, atol=1e-9, equal_nan=True,
+                        err_msg=f"row {i} {key} {name}",
+                    )
+
+    def test_listing_gap_matches_trimmed_history(self, panel):
+        """测试上市前补齐的 NaN 不影响上市后的指标"""
+        results = compute_panel(panel, self.SPECS)
+        trimmed = {name: values[1, 80:] for name, values in panel.items()}
+        expected = compute_indicators(trimmed, self.SPECS)
+
+        for key, outputs in expected.items():
+            for name, values in outputs.items():
+                assert np.isnan(results[key][name][1, :80]).all()
+                np.testing.assert_allclose(
+                    results[key][name][1, 80:], values, rtol=1e-9, atol=1e-9, equal_nan=True
+                )
+
+        wilder = kernels.rsi(panel["close"], 14, smoothing="wilder")
+        np.testing.assert_allclose(
+            wilder[1, 80:], kernels.rsi(trimmed["close"], 14, smoothing="wilder"), equal_nan=True
+        )
+
+    def test_chunking(self, panel):
+        """测试分块计算结果一致"""
+        whole = compute_panel(panel, self.SPECS)
+        chunked = compute_panel(panel, self.SPECS, chunk_rows=4)
+        for key, outputs in whole.items():
+            for name, values in outputs.items():
+                np.testing.assert_array_equal(chunked[key][name], values)
+
+    def test_from_bars_alignment(self):
+        """测试按日期并集对齐"""
+        day = np.datetime64("2024-01-01")
+        panel = PricePanel.from_bars({
+            "600519": {"date": day + np.array([0, 1, 3]), "close": np.array([1.0, 2.0, 4.0])},
+            "000001": {"date": day + np.array([1, 2]), "close": np.array([5.0, 6.0])},
+        }, fields=("close",))
+
+        assert panel.shape == (2, 4)
+        np.testing.assert_array_equal(panel.fields["close"][0], [1.0, 2.0, np.nan, 4.0])
+        np.testing.assert_array_equal(panel.fields["close"][1], [np.nan, 5.0, 6.0, np.nan])
+        np.testing.assert_array_equal(latest_values(panel.fields["close"]), [4.0, 6.0])
+
+
+class TestIndicatorCache:
+    """指标结果缓存测试"""
+
+    SPECS = parse_specs(["sma:5", "macd", "rsi:6", "kdj", "boll", "cci", "wr:9"])
+
+    @staticmethod
+    def bars(n, seed=0):
+        high, low, close = random_bars(n, seed)
+        dates = np.datetime64("2024-01-01") + np.arange(n)
+        return {"date": dates, "high": high, "low": low, "close": close}
+
+    @staticmethod
+    def head(bars, n):
+        return {column: values[:n] for column, values in bars.items()}
+
+    @staticmethod
+    def round_trip(entry):
+        codec = CacheCodec(codec="json")
+        return codec.decode(codec.encode(entry))
+
+    def assert_same(self, entry, expected):
+        assert entry["count"] == expected["count"]
+        assert entry["last_bar"] == expected["last_bar"]
+        for key, outputs in expected["indicators"].items():
+            for name, values in outputs.items():
+                np.testing.assert_allclose(
+                    np.array(entry["indicators"][key][name], dtype=float),
+                    np.array(values, dtype=float),
+                    rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=f"{key} {name}",
+                )
+
+    def test_extend_new_bars(self):
+        """测试新增 K 线时增量计算与全量计算一致"""
+        bars = self.bars(120)
+        entry = self.round_trip(build_entry(self.head(bars, 100), self.SPECS))
+
+        for n in (101, 103, 120):
+            entry = self.round_trip(extend_entry(entry, self.head(bars, n)))
+            self.assert_same(entry, build_entry(self.head(bars, n), self.SPECS))
+            assert entry_matches(entry, self.head(bars, n))
+
+    def test_extend_intraday_update(self):
+        """测试最后一根 K 线盘中变化时只重算最后一根"""
+        bars = self.bars(60)
+        entry = build_entry(bars, self.SPECS)
+
+        updated = {column: values.copy() for column, values in bars.items()}
+        updated["close"][-1] *= 1.03
+        updated["high"][-1] = max(updated["high"][-1], updated["close"][-1])
+        assert not entry_matches(entry, updated)
+
+        extended = extend_entry(self.round_trip(entry), updated)
+        self.assert_same(extended, build_entry(updated, self.SPECS))
+
+    def test_extend_rejects_changed_history(self):
+        """测试历史不一致时不做增量计算"""
+        bars = self.bars(60)
+        entry = build_entry(self.head(bars, 50), self.SPECS)
+
+        earlier = {column: values[1:] for column, values in bars.items()}
+        assert extend_entry(entry, earlier) is None
+        assert extend_entry(entry, self.head(bars, 40)) is None
+
+    async def test_get_indicators(self):
+        """测试命中、增量扩展和全量计算"""
+        cache = IndicatorCache(CacheService(), ttl=60)
+        bars = self.bars(80)
+        specs = ["macd", "sma:5"]
+
+        first = await cache.get_indicators("600519", "daily", "qfq", self.head(bars, 79), specs)
+        again = await cache.get_indicators("600519", "daily", "qfq", self.head(bars, 79), specs[::-1])
+        assert again["macd:12,26,9"] == first["macd:12,26,9"]
+
+        latest = await cache.get_indicators("600519", "daily", "qfq", bars, specs)
+        assert len(latest["sma:5"]["values"]) == 80
+        assert cache.info() == {"hits": 1, "extended": 1, "computed": 1}
+
+        expected = compute_indicators(bars, specs)
+        np.testing.assert_allclose(
+            np.array(latest["macd:12,26,9"]["histogram"], dtype=float),
+            expected["macd:12,26,9"]["histogram"],
+            rtol=1e-9, atol=1e-9,
+        )
+
+    async def test_computed_off_event_loop(self, monkeypatch):
+        """测试全量计算和增量扩展不在事件循环线程中执行"""
+        from app.services.indicators import cache as cache_module
+
+        threads = []
+
+        def tracked(func):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                return func(*args)
+            return wrapper
+
+        monkeypatch.setattr(cache_module, "build_entry", tracked(build_entry))
+        monkeypatch.setattr(cache_module, "extend_entry", tracked(extend_entry))
+        cache = IndicatorCache(CacheService(), ttl=60)
+        bars = self.bars(80)
+
+        await cache.get_indicators("600519", "daily", "qfq", self.head(bars, 79), ["macd"])
+        await cache.get_indicators("600519", "daily", "qfq", bars, ["macd"])
+
+        assert cache.info() == {"hits": 0, "extended": 1, "computed": 1}
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+    async def test_rescaled_history_recomputed(self):
+        """测试前复权价格整体变化 (新的除权除息) 时全量重算"""
+        cache = IndicatorCache(CacheService(), ttl=60)
+        bars = self.bars(80)
+        await cache.get_indicators("600519", "daily", "qfq", self.head(bars, 79), ["sma:5"])
+
+        rescaled = {column: values * 0.5 if column != "date" else values for column, values in bars.items()}
+        assert extend_entry(build_entry(self.head(bars, 79), self.SPECS), rescaled) is None
+
+        latest = await cache.get_indicators("600519", "daily", "qfq", rescaled, ["sma:5"])
+        assert cache.info() == {"hits": 0, "extended": 0, "computed": 2}
+        np.testing.assert_allclose(
+            np.array(latest["sma:5"]["values"][4:], dtype=float),
+            compute_indicators(rescaled, ["sma:5"])["sma:5"]["values"][4:],
+        )
@@ -0,0 +1,128 @@
+"""测试选股引擎"""
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pandas as pd
+
+from app.services.data.snapshot import MarketSnapshot
+from app.services.screener import ScreenerEngine
+
+
+def make_snapshot(size: int = 5000, seed: int = 7) -> MarketSnapshot:
+    """构造全市场规模的随机行情快照"""
+    rng = np.random.default_rng(seed)
+    price = rng.uniform(2, 200, size)
+    price[::97] = np.nan  # 停牌
+    df = pd.DataFrame(
+        {
+            "代码": [f"{i:06d}" for i in range(size)],
+            "名称": [f"股票{i}" for i in range(size)],
+            "最新价": price,
+            "涨跌幅": rng.normal(0, 3, size),
+            "成交额": rng.uniform(1e6, 5e9, size),
+            "市盈率-动态": rng.uniform(-50, 100, size),
+        }
+    )
+    return MarketSnapshot.from_dataframe(df, version=1)
+
+
+def reference_screen(snapshot, conditions, sort_by, sort_order, limit):
+    """逐行筛选的参考实现"""
+    rows = []
+    for record in (snapshot.row(i) for i in range(len(snapshot))):
+        ok = True
+        for c in conditions:
+            v = record.get(c["field"])
+            if v is None or v != v:
+                ok = False
+            elif c["operator"] == ">":
+                ok = ok and v > c["value"]
+            elif c["operator"] == "<":
+                ok = ok and v < c["value"]
+            elif c["operator"] == "between":
+                ok = ok and c["value"][0] <= v <= c["value"][1]
+        if ok:
+            rows.append(record)
+    rows.sort(key=lambda r: r[sort_by], reverse=sort_order == "desc")
+    return rows[:limit]
+
+
+class TestScreenerEngine:
+    """选股引擎测试"""
+
+    def test_matches_reference(self):
+        """测试向量化结果与逐行筛选一致"""
+        snapshot = make_snapshot()
+        engine = ScreenerEngine(data_service=None)
+        conditions = [
+            {"field": "change_pct", "operator": ">", "value": 1},
+            {"field": "pe", "operator": "between", "value": [0, 30]},
+            {"field": "price", "operator": "<", "value": 100},
+        ]
+
+        result = engine.screen_snapshot(snapshot, conditions, "amount", "desc", 50)
+        expected = reference_screen(snapshot, conditions, "amount", "desc", 50)
+
+        assert [r["code"] for r in result] == [r["code"] for r in expected]
+
+    def test_sort_ascending_nan_last(self):
+        """测试升序排序时缺失值排在最后"""
+        snapshot = make_snapshot(size=200)
+        engine = ScreenerEngine(data_service=None)
+
+        result = engine.screen_snapshot(snapshot, [], "price", "asc", 200)
+        prices = [r["price"] for r in result]
+
+        valid = [p for p in prices if p is not None]
+        assert valid == sorted(valid)
+        assert all(p is None for p in prices[len(valid):])
+
+    def test_string_conditions(self):
+        """测试字符串字段条件"""
+        snapshot = make_snapshot(size=200)
+        engine = ScreenerEngine(data_service=None)
+
+        result = engine.screen_snapshot(
+            snapshot,
+            [{"field": "code", "operator": "startswith", "value": "0001"}],
+            limit=500,
+        )
+        assert [r["code"] for r in result] == [f"{i:06d}" for i in range(100, 200)]
+
+    def test_unknown_field(self):
+        """测试未知字段不匹配任何股票"""
+        snapshot = make_snapshot(size=100)
+        engine = ScreenerEngine(data_service=None)
+
+        result = engine.screen_snapshot(
+            snapshot, [{"field": "unknown", "operator": ">", "value": 0}]
+        )
+        assert result == []
+
+    def test_missing_values_are_none(self):
+        """测试缺失字段 (亏损股市盈率、停牌) 输出为 None，结果可序列化为 JSON"""
+        snapshot = make_snapshot(size=300)
+        engine = ScreenerEngine(data_service=None)
+
+        result = engine.screen_snapshot(snapshot, [], sort_by="change_pct", limit=300)
+
+        assert len(result) == 300
+        assert any(r["price"] is None for r in result)
+        assert all(r["volume_ratio"] is None for r in result)
+        json.dumps(result, allow_nan=False)
+
+    async def test_screen_uses_snapshot(self):
+        """测试 screen 读取数据服务的行情快照"""
+        data_service = MagicMock()
+        data_service.get_market_snapshot = AsyncMock(return_value=make_snapshot(size=300))
+        engine = ScreenerEngine(data_service)
+
+        result = await engine.screen(
+            [{"field": "change_pct", "operator": ">", "value": 0}],
+            sort_by="change_pct",
+            limit=10,
+        )
+
+        assert len(result) == 10
+        assert result[0]["change_pct"] >= result[-1]["change_pct"]